@@ -1,47 +1,123 @@
+import src.algorithms.caching as ch
 import src.algorithms.integrating as it
+import src.algorithms.timing as tm
 import src.algorithms.transforming as tr
 import src.algorithms.sorting as st
+import src.algorithms.sharding as sh
+import src.algorithms.storing as sr
 import src.algorithms.cleaning as cl
+import src.algorithms.compacting as cp
 from pandas import DataFrame
+from src.classes.pipeline import Pipeline
 
 
-def get_consolidated_data(course_names: str,
-                          logs: str = "",
-                          directory: str = "") -> DataFrame:
+def get_consolidation_pipeline(course_names: str,
+                               logs: str = "",
+                               directory: str = "",
+                               compact: bool = False,
+                               processes: int = 1) -> Pipeline:
+    """
+    Return the pipeline of the stages of get_consolidated_data, from the reading of the logs to the selection of the
+    fields. The stages can be reordered, disabled or replaced by name before the pipeline is run, e.g.:
+
+        pipeline = get_consolidation_pipeline(course_names_path, logs=logs_path)
+        pipeline.disable_stage('add_duration')
+        df = pipeline.run()
+
+    Args:
+        course_names: The path of the course names file.
+        logs: The path of a unique log file.
+        directory: The path of the directory that contains the course files.
+        compact: Add the compact_data stage, see compacting.compact_data.
+        processes: The number of processes of the integration. If more than one, the integration stages after the
+            UNSHARDED_STAGES, sort_data and add_role are replaced by the integrate_shards stage, which runs them on
+            shards of courses in parallel (see sharding.integrate_shards).
+
+    Returns:
+        The pipeline object.
+    """
 
     # collect data from a directory when data are extracted file by file
     if directory != '':
-        log_data = it.collect_log_files(directory)
+        def read_logs(log_data):
+            return it.collect_log_files(directory)
     else:
         # collect data from a unique file (one file or more files already merged)
-        log_data = it.get_dataframe(logs)
+        def read_logs(log_data):
+            return it.get_dataframe(logs, dtype=tr.LOG_DTYPES)
 
-    # rename columns
-    log_data = tr.rename_columns(log_data)
+    courses = it.get_courses(course_names=course_names)
+    if processes > 1:
+        stages = [stage for stage in it.get_integration_stages(courses) if stage[0] in sh.UNSHARDED_STAGES]
+        pipeline = Pipeline([('read_logs', read_logs)] + stages)
+        pipeline.add_stage('integrate_shards', lambda log_data: sh.integrate_shards(log_data, courses, processes))
+    else:
+        pipeline = Pipeline([('read_logs', read_logs)] + it.get_integration_stages(courses))
 
-    # --------------------
-    # DATA INTEGRATION
-    # --------------------
-    log_data = it.add_course_id(log_data)
-    log_data = it.add_course_name(log_data, course_names)
-    log_data = it.add_timestamps(log_data)
-    log_data = st.sort_data(log_data)
-    log_data = it.add_component(log_data)
-    log_data = it.add_event_name(log_data)
-    log_data = it.redefine_course_area(log_data)
-    log_data = it.redefine_component(log_data)
-    log_data = it.redefine_event_name(log_data)
-    log_data = it.add_role(log_data)
-    log_data = it.add_status(log_data)
+        # the roles depend on the sequence of the logs
+        pipeline.add_stage('sort_data', st.sort_data)
+        pipeline.add_stage('add_role', it.add_role)
+    # the durations have to be computed before cleaning
+    pipeline.add_stage('add_duration', tm.add_duration)
 
     # --------------------
     # DATA SELECTION
     # --------------------
-    # select and reorder columns
-    cols = ['ID', 'Unix_Time', 'Time', 'Role', 'Username',
-            'courseid', 'Course_Area', 'Context', 'Component', 'Event_name', 'Duration', 'Status']
-    # drop unused columns
-    log_data = log_data[cols].copy()
+    # select and reorder columns, the fields that are not computed are left empty
+    pipeline.add_stage('select_columns', lambda log_data: log_data.reindex(columns=tr.CONSOLIDATED_FIELDS))
+    if compact:
+        pipeline.add_stage('compact_data', cp.compact_data)
+
+    return pipeline
+
+
+def get_consolidated_data(course_names: str,
+                          logs: str = "",
+                          directory: str = "",
+                          report: str = "",
+                          compact: bool = False,
+                          cache: str = "",
+                          bypass_cache: bool = False,
+                          processes: int = 1) -> DataFrame:
+    """
+    Consolidate the logs with the stages of get_consolidation_pipeline.
+
+    If a cache directory is given, the result is stored in the cache under the hash of the contents of the log files
+    and of the course names file, of the code and the rules of the consolidation and of compact (see
+    caching.get_cache_key), and the runs on the same inputs load the stored result instead of running the pipeline
+    (the report is then not written). The least recently used entries are evicted, see caching.evict_entries.
+
+    Args:
+        course_names: The path of the course names file.
+        logs: The path of a unique log file.
+        directory: The path of the directory that contains the course files.
+        report: The path of the JSON file of the time, the memory and the rows of each stage, not written if empty.
+        compact: Return the consolidated data in compact form (see compacting.compact_data), which takes several
+            times less memory.
+        cache: The path of the cache directory, the result is not cached if empty.
+        bypass_cache: Run the pipeline even if the result is in the cache, and replace the stored result.
+        processes: The number of processes of the integration, see get_consolidation_pipeline.
+
+    Returns:
+        The dataframe of the consolidated data.
+    """
+
+    if cache != "":
+        log_files = it.get_log_files(directory) if directory != "" else [logs]
+        # the integration stages and the shards are defined in the FINGERPRINT_MODULES
+        fingerprint = ch.get_fingerprint(get_consolidation_pipeline)
+        key = ch.get_cache_key(cache, log_files, course_names, fingerprint, {'compact': compact})
+        if not bypass_cache:
+            log_data = ch.load_entry(cache, key)
+            if log_data is not None:
+                return log_data
+
+    pipeline = get_consolidation_pipeline(course_names, logs, directory, compact, processes)
+    log_data = pipeline.run()
+    if report != "":
+        pipeline.write_report(report)
+    if cache != "":
+        ch.save_entry(cache, key, log_data)
 
     return log_data
 
@@ -62,12 +138,12 @@ if __name__ == '__main__':
     # -----------------
     # CLEAN THE DATASET
     # -----------------
-    # you can clean the dataset both from automatic events and from dataset specific events
-    df = cl.clean_automatic_events(df)
-    df = cl.clean_specific_events(df)
+    # you can clean the dataset both from automatic events and from dataset specific events, removed in a single pass
+    df = cl.clean_events(df, cl.AUTOMATIC_EVENTS + cl.SPECIFIC_EVENTS)
 
-    # you can save the dataset for further analysis
-    df.to_csv(example_consolidated_data_path)
+    # you can save the dataset for further analysis, partitioned by course, in a columnar format that preserves the
+    # types of the fields (df.to_csv(example_consolidated_data_path) saves it as a csv file)
+    sr.save_consolidated_data(df, example_consolidated_store_path)
 
     # --------------------
     # GET YOUR DATA
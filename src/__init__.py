@@ -1,5 +1,5 @@
 __version__ = '0.1'
 __author__ = 'Daniela Rotelli'
 
-__all__ = ["algorithms", "classes", "datasets"]
+__all__ = ["algorithms", "benchmarks", "classes", "datasets"]
 
@@ -1,9 +1,19 @@
-__all__ = ["Records", "cleaning", "extracting", "integrating", "sorting", "timing", "transforming"]
+__all__ = ["Records", "aggregating", "caching", "cleaning", "compacting", "extracting", "fetching", "integrating",
+           "rules", "sharding", "sorting", "storing", "streaming", "timing", "transforming", "updating"]
 
 from src.classes.records import Records
+from .aggregating import *
+from .caching import *
 from .cleaning import *
+from .compacting import *
 from .extracting import *
+from .fetching import *
 from .integrating import *
+from .rules import *
+from .sharding import *
 from .sorting import *
+from .storing import *
+from .streaming import *
 from .timing import *
 from .transforming import *
+from .updating import *
@@ -0,0 +1,294 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+import src.algorithms.compacting as cp
+import src.algorithms.timing as tm
+import src.algorithms.transforming as tr
+
+
+# fields of the cubes that can be grouped and filtered
+DIMENSIONS = ['courseid', 'Role', 'Username', 'Component', 'Event_name']
+
+# periods of the cubes, from the finest to the coarsest: the records are counted by local day, by week (starting on
+# Monday) or by month, and a period can be rolled up to the coarser ones except the weeks to the months
+GRAINS = ['day', 'week', 'month']
+
+# field of the first day of the period of the counts
+PERIOD = 'Period'
+
+# field of the number of events
+EVENTS = 'Events'
+
+# cubes by name: the dimensions and the grain of their counts
+CUBES = {'user_event_day': (['courseid', 'Role', 'Username', 'Component', 'Event_name'], 'day'),
+         'user_component_week': (['courseid', 'Role', 'Username', 'Component'], 'week'),
+         'component_event_day': (['courseid', 'Role', 'Component', 'Event_name'], 'day'),
+         'course_role_week': (['courseid', 'Role'], 'week')}
+
+# file of the dimensions and the grains of the cubes saved in a directory
+CUBES_FILE = 'cubes.json'
+
+# directory of the consolidated dataset where its cubes are kept (see update_consolidated_data)
+CUBES_DIRECTORY = '_cubes'
+
+
+def register_cube(name: str, dimensions: [str], grain: str):
+    """
+    Add a cube to the CUBES, or replace the cube of the same name. The cubes already built are not changed.
+
+    Example:
+        register_cube('user_month', ['courseid', 'Username'], 'month')
+    """
+
+    unknown = [dimension for dimension in dimensions if dimension not in DIMENSIONS]
+    if unknown:
+        raise ValueError("Unknown dimensions {}. Available dimensions: {}".format(unknown, DIMENSIONS))
+    if grain not in GRAINS:
+        raise ValueError("Unknown grain '{}'. Available grains: {}".format(grain, GRAINS))
+
+    CUBES[name] = (list(dimensions), grain)
+
+
+def _covers(grain: str, query_grain: str) -> bool:
+    """
+    Return whether the periods of the grain can be rolled up to those of the query grain.
+    """
+    return query_grain is None or grain == query_grain or grain == 'day'
+
+
+def roll_up_periods(periods, grain: str) -> np.ndarray:
+    """
+    Return the first day of the week or the month of the days, the days themselves for the grain 'day'.
+    """
+
+    days = np.asarray(periods, dtype='datetime64[D]')
+    if grain == 'week':
+        # the epoch is a Thursday
+        days = days - ((days.astype(np.int64) + 3) % 7).astype('timedelta64[D]')
+    elif grain == 'month':
+        days = days.astype('datetime64[M]').astype('datetime64[D]')
+
+    return days.astype('datetime64[ns]')
+
+
+def get_days(df: DataFrame) -> np.ndarray:
+    """
+    Return the local day of the records, given by Unix_Time and the UTC offset of the Time field (or the Time_Offset
+    field of the compact dataframes), in UTC if the offsets are not known.
+    """
+
+    timestamps = df['Unix_Time'].to_numpy(dtype=np.int64)
+    offsets = None
+    if cp.OFFSET_FIELD in df:
+        offsets = df[cp.OFFSET_FIELD].to_numpy(dtype=np.int64)
+    elif 'Time' in df and len(df):
+        offsets = tm.get_utc_offsets(df['Time'], timestamps)
+    if offsets is not None:
+        timestamps = timestamps + offsets * 60
+
+    return (timestamps // 86400).astype('datetime64[D]')
+
+
+def _get_dimensions(df: DataFrame, dimensions: [str]) -> DataFrame:
+    """
+    Return the dimensions of the records as plain values: the usernames of the compact dataframes are decoded, the
+    roles of the users with more than one role are joined (see transforming.join_roles) and the courseid is nullable.
+    """
+
+    dictionaries = cp.get_dictionaries(df)
+    columns = {}
+    for dimension in dimensions:
+        values = df[dimension]
+        if dimension == 'Username' and 'Username' in dictionaries:
+            values = cp.decode_usernames(values, dictionaries['Username'])
+        elif isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.to_numpy(dtype=object, na_value=np.nan)
+        elif dimension == 'Role':
+            values = tr.join_roles(df[[dimension]])[dimension].to_numpy(dtype=object)
+        elif dimension == 'courseid':
+            values = values.astype('Int64')
+        columns[dimension] = values
+
+    return DataFrame(columns, index=df.index)
+
+
+def _sum_events(cube: DataFrame, dimensions: [str]) -> DataFrame:
+    """
+    Return the sum of the events of the cube by dimensions, without the groups that have no event.
+    """
+
+    if not dimensions:
+        return DataFrame({EVENTS: [cube[EVENTS].sum()]})
+
+    cube = cube.groupby(dimensions, sort=True, dropna=False)[EVENTS].sum().reset_index()
+    cube = cube.loc[cube[EVENTS] != 0].reset_index(drop=True)
+
+    return cube
+
+
+def _count_events(df: DataFrame, specs: dict) -> dict:
+    """
+    Count the events of the records in the cubes of the specs, (dimensions, grain) tuples by name. The records are
+    counted once in the finest cube of the dimensions of all the cubes, and each cube is rolled up from it.
+    """
+
+    dimensions = [dimension for dimension in DIMENSIONS if any(dimension in spec[0] for spec in specs.values())]
+    rows = _get_dimensions(df, dimensions)
+    rows[PERIOD] = roll_up_periods(get_days(df), 'day')
+    rows[EVENTS] = np.ones(len(rows), dtype=np.int64)
+    base = _sum_events(rows, dimensions + [PERIOD])
+
+    cubes = {}
+    for name, (cube_dimensions, grain) in specs.items():
+        cube = base[cube_dimensions + [PERIOD, EVENTS]].copy()
+        cube[PERIOD] = roll_up_periods(cube[PERIOD], grain)
+        cube = _sum_events(cube, cube_dimensions + [PERIOD])
+        cube.attrs['grain'] = grain
+        cubes[name] = cube
+
+    return cubes
+
+
+def build_cubes(df: DataFrame, cubes: [str] = None) -> dict:
+    """
+    Count the events of the consolidated dataframe in the given cubes.
+
+    Args:
+        df: The consolidated dataframe, in compact form or not.
+        cubes: The names of the cubes of CUBES, all if None.
+
+    Returns:
+        The dataframes of the cubes by name, with the dimensions of the cube, the Period (the first day of the period
+        of the counts) and the number of Events, sorted by dimensions and period.
+    """
+
+    if cubes is None:
+        cubes = list(CUBES)
+    unknown = [name for name in cubes if name not in CUBES]
+    if unknown:
+        raise ValueError("Unknown cubes {}. Available cubes: {}".format(unknown, list(CUBES)))
+
+    return _count_events(df, dict((name, CUBES[name]) for name in cubes))
+
+
+def update_cubes(cubes: dict, added: DataFrame = None, removed: DataFrame = None) -> dict:
+    """
+    Update the cubes with the events of the records added to the consolidated data and of the records removed from
+    it, e.g. the previous records of a course whose roles are written again: the counts of the new records are added
+    to those of the cubes and the counts of the removed records subtracted, so the cubes are not built again.
+
+    Args:
+        cubes: The cubes by name, see build_cubes.
+        added: The consolidated records added.
+        removed: The consolidated records removed.
+
+    Returns:
+        The updated cubes by name.
+    """
+
+    specs = dict((name, (list(cube.columns[:-2]), cube.attrs['grain'])) for name, cube in cubes.items())
+    deltas = []
+    for records, sign in [(added, 1), (removed, -1)]:
+        if records is not None and len(records):
+            deltas.append((_count_events(records, specs), sign))
+
+    updated = {}
+    for name, cube in cubes.items():
+        dimensions, grain = specs[name]
+        frames = [cube]
+        for delta, sign in deltas:
+            frames.append(delta[name].assign(**{EVENTS: delta[name][EVENTS] * sign}))
+        if len(frames) > 1:
+            cube = _sum_events(pd.concat(frames, ignore_index=True), dimensions + [PERIOD])
+            cube.attrs['grain'] = grain
+        updated[name] = cube
+
+    return updated
+
+
+def query_cubes(cubes: dict, by: [str], grain: str = None, start=None, end=None, **filters) -> DataFrame:
+    """
+    Count the events by the given dimensions and period with the smallest cube that has the dimensions of the query
+    and whose periods can be rolled up to the grain, e.g. the events per student per component per week in course 5:
+
+        query_cubes(cubes, ['Username', 'Component'], 'week', courseid=[5], Role=['Student'])
+
+    Args:
+        cubes: The cubes by name, see build_cubes.
+        by: The dimensions of the counts.
+        grain: The period of the counts, 'day', 'week' or 'month', the whole period of the cube if None.
+        start: The first day of the counted periods, a timestamp, no bound if None.
+        end: The last day of the counted periods (included).
+        filters: The values of the dimensions, e.g. Role=['Student'], the filters whose values are None are ignored.
+
+    Returns:
+        The dataframe of the number of Events by dimensions (and by Period if grain is given).
+    """
+
+    if grain is not None and grain not in GRAINS:
+        raise ValueError("Unknown grain '{}'. Available grains: {}".format(grain, GRAINS))
+    filters = dict((field, values) for field, values in filters.items() if values is not None)
+    required = set(by) | set(filters)
+
+    covering = [(len(cube), name) for name, cube in cubes.items()
+                if required <= set(cube.columns[:-2]) and _covers(cube.attrs['grain'], grain)]
+    if not covering:
+        available = dict((name, (list(cube.columns[:-2]), cube.attrs['grain'])) for name, cube in cubes.items())
+        raise ValueError("No cube has the dimensions {} at the grain {}. Available cubes: {}"
+                         .format(sorted(required), grain, available))
+    cube = cubes[min(covering)[1]]
+
+    selected = np.ones(len(cube), dtype=bool)
+    for field, values in filters.items():
+        values = [tr.ROLE_SEPARATOR.join(value) if isinstance(value, (list, tuple)) else value for value in values]
+        selected &= cube[field].isin(values).to_numpy(dtype=bool, na_value=False)
+    if start is not None:
+        selected &= (cube[PERIOD] >= pd.Timestamp(start)).to_numpy()
+    if end is not None:
+        selected &= (cube[PERIOD] <= pd.Timestamp(end)).to_numpy()
+    cube = cube.loc[selected]
+
+    if grain is None:
+        return _sum_events(cube, list(by))
+
+    cube = cube[list(by) + [PERIOD, EVENTS]].copy()
+    cube[PERIOD] = roll_up_periods(cube[PERIOD], grain)
+
+    return _sum_events(cube, list(by) + [PERIOD])
+
+
+def save_cubes(directory: str, cubes: dict):
+    """
+    Save the cubes in parquet files of the directory, with their grains in the CUBES_FILE.
+    """
+
+    os.makedirs(directory, exist_ok=True)
+    for name, cube in cubes.items():
+        cube.to_parquet(os.path.join(directory, name + '.parquet'), index=False)
+    # the cubes are listed once their files are written
+    path = os.path.join(directory, CUBES_FILE)
+    with open(path + '.tmp', 'w') as file:
+        json.dump(dict((name, cube.attrs['grain']) for name, cube in cubes.items()), file, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def load_cubes(directory: str) -> dict:
+    """
+    Load the cubes saved with save_cubes, an empty dictionary if the directory has no cubes.
+    """
+
+    path = os.path.join(directory, CUBES_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        grains = json.load(file)
+
+    cubes = {}
+    for name, grain in grains.items():
+        cube = pd.read_parquet(os.path.join(directory, name + '.parquet'))
+        cube.attrs['grain'] = grain
+        cubes[name] = cube
+
+    return cubes
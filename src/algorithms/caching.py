@@ -0,0 +1,184 @@
+import os
+import json
+import time
+import pickle
+import hashlib
+import inspect
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+import src.algorithms.compacting as cp
+import src.algorithms.integrating as it
+import src.algorithms.rules as ru
+import src.algorithms.sharding as sh
+import src.algorithms.sorting as st
+import src.algorithms.timing as tm
+import src.algorithms.transforming as tr
+import src.classes.pipeline as pl
+
+
+# modules whose code defines the consolidated data
+FINGERPRINT_MODULES = [cp, it, ru, sh, st, tm, tr, pl]
+
+# the entries not used for CACHE_MAX_AGE seconds are evicted, then the least recently used ones until the cache takes
+# less than CACHE_MAX_BYTES
+CACHE_MAX_AGE = 30 * 24 * 3600
+CACHE_MAX_BYTES = 10 * 2 ** 30
+
+# extension of the entries of the cache
+ENTRY_EXTENSION = '.pickle'
+
+# file of the hashes of the input files, so that the files that did not change are not hashed again
+HASHES_FILE = '.hashes.json'
+
+
+def hash_file(file_path: str, hashes: dict = None) -> str:
+    """
+    Return the hash of the content of the file. If hashes is given, the hash is looked up by path, size and time of
+    modification of the file, and added to hashes if it is computed.
+    """
+
+    status = os.stat(file_path)
+    path = os.path.abspath(file_path)
+    if hashes is not None and path in hashes and hashes[path][:2] == [status.st_size, status.st_mtime_ns]:
+        return hashes[path][2]
+
+    digest = hashlib.blake2b(digest_size=20)
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(2 ** 20), b''):
+            digest.update(block)
+    digest = digest.hexdigest()
+
+    if hashes is not None:
+        hashes[path] = [status.st_size, status.st_mtime_ns, digest]
+
+    return digest
+
+
+def get_fingerprint(*objects) -> str:
+    """
+    Return the fingerprint of the version of the consolidation: the hash of the source code of the
+    FINGERPRINT_MODULES and of the given objects (e.g. the functions that build the pipeline), of the rule tables and
+    of the tables of the fields as they are when the function is called, since they can be extended at runtime (see
+    rules.register_rule), and of the versions of pandas and numpy.
+    """
+
+    digest = hashlib.blake2b(digest_size=20)
+    for item in FINGERPRINT_MODULES + list(objects):
+        digest.update(inspect.getsource(item).encode())
+    tables = [ru.RULE_TABLES, tr.LOG_DTYPES, tr.XAPI_FIELDS, tm.SESSION_TIMEOUT, tm.LOGOUT_COMPONENTS, tm.TIME_FORMAT,
+              pd.__version__, np.__version__]
+    digest.update(repr(tables).encode())
+
+    return digest.hexdigest()
+
+
+def get_cache_key(cache_directory: str,
+                  log_files: [str],
+                  course_names: str,
+                  fingerprint: str,
+                  parameters: dict = None) -> str:
+    """
+    Return the key of the consolidated data of the inputs: the hash of the contents of the log files and of the
+    course names file, of the fingerprint of the consolidation (see get_fingerprint) and of the parameters.
+
+    Args:
+        cache_directory: The directory of the cache, where the hashes of the files are kept.
+        log_files: The paths of the log files.
+        course_names: The path of the course names file.
+        fingerprint: The fingerprint of the consolidation.
+        parameters: The parameters of the consolidation that change its result.
+
+    Returns:
+        The key of the entry of the cache.
+    """
+
+    os.makedirs(cache_directory, exist_ok=True)
+    hashes_path = os.path.join(cache_directory, HASHES_FILE)
+    hashes = {}
+    if os.path.exists(hashes_path):
+        with open(hashes_path) as file:
+            hashes = json.load(file)
+
+    inputs = {'logs': [hash_file(file_path, hashes) for file_path in sorted(log_files)],
+              'course_names': hash_file(course_names, hashes) if course_names != "" else "",
+              'fingerprint': fingerprint,
+              'parameters': parameters or {}}
+
+    with open(hashes_path + '.tmp', 'w') as file:
+        json.dump(hashes, file)
+    os.replace(hashes_path + '.tmp', hashes_path)
+
+    return hashlib.blake2b(json.dumps(inputs, sort_keys=True, default=str).encode(), digest_size=20).hexdigest()
+
+
+def load_entry(cache_directory: str, key: str) -> DataFrame:
+    """
+    Return the consolidated data of the entry of the cache, None if there is no entry for the key. The entry is marked
+    as used.
+    """
+
+    path = os.path.join(cache_directory, key + ENTRY_EXTENSION)
+    if not os.path.exists(path):
+        return None
+
+    with open(path, 'rb') as file:
+        df = pickle.load(file)
+    # the time of modification of the entry is the time of its last use
+    os.utime(path)
+
+    return df
+
+
+def save_entry(cache_directory: str, key: str, df: DataFrame):
+    """
+    Save the consolidated data in the entry of the key, then evict the stale entries (see evict_entries).
+    """
+
+    os.makedirs(cache_directory, exist_ok=True)
+    path = os.path.join(cache_directory, key + ENTRY_EXTENSION)
+    # the entry is written atomically, so that an interrupted run does not leave a partial entry
+    with open(path + '.tmp', 'wb') as file:
+        pickle.dump(df, file, protocol=5)
+    os.replace(path + '.tmp', path)
+
+    evict_entries(cache_directory)
+
+
+def evict_entries(cache_directory: str, max_age: float = None, max_bytes: int = None) -> [str]:
+    """
+    Remove the entries of the cache not used for max_age seconds, then the least recently used entries until the
+    cache takes less than max_bytes.
+
+    Args:
+        cache_directory: The directory of the cache.
+        max_age: The seconds an entry is kept without being used, CACHE_MAX_AGE if None.
+        max_bytes: The maximum size of the cache, CACHE_MAX_BYTES if None.
+
+    Returns:
+        The keys of the removed entries.
+    """
+
+    if max_age is None:
+        max_age = CACHE_MAX_AGE
+    if max_bytes is None:
+        max_bytes = CACHE_MAX_BYTES
+
+    entries = []
+    for name in os.listdir(cache_directory):
+        if name.endswith(ENTRY_EXTENSION):
+            status = os.stat(os.path.join(cache_directory, name))
+            entries.append((status.st_mtime, status.st_size, name))
+    # the most recently used first
+    entries.sort(reverse=True)
+
+    now = time.time()
+    removed = []
+    size = 0
+    for used, entry_size, name in entries:
+        size += entry_size
+        if now - used > max_age or size > max_bytes:
+            os.remove(os.path.join(cache_directory, name))
+            removed.append(name[:-len(ENTRY_EXTENSION)])
+
+    return removed
@@ -1,26 +1,137 @@
+import numpy as np
 from pandas import DataFrame
+import src.algorithms.rules as ru
 
 
-def clean_automatic_events(df: DataFrame) -> DataFrame:
+# automatically generated events that do not involve student actions
+AUTOMATIC_EVENTS = [
+    ('student_grade_item_created', [('Role', '==', 'Student'), ('Event_name', '==', 'Grade item created')]),
+    ('student_grade_item_updated', [('Role', '==', 'Student'), ('Event_name', '==', 'Grade item updated')]),
+    ('student_user_graded', [('Role', '==', 'Student'), ('Event_name', '==', 'User graded')]),
+    ('notification_sent', [('Event_name', '==', 'Notification sent')]),
+]
+
+# events specific to the dataset, customisable according to your needs
+SPECIFIC_EVENTS = [
+    # events not informative for temporal analysis
+    ('activity_completion', [('Event_name', '==', 'Course activity completion updated')]),
+    # actions performed by users with the guest role
+    ('guest', [('Role', '==', 'Guest')]),
+    # actions performed on deleted modules, activities, or users.
+    ('deleted', [('Status', '==', 'DELETED')]),
+]
+
+CLEANING_RULES = {'automatic': AUTOMATIC_EVENTS,
+                  'specific': SPECIFIC_EVENTS}
+
+
+def register_cleaning_rule(table: str, name: str, conditions: [tuple]):
+    """
+    Add a named predicate to one of the cleaning tables. The records that satisfy all the conditions are removed. The
+    conditions have the format of the rules (see rules.py).
+
+    Args:
+        table: 'automatic' or 'specific'
+        name: the name of the predicate, used in the counts of the removed records
+        conditions: list of (field, operator, operand) tuples that must all be satisfied
+
+    Example:
+        register_cleaning_rule('specific', 'test_course', [('courseid', '==', 42)])
+    """
+
+    if table not in CLEANING_RULES:
+        raise ValueError("Unknown cleaning table '{}'. Available tables: {}".format(table, list(CLEANING_RULES)))
+    for condition in conditions:
+        if len(condition) != 3 or condition[1] not in ru.OPERATORS:
+            raise ValueError("Invalid condition {}. Operators: {}".format(condition, ru.OPERATORS))
+
+    CLEANING_RULES[table].append((name, [tuple(condition) for condition in conditions]))
+
+
+def get_cleaning_mask(df: DataFrame, predicates: [tuple]) -> (np.ndarray, dict):
+    """
+    Evaluate the predicates in a single pass: every predicate is evaluated on the distinct combinations of the fields
+    read by the predicates, and the results are mapped back to the records at once.
+
+    Args:
+        df: The dataframe object.
+        predicates: list of (name, conditions) tuples.
+
+    Returns:
+        The boolean mask of the records to remove and the number of records removed by each predicate. A record
+        satisfying more than one predicate is counted for the first one.
+    """
+
+    keys = []
+    for name, conditions in predicates:
+        for column, operator, operand in conditions:
+            if column not in keys:
+                keys.append(column)
+
+    counts = dict((name, 0) for name, conditions in predicates)
+    if len(df) == 0 or not predicates:
+        return np.zeros(len(df), dtype=bool), counts
+
+    codes, values = ru.factorize_columns(df, keys)
+    size = codes.max() + 1
+    frequencies = np.bincount(codes, minlength=size)
+
+    removed = np.zeros(size, dtype=bool)
+    for name, conditions in predicates:
+        mask = ru.evaluate_conditions(values, conditions, size)
+        counts[name] += int(frequencies[mask & ~removed].sum())
+        removed |= mask
+
+    return removed[codes], counts
+
+
+def clean_events(df: DataFrame,
+                 predicates: [tuple] = None,
+                 inplace: bool = False,
+                 return_counts: bool = False):
+    """
+    Remove the records that satisfy any of the predicates, evaluated at once by get_cleaning_mask.
+
+    Args:
+        df: The dataframe object.
+        predicates: list of (name, conditions) tuples, all the cleaning rules if None.
+        inplace: Remove the records from the given dataframe instead of returning a new one.
+        return_counts: Also return the number of records removed by each predicate.
+
+    Returns:
+        The dataframe without the removed records and, if return_counts is True, the counts of the removed records.
+    """
+
+    if predicates is None:
+        predicates = [predicate for table in CLEANING_RULES.values() for predicate in table]
+
+    removed, counts = get_cleaning_mask(df, predicates)
+
+    if inplace:
+        if removed.any():
+            df.drop(df.index[removed], inplace=True)
+        df.reset_index(drop=True, inplace=True)
+    else:
+        df = df.loc[~removed].reset_index(drop=True)
+
+    if return_counts:
+        return df, counts
+
+    return df
+
+
+def clean_automatic_events(df: DataFrame, inplace: bool = False) -> DataFrame:
     """
     Remove unnecessary data. Here are listed logs that usually do not involve any user actions, rather are
     automatically generated by the system.
     """
 
-    # automatically generated events that do not involve student actions
-    grd_itm_ctd = list((df.loc[df['Role'] == 'Student'].loc[df['Event_name'] == 'Grade item created']).index)
-    grd_itm_upd = list((df.loc[df['Role'] == 'Student'].loc[df['Event_name'] == 'Grade item updated']).index)
-    user_graded = list((df.loc[df['Role'] == 'Student'].loc[df['Event_name'] == 'User graded']).index)
-    notification = list((df.loc[df['Event_name'] == 'Notification sent']).index)
-
-    to_remove = grd_itm_ctd + grd_itm_upd + user_graded + notification
-    df.drop(to_remove, axis=0, inplace=True)
-    df = df.reset_index(drop=True)
+    df = clean_events(df, CLEANING_RULES['automatic'], inplace=inplace)
 
     return df
 
 
-def clean_specific_events(df: DataFrame) -> DataFrame:
+def clean_specific_events(df: DataFrame, inplace: bool = False) -> DataFrame:
     """
     Remove unnecessary data specific to your dataset.
     Please be aware that if you are performing any temporal analysis these activities must be removed after
@@ -28,15 +139,6 @@ def clean_specific_events(df: DataFrame) -> DataFrame:
 
     """
 
-    # events not informative for temporal analysis
-    activity_completion = list((df.loc[df['Event_name'] == 'Course activity completion updated']).index)
-    # actions performed by users with the guest role
-    guest = list((df.loc[df['Role'] == 'Guest']).index)
-    # actions performed on deleted modules, activities, or users.
-    deleted = list((df.loc[df['Status'] == 'DELETED']).index)
-
-    to_remove = activity_completion + guest + deleted
-    df.drop(to_remove, axis=0, inplace=True)
-    df = df.reset_index(drop=True)
+    df = clean_events(df, CLEANING_RULES['specific'], inplace=inplace)
 
     return df
@@ -0,0 +1,203 @@
+import numpy as np
+import pandas as pd
+from pandas import DataFrame, Index, Series
+import src.algorithms.timing as tm
+import src.algorithms.transforming as tr
+
+
+# fields with few distinct values, stored as categoricals whose categories are the dictionaries of the fields
+CATEGORICAL_FIELDS = ['Role', 'Course_Area', 'Context', 'Component', 'Event_name', 'Status', 'Verb']
+
+# integer fields stored in the smallest integer type that holds their values
+INTEGER_FIELDS = ['ID', 'Unix_Time', 'courseid', 'Session_ID']
+
+# float fields stored in single precision (the durations are whole seconds)
+FLOAT_FIELDS = ['Duration']
+
+# field of the UTC offsets in minutes that replaces the Time field, rebuilt from Unix_Time by expand_data
+OFFSET_FIELD = 'Time_Offset'
+
+# key of the dictionaries in the attributes of the compact dataframes
+DICTIONARIES = 'dictionaries'
+
+
+def get_dictionaries(df: DataFrame) -> dict:
+    """
+    Return the dictionaries of the compact dataframe: the categories of each categorical field and the usernames of
+    the ids of the Username field, an empty dictionary if the dataframe is not compact.
+    """
+
+    return df.attrs.get(DICTIONARIES, {})
+
+
+def extend_dictionary(dictionary: Index, values) -> Index:
+    """
+    Return the dictionary with the given values that are not in it added at the end, sorted, so that the codes of the
+    values already in the dictionary do not change.
+
+    Args:
+        dictionary: The index of the values, None for a new dictionary.
+        values: The values to add, the missing values are ignored.
+
+    Returns:
+        The index of the values.
+    """
+
+    values = Index(pd.unique(np.asarray(values, dtype=object)), dtype=object).dropna()
+    if dictionary is None:
+        return values.sort_values()
+
+    new = values[~values.isin(dictionary)]
+    if len(new) == 0:
+        return dictionary
+
+    return dictionary.append(new.sort_values())
+
+
+def intern_usernames(usernames: Series, table: Index = None) -> (np.ndarray, Index):
+    """
+    Replace the usernames with their position in an intern table, extended with the new usernames.
+
+    Args:
+        usernames: The series of the usernames.
+        table: The index of the usernames interned beforehand, None for a new table.
+
+    Returns:
+        The int32 ids of the usernames (-1 for the missing usernames) and the table of the usernames.
+    """
+
+    codes, uniques = pd.factorize(usernames)
+    table = extend_dictionary(table, uniques)
+    ids = table.get_indexer(Index(uniques, dtype=object))
+
+    return np.where(codes >= 0, ids[codes], -1).astype(np.int32), table
+
+
+def narrow_integers(values: Series) -> Series:
+    """
+    Return the integer series in the smallest integer type that holds its values, nullable if values are missing.
+    """
+
+    if len(values) == 0 or values.isna().all():
+        return values
+    low, high = values.min(), values.max()
+    for dtype in [np.int8, np.int16, np.int32, np.int64]:
+        if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max:
+            break
+    if values.isna().any():
+        return values.astype(np.dtype(dtype).name.capitalize())
+
+    return values.astype(dtype)
+
+
+def compact_data(df: DataFrame, dictionaries: dict = None) -> DataFrame:
+    """
+    Return the consolidated dataframe in compact form: the fields with few distinct values become categoricals, the
+    usernames become int32 ids of an intern table, the integer fields take the smallest integer type, the durations
+    are stored in single precision and the Time field is replaced by its UTC offset, since the time is given by
+    Unix_Time. If the Time field does not have the layout of the extracted logs it becomes a categorical instead. The
+    roles of the users with more than one role are joined (see transforming.join_roles).
+
+    The categories of the fields and the usernames are kept in dictionaries where the values are only ever added at
+    the end: the chunks of the logs compacted with the dictionaries returned for the previous chunks share the codes
+    of the values, and the categorical fields can be concatenated. The dictionaries are stored in the attributes of
+    the dataframe, see get_dictionaries.
+
+    Args:
+        df: The consolidated dataframe.
+        dictionaries: The dictionaries of the previous chunks, None for new dictionaries.
+
+    Returns:
+        The compact dataframe. The given dataframe is not modified.
+    """
+
+    dictionaries = dict(dictionaries or {})
+    df = tr.join_roles(df).copy(deep=False)
+
+    for field in CATEGORICAL_FIELDS:
+        if field in df:
+            values = df[field]
+            uniques = values.cat.categories if isinstance(values.dtype, pd.CategoricalDtype) else values.unique()
+            dictionaries[field] = extend_dictionary(dictionaries.get(field), uniques)
+            df[field] = pd.Categorical(values, categories=dictionaries[field])
+
+    if 'Username' in df:
+        df['Username'], dictionaries['Username'] = intern_usernames(df['Username'], dictionaries.get('Username'))
+
+    if 'Time' in df:
+        offsets = None
+        if 'Unix_Time' in df and len(df):
+            offsets = tm.get_utc_offsets(df['Time'], df['Unix_Time'].to_numpy(dtype=np.int64))
+        if offsets is not None:
+            position = df.columns.get_loc('Time')
+            df = df.drop(columns='Time')
+            df.insert(position, OFFSET_FIELD, offsets.astype(np.int16))
+        else:
+            dictionaries['Time'] = extend_dictionary(dictionaries.get('Time'), df['Time'].unique())
+            df['Time'] = pd.Categorical(df['Time'], categories=dictionaries['Time'])
+
+    for field in INTEGER_FIELDS:
+        if field in df:
+            df[field] = narrow_integers(df[field])
+    for field in FLOAT_FIELDS:
+        if field in df:
+            df[field] = df[field].astype(np.float32)
+
+    df.attrs[DICTIONARIES] = dictionaries
+
+    return df
+
+
+def decode_usernames(ids, table: Index) -> np.ndarray:
+    """
+    Return the usernames of the ids of the intern table, nan for the id -1.
+    """
+
+    ids = np.asarray(ids, dtype=np.int64)
+    usernames = np.asarray(table, dtype=object)[ids]
+    usernames[ids < 0] = np.nan
+
+    return usernames
+
+
+def expand_data(df: DataFrame, dictionaries: dict = None) -> DataFrame:
+    """
+    Return the compact dataframe with the fields of the consolidated dataframe: the strings of the categorical fields,
+    the usernames, the Time field, the lists of roles and the int64 and float64 fields.
+
+    Args:
+        df: The compact dataframe.
+        dictionaries: The dictionaries of the dataframe, those of its attributes if None.
+
+    Returns:
+        The consolidated dataframe.
+    """
+
+    if dictionaries is None:
+        dictionaries = get_dictionaries(df)
+    df = df.copy(deep=False)
+
+    for field in CATEGORICAL_FIELDS + ['Time']:
+        if field in df and isinstance(df[field].dtype, pd.CategoricalDtype):
+            df[field] = df[field].to_numpy(dtype=object, na_value=np.nan)
+
+    if 'Username' in df and 'Username' in dictionaries:
+        df['Username'] = decode_usernames(df['Username'], dictionaries['Username'])
+
+    if OFFSET_FIELD in df:
+        position = df.columns.get_loc(OFFSET_FIELD)
+        times = tm.format_log_times(df['Unix_Time'], df[OFFSET_FIELD])
+        df = df.drop(columns=OFFSET_FIELD)
+        df.insert(position, 'Time', times)
+
+    for field in INTEGER_FIELDS:
+        if field in df:
+            df[field] = df[field].astype('Int64' if df[field].isna().any() or field == 'courseid' else np.int64)
+    for field in FLOAT_FIELDS:
+        if field in df:
+            df[field] = df[field].astype(np.float64)
+
+    df = tr.split_roles(df)
+    df.attrs.pop(DICTIONARIES, None)
+
+    return df
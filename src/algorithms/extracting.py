@@ -1,43 +1,71 @@
 from src.classes.records import Records
 import src.algorithms.integrating as it
+import numpy as np
 from pandas import DataFrame
 
 
 def get_startdate_enddate(df: DataFrame,
-                          file_path: str):
+                          file_path) -> DataFrame:
     """
     Remove values that are inconsistent with the start and end dates. You can query the database or manually add them.
+    The dates are joined on courseid and the records are removed at once, the given dataframe is not modified.
 
     Database query:
         select id, startdate, enddate
         from prefix_course
         where id <> 1
 
+    Args:
+        df: The dataframe object.
+        file_path: The path of the course dates file, or the courses loaded by integrating.get_courses.
+
     Returns: The dataframe purged of records previously or lately recorded in relation to course dates.
     """
 
-    course_dates = it.get_dataframe(file_path, columns=['id', 'startdate', 'enddate'])
+    if not isinstance(file_path, DataFrame):
+        file_path = it.get_courses(course_dates=file_path)
+    course_dates = file_path.dropna(subset=['startdate', 'enddate'])
 
-    for idx in range(len(course_dates)):
-        courseid = course_dates.iloc[idx]['id']
-        startdate = course_dates.iloc[idx]['startdate']
-        enddate = course_dates.iloc[idx]['enddate']
-        to_remove = list((df.loc[(df['courseid'] == courseid) &
-                                 ((df['Unix_Time'] < startdate) | (df['Unix_Time'] > enddate))]).index)
-        df.drop(to_remove, axis=0, inplace=True)
-        df = df.reset_index(drop=True)
+    # join the dates on courseid, the records of the courses without dates are kept
+    startdates = df['courseid'].map(course_dates['startdate']).to_numpy(dtype='float64', na_value=np.nan)
+    enddates = df['courseid'].map(course_dates['enddate']).to_numpy(dtype='float64', na_value=np.nan)
+    times = df['Unix_Time'].to_numpy()
+    outside = (times < startdates) | (times > enddates)
+
+    df = df.loc[~outside].reset_index(drop=True)
 
     return df
 
 
+def get_course_periods(file_path) -> dict:
+    """
+    Return the start and end dates of the courses that have both, as (startdate, enddate) Unix times by courseid.
+
+    Args:
+        file_path: The path of the course dates file, or the courses loaded by integrating.get_courses.
+    """
+
+    if not isinstance(file_path, DataFrame):
+        file_path = it.get_courses(course_dates=file_path)
+    course_dates = file_path.dropna(subset=['startdate', 'enddate'])
+
+    return dict((courseid, (float(startdate), float(enddate)))
+                for courseid, startdate, enddate in zip(course_dates.index, course_dates['startdate'],
+                                                        course_dates['enddate']))
+
+
 def extract_records(records: Records,
                     course_area: [str] = None,
                     role: [str] = None,
                     username: [str] = None,
-                    filepath: str = "") -> Records:
+                    filepath: str = "",
+                    courseid: [int] = None,
+                    copy: bool = False) -> Records:
 
     """
-    Return the filtered records by course_area, role and/or username and sorted by the specified field.
+    Return the filtered records by course_area, role, username and/or courseid. The records are selected by a query of
+    the Records object (see Records.where) answered by its indexes, so the dataframe is not scanned for each filter,
+    and the extracted records are not copied unless copy is True.
 
     Args:
         records: object of the class Records to analyse
@@ -45,32 +73,22 @@ def extract_records(records: Records,
         role: 'Student', 'Teacher', 'Manager', etc.
         username: user id's
         filepath: path to the course dates file
+        courseid: course id's
+        copy: return a copy of the records instead of a view or a subset of them
 
     Returns:
         Object of the class Records
     """
 
     # attributes to filter
-    filters = dict([('Course_Area', course_area),
-                    ('Role', role),
-                    ('Username', username)
-                    ])
-
-    # columns in the dataframe
-    columns = [i for i in filters if filters[i] is not None]
-
-    # get the df
-    df = records.get_df()
-
-    for column in columns:
-        # for each column filter the values
-        df = df.loc[df[column].isin(filters.get(column))]
+    records = records.where(Course_Area=course_area, Role=role, Username=username, courseid=courseid).collect(copy=copy)
 
     # get only the values between start_date and end_date
-    if filepath != "":
-        df = get_startdate_enddate(df.copy(), filepath)
-
-    # create a Records object for the extracted values
-    records = Records(df.copy())
+    if filepath != "" and records.is_sorted():
+        # the records out of the dates of each course are located by binary search
+        positions = records.select_periods('courseid', get_course_periods(filepath))
+        records = Records(records.take(positions).get_df().reset_index(drop=True), is_sorted=True)
+    elif filepath != "":
+        records = Records(get_startdate_enddate(records.get_df(), filepath))
 
     return records
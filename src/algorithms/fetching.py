@@ -0,0 +1,242 @@
+import os
+import json
+import base64
+import asyncio
+import http.client
+from urllib.parse import urlsplit, urlencode, urljoin
+import pandas as pd
+
+
+# version of the xAPI specification sent to the LRS
+XAPI_VERSION = '1.0.3'
+
+# file of the cursors of the queries in the directory of the pages, hidden from the log files of the directory
+CURSOR_FILE = '.cursor'
+
+# status codes of the responses retried after a while
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+
+
+def get_time_slices(since: str, until: str, slices: int) -> [(str, str)]:
+    """
+    Split the period between since and until in consecutive periods of the same length, so that they can be queried
+    at the same time. The LRS returns the statements stored after since and at or before until, so the statements of
+    the periods do not overlap.
+
+    Returns:
+        list of (since, until) tuples of ISO 8601 timestamps.
+    """
+
+    since, until = pd.Timestamp(since), pd.Timestamp(until)
+    since = since.tz_localize('UTC') if since.tzinfo is None else since.tz_convert('UTC')
+    until = until.tz_localize('UTC') if until.tzinfo is None else until.tz_convert('UTC')
+    bounds = [bound.isoformat().replace('+00:00', 'Z') for bound in pd.date_range(since, until, periods=slices + 1)]
+
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+class _ConnectionPool(object):
+    """
+    Connections to the LRS kept alive and shared by the queries, one query at a time. The requests are sent in
+    threads so that the queries run concurrently in the event loop.
+    """
+
+    def __init__(self, endpoint: str, size: int, timeout: float):
+        parts = urlsplit(endpoint)
+        self.__connection_class = http.client.HTTPConnection
+        if parts.scheme == 'https':
+            self.__connection_class = http.client.HTTPSConnection
+        self.__netloc = parts.netloc
+        self.__timeout = timeout
+        self.__connections = asyncio.Queue()
+        for _ in range(size):
+            # the connections are opened when they are first used
+            self.__connections.put_nowait(None)
+
+    def __send(self, connection, path: str, headers: dict) -> (int, dict, bytes):
+        connection.request('GET', path, headers=headers)
+        response = connection.getresponse()
+        return response.status, dict(response.getheaders()), response.read()
+
+    async def get(self, path: str, headers: dict) -> (int, dict, bytes):
+        """
+        Send the request with one of the connections and return the status, the headers and the body of the response
+        """
+        connection = await self.__connections.get()
+        try:
+            if connection is None:
+                connection = self.__connection_class(self.__netloc, timeout=self.__timeout)
+            response = await asyncio.to_thread(self.__send, connection, path, headers)
+        except (OSError, http.client.HTTPException):
+            if connection is not None:
+                connection.close()
+            connection = None
+            raise
+        finally:
+            self.__connections.put_nowait(connection)
+
+        return response
+
+    def close(self):
+        """
+        Close the connections
+        """
+        while not self.__connections.empty():
+            connection = self.__connections.get_nowait()
+            if connection is not None:
+                connection.close()
+
+
+async def _get_page(pool: _ConnectionPool, url: str, headers: dict, retries: int, backoff: float) -> dict:
+    """
+    Return the statement result at the url, retrying with an exponential backoff on connection errors and on the
+    statuses of RETRY_STATUSES.
+    """
+
+    parts = urlsplit(url)
+    path = parts.path + ('?' + parts.query if parts.query else '')
+    for attempt in range(retries + 1):
+        try:
+            status, response_headers, body = await pool.get(path, headers)
+        except (OSError, http.client.HTTPException):
+            if attempt == retries:
+                raise
+        else:
+            if status == 200:
+                return json.loads(body)
+            if status not in RETRY_STATUSES or attempt == retries:
+                raise ValueError("The LRS returned the status {} for {}: {}".format(status, url, body[:200]))
+            retry_after = response_headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                await asyncio.sleep(int(retry_after))
+                continue
+        await asyncio.sleep(backoff * 2 ** attempt)
+
+
+def _save_cursor(directory: str, cursor: dict):
+    """
+    Write the cursor file atomically, so that an interrupted fetch leaves the previous cursor.
+    """
+
+    path = os.path.join(directory, CURSOR_FILE)
+    with open(path + '.tmp', 'w') as file:
+        json.dump(cursor, file, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+async def _fetch_query(pool: _ConnectionPool,
+                       number: int,
+                       cursor: dict,
+                       directory: str,
+                       headers: dict,
+                       retries: int,
+                       backoff: float) -> int:
+    """
+    Fetch the pages of a query from its cursor and save them in the directory, following the more links. The cursor
+    of the query is saved after each page.
+    """
+
+    query = cursor['queries'][number]
+    statements = 0
+    while not query['done']:
+        page = await _get_page(pool, query['next'], headers, retries, backoff)
+        path = os.path.join(directory, 'statements_{:04d}_{:06d}.json'.format(number, query['pages']))
+        with open(path + '.tmp', 'w') as file:
+            json.dump(page, file)
+        os.replace(path + '.tmp', path)
+
+        statements += len(page.get('statements', []))
+        more = page.get('more') or ''
+        query['pages'] += 1
+        query['statements'] += len(page.get('statements', []))
+        query['done'] = more == '' or not page.get('statements')
+        query['next'] = urljoin(query['next'], more) if more else ''
+        _save_cursor(directory, cursor)
+
+    return statements
+
+
+async def _fetch(endpoint: str, directory: str, cursor: dict, headers: dict, concurrency: int, retries: int,
+                 backoff: float, timeout: float) -> int:
+    """
+    Run the queries of the cursor that are not done, concurrency pages at a time.
+    """
+
+    pool = _ConnectionPool(endpoint, concurrency, timeout)
+    try:
+        fetched = await asyncio.gather(*[_fetch_query(pool, number, cursor, directory, headers, retries, backoff)
+                                         for number in range(len(cursor['queries']))])
+    finally:
+        pool.close()
+
+    return sum(fetched)
+
+
+def fetch_statements(endpoint: str,
+                     directory: str,
+                     since: str,
+                     until: str,
+                     slices: int = 4,
+                     concurrency: int = 4,
+                     limit: int = 1000,
+                     auth: (str, str) = None,
+                     headers: dict = None,
+                     retries: int = 5,
+                     backoff: float = 0.5,
+                     timeout: float = 60) -> int:
+    """
+    Fetch the statements stored in the LRS between since and until and save the pages of the statement results in the
+    directory, where they can be consolidated as files of xAPI statements, e.g.
+    get_consolidated_data(course_names, directory=directory + '/').
+
+    The period is split in slices (see get_time_slices) queried at the same time on concurrency connections kept
+    alive, and the pages of each query are followed with their more links. The requests that fail or that the LRS
+    refuses for a while (RETRY_STATUSES) are retried with an exponential backoff. The cursor of each query is saved in
+    the CURSOR_FILE of the directory after each page, so that an interrupted fetch resumes where it stopped when the
+    function is called again with the same arguments.
+
+    Args:
+        endpoint: The url of the xAPI endpoint of the LRS, e.g. https://lrs.example.com/data/xAPI/
+        directory: The directory of the pages.
+        since: The start of the period (excluded), an ISO 8601 timestamp, in UTC if it has no offset.
+        until: The end of the period (included).
+        slices: The number of queries the period is split in.
+        concurrency: The number of requests sent at the same time.
+        limit: The maximum number of statements of a page.
+        auth: The (key, secret) of the basic authentication.
+        headers: Other headers of the requests.
+        retries: The number of retries of a request.
+        backoff: The seconds before the first retry, doubled at each retry.
+        timeout: The seconds of the timeout of the connections.
+
+    Returns:
+        The number of statements fetched by this call.
+    """
+
+    os.makedirs(directory, exist_ok=True)
+    query = {'endpoint': endpoint, 'since': since, 'until': until, 'slices': slices, 'limit': limit}
+
+    cursor_path = os.path.join(directory, CURSOR_FILE)
+    if os.path.exists(cursor_path):
+        with open(cursor_path) as file:
+            cursor = json.load(file)
+        if cursor['query'] != query:
+            raise ValueError("The directory {} holds the pages of another fetch: {}".format(directory, cursor['query']))
+    else:
+        url = urljoin(endpoint if endpoint.endswith('/') else endpoint + '/', 'statements')
+        cursor = {'query': query,
+                  'queries': [{'since': start, 'until': end, 'pages': 0, 'statements': 0, 'done': False,
+                               'next': url + '?' + urlencode({'since': start, 'until': end, 'limit': limit,
+                                                              'ascending': 'true'})}
+                              for start, end in get_time_slices(since, until, slices)]}
+        _save_cursor(directory, cursor)
+
+    headers = dict(headers or {})
+    headers['X-Experience-API-Version'] = XAPI_VERSION
+    if auth is not None:
+        credentials = base64.b64encode('{}:{}'.format(*auth).encode()).decode()
+        headers['Authorization'] = 'Basic ' + credentials
+
+    fetched = asyncio.run(_fetch(endpoint, directory, cursor, headers, concurrency, retries, backoff, timeout))
+
+    return fetched
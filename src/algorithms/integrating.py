@@ -1,55 +1,113 @@
 import pandas as pd
 from pandas import DataFrame
 import numpy as np
+import src.algorithms.rules as ru
 import src.algorithms.timing as tm
 import src.algorithms.transforming as tr
+from src.classes.pipeline import Pipeline
 import glob
+import json
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 
-def collect_log_files(directory_path: str) -> DataFrame:
+def collect_log_files(directory_path: str,
+                      workers: int = None,
+                      executor: str = 'thread',
+                      dtype: dict = None,
+                      return_stats: bool = False):
     """
     It is possible to have a number of course files instead of a single one.
-    The selected directory must contain all related files.
+    The selected directory must contain all related files, extracted logs csv files or files of xAPI statements (see
+    read_xapi_statements). The files are read concurrently and concatenated once.
 
     Args:
         directory_path: The path of the directory that contains all the files.
+        workers: The number of files read at the same time, chosen by the executor if None.
+        executor: 'thread' or 'process'.
+        dtype: The types of the fields of the log files, transforming.LOG_DTYPES if None, so that the fields of all
+            the files have the same type.
+        return_stats: Also return the number of records of each file and the seconds spent reading it.
+
+    Returns: The dataframe containing the logs of the all the course files inserted in the directory and, if
+        return_stats is True, the dataframe of the statistics of the files.
+    """
+
+    if dtype is None:
+        dtype = tr.LOG_DTYPES
+    if executor == 'process':
+        pool = ProcessPoolExecutor(max_workers=workers)
+    elif executor == 'thread':
+        pool = ThreadPoolExecutor(max_workers=workers)
+    else:
+        raise ValueError("executor must be 'thread' or 'process'")
+
+    file_paths = get_log_files(directory_path)
+    with pool:
+        # the results are returned in the order of the files
+        results = list(pool.map(_read_log_file, file_paths, [dtype] * len(file_paths)))
+
+    if results:
+        logs = pd.concat([file_logs for file_logs, seconds in results], axis=0, ignore_index=True)
+    else:
+        logs = pd.DataFrame()
+
+    if return_stats:
+        stats = DataFrame({'File': file_paths,
+                           'Rows': [len(file_logs) for file_logs, seconds in results],
+                           'Seconds': [seconds for file_logs, seconds in results]})
+        return logs, stats
+
+    return logs
+
 
-    Returns: The dataframe containing the logs of the all the course files inserted in the directory.
+def get_log_files(directory_path: str) -> [str]:
+    """
+    Return the paths of the log files of the directory: the extracted logs csv files and the files of xAPI statements.
     """
 
-    logs = pd.DataFrame()
+    file_paths = glob.glob(directory_path + '*.csv')
+    for extension in XAPI_EXTENSIONS:
+        file_paths += glob.glob(directory_path + '*' + extension)
 
-    for file_path in glob.glob(directory_path + '*.csv'):
-        # get the log data of the file
-        file_logs = get_dataframe(file_path)
-        # concatenate the file logs to all the logs
-        logs = pd.concat([logs, file_logs], axis=0)
+    return file_paths
 
-    # reset the index
-    logs = logs.reset_index(drop=True)
 
-    return logs
+def _read_log_file(file_path: str, dtype: dict) -> (DataFrame, float):
+    """
+    Read a log file and return it together with the seconds spent reading it.
+    """
+
+    start = time.perf_counter()
+    file_logs = get_dataframe(file_path, dtype=dtype)
+
+    return file_logs, time.perf_counter() - start
 
 
-def get_dataframe(file_path: str, columns: [] = None) -> DataFrame:
+def get_dataframe(file_path: str, columns: [] = None, dtype: dict = None) -> DataFrame:
     """
-    Read the dataframe and add columns if missing.
+    Read the dataframe and add columns if missing. The files of xAPI statements are read by get_xapi_dataframe.
 
     Args:
         file_path: The path of the dataframe object.
         columns: The list of column names.
+        dtype: The types of the fields, inferred if None.
 
     Returns:
         The dataframe with column names.
     """
 
-    df = pd.read_csv(file_path, sep=',')
+    if is_xapi_file(file_path):
+        return get_xapi_dataframe(file_path)
+
+    df = pd.read_csv(file_path, sep=',', dtype=dtype)
 
     # add column names if missing
     try:
         value_type = int(df.columns[0])
         if isinstance(value_type, int):
-            df = pd.read_csv(file_path, sep=',', header=None)
+            df = pd.read_csv(file_path, sep=',', header=None, dtype=dtype)
             df.columns = columns
     except ValueError:
         pass
@@ -60,30 +118,313 @@ def get_dataframe(file_path: str, columns: [] = None) -> DataFrame:
     return df
 
 
-def add_course_id(df: DataFrame) -> DataFrame:
+# extensions of the files of xAPI statements (JSON arrays, JSON lines or LRS statement results)
+XAPI_EXTENSIONS = ('.json', '.jsonl', '.ndjson')
+
+# separators between the JSON values of a file, between the members of an object and between a key and its value
+_JSON_VALUE_SEPARATORS = re.compile(r'[\s,\[\]]*')
+_JSON_SEPARATORS = re.compile(r'[\s,]*')
+_JSON_WHITESPACE = re.compile(r'\s*')
+
+# beginning of the statement results of an LRS
+_STATEMENT_RESULT = re.compile(r'\{\s*"(?:statements|more)"\s*:')
+
+# tags of the languages of the language maps, e.g. 'en' or 'en-US'
+_LANGUAGE_TAG = re.compile(r'^[a-z]{2,3}(-[A-Za-z0-9]+)*$')
+
+
+def is_xapi_file(file_path: str) -> bool:
     """
-    Add the course id by extracting it from the RelatedActivities field.
+    Return True if the file contains xAPI statements rather than the extracted logs csv file.
     """
+    return file_path.lower().endswith(XAPI_EXTENSIONS)
 
-    items = df['RelatedActivities'].values
 
-    ids = []
-    for item in items:
-        if "course/view.php" in item:
-            courseid = item.split('/course/view.php?id=')[1].split("'")[0]
+def read_xapi_statements(file_path: str, block_size: int = 2 ** 20):
+    """
+    Read the xAPI statements of a file one by one, without loading the file at once. The file can contain statements
+    one per line (JSON lines), a JSON array of statements, or statement results of an LRS ({"statements": [...],
+    "more": "..."}), one or more per file. The file is read in blocks and each statement is decoded when the block
+    that ends it has been read. The statements of the statement results that begin with their statements or more
+    member, as returned by the LRS, are decoded one at a time, so the memory used depends on the size of a statement
+    rather than on the size of the file.
+
+    Args:
+        file_path: The path of the file.
+        block_size: The number of characters read at once.
+
+    Returns:
+        A generator of the statements (dictionaries).
+    """
+
+    decoder = json.JSONDecoder()
+
+    with open(file_path, 'r', encoding='utf-8') as file:
+        buffer, position, eof = '', 0, False
+
+        def read() -> bool:
+            # add a block to the buffer, False at the end of the file
+            nonlocal buffer, position, eof
+            block = file.read(block_size)
+            if not block:
+                eof = True
+                return False
+            buffer = buffer[position:] + block
+            position = 0
+            return True
+
+        def skip(separators: re.Pattern = _JSON_SEPARATORS) -> str:
+            # skip the separators and return the next character, '' at the end of the file
+            nonlocal position
+            while True:
+                position = separators.match(buffer, position).end()
+                if position < len(buffer) or not read():
+                    return buffer[position:position + 1]
+
+        def decode():
+            # decode the value at the position, reading blocks until it is complete
+            nonlocal position
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buffer, position)
+                    # a number at the end of the buffer may continue in the next block
+                    if end < len(buffer) or eof:
+                        position = end
+                        return value
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                if not read():
+                    value, position = decoder.raw_decode(buffer, position)
+                    return value
+
+        while True:
+            character = skip(_JSON_VALUE_SEPARATORS)
+            if character == '':
+                return
+            if character != '{':
+                raise ValueError("Invalid xAPI file {}: unexpected '{}'".format(file_path, character))
+
+            # the beginning of the object tells a statement from a statement result
+            while len(buffer) - position < 64 and read():
+                pass
+            if not _STATEMENT_RESULT.match(buffer, position):
+                value = decode()
+                if isinstance(value.get('statements'), list):
+                    yield from value['statements']
+                else:
+                    yield value
+                continue
+
+            # the members of the statement result are decoded one by one, and its statements one at a time
+            position += 1
+            while True:
+                character = skip()
+                if character == '}':
+                    position += 1
+                    break
+                if character == '':
+                    raise ValueError("Invalid xAPI file {}: unexpected end of file".format(file_path))
+                key = decode()
+                if skip(_JSON_WHITESPACE) != ':':
+                    raise ValueError("Invalid xAPI file {}: ':' expected after '{}'".format(file_path, key))
+                position += 1
+                if skip(_JSON_WHITESPACE) == '[' and key == 'statements':
+                    position += 1
+                    while skip() not in (']', ''):
+                        yield decode()
+                    position += 1
+                else:
+                    decode()
+
+
+def _get_xapi_value(statement: dict, path: tuple):
+    """
+    Return the value at the path of the statement, None if it is missing. The language maps without the language of
+    the path give their first value, and the keys of the extensions are compared with the last part of their IRI.
+    """
+
+    value = statement
+    parent = None
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        if key in value:
+            parent, value = key, value[key]
+        elif parent == 'extensions':
+            found = [item for name, item in value.items() if str(name).rstrip('/').rsplit('/', 1)[-1] == key]
+            found += [item[key] for item in value.values() if isinstance(item, dict) and key in item]
+            if not found:
+                return None
+            parent, value = key, found[0]
+        elif value and all(_LANGUAGE_TAG.match(str(name)) and isinstance(item, str) for name, item in value.items()):
+            # language map without the language, the variants of the language (e.g. en-US) come first
+            names = sorted(value, key=lambda name: not str(name).startswith(key))
+            parent, value = key, value[names[0]]
         else:
-            courseid = str(0)
-        ids.append(courseid)
+            return None
+
+    return value
+
+
+def _format_xapi_value(field: str, value) -> str:
+    """
+    Return the value of the statement as it is written in the extracted logs csv file.
+    """
+
+    if value is None:
+        return np.nan
+    if field == 'RelatedActivities' and isinstance(value, list):
+        # the stringified list of the ids of the activities
+        return str([activity.get('id') if isinstance(activity, dict) else activity for activity in value])
+    if isinstance(value, str):
+        return value
+
+    return str(value)
+
+
+def read_xapi_chunks(file_path: str, chunksize: int = 100000, fields: dict = None):
+    """
+    Read the xAPI statements of a file (see read_xapi_statements) in dataframes of chunksize records with the fields
+    of the extracted logs csv file, so that they are processed as the chunks of read_log_chunks. Only the fields are
+    kept from each statement, and the timestamps are normalised to the layout of the extracted logs. As in
+    get_dataframe, the records get the 'index' field with their position in the file.
+
+    Args:
+        file_path: The path of the file.
+        chunksize: The number of records of each chunk.
+        fields: The paths of the fields in the statements, transforming.XAPI_FIELDS if None.
+
+    Returns:
+        A generator of dataframes.
+    """
+
+    if fields is None:
+        fields = tr.XAPI_FIELDS
+    position = 0
+
+    def to_dataframe(columns: dict) -> DataFrame:
+        chunk = DataFrame(columns, dtype=object)
+        chunk['timestamp'] = tm.normalize_xapi_timestamps(chunk['timestamp'])
+        chunk.insert(0, 'index', np.arange(position, position + len(chunk)))
+        return chunk
+
+    columns = dict((field, []) for field in fields)
+    for statement in read_xapi_statements(file_path):
+        for field, paths in fields.items():
+            value = None
+            for path in paths:
+                value = _get_xapi_value(statement, path)
+                if value is not None:
+                    break
+            columns[field].append(_format_xapi_value(field, value))
+
+        if len(columns['timestamp']) == chunksize:
+            yield to_dataframe(columns)
+            position += chunksize
+            columns = dict((field, []) for field in fields)
 
-    df['courseid'] = ids
+    if len(columns['timestamp']) or position == 0:
+        yield to_dataframe(columns)
 
-    # set data type
-    df['courseid'] = df['courseid'].astype('Int64')
+
+def get_xapi_dataframe(file_path: str, fields: dict = None) -> DataFrame:
+    """
+    Read the xAPI statements of a file in a dataframe with the fields of the extracted logs csv file, as get_dataframe
+    reads the csv file.
+    """
+
+    df = pd.concat(read_xapi_chunks(file_path, fields=fields), ignore_index=True)
 
     return df
 
 
-def add_course_name(df: DataFrame, course_names: str) -> DataFrame:
+def parse_related_activities(df: DataFrame) -> DataFrame:
+    """
+    Extract the information needed by the consolidation from the RelatedActivities field in one pass, so that the
+    following functions do not have to split the strings again. The field is the stringified list of the activities
+    related to the statement, e.g.
+    ['https://your_moodle_site/mod/forum/view.php?id=12', 'https://your_moodle_site',
+     'https://your_moodle_site/course/view.php?id=5', 'http://moodle.org']
+
+    Each distinct value is parsed once and the results are mapped back to the records. The following fields are added:
+        courseid: the id of the course (course/view.php?id=), 0 if the action is not performed in a course
+        Module: the type of the module (mod/<type>), e.g. 'forum'
+        Module_id: the id of the course module (mod/<type>/view.php?id=)
+        Site: the url of the Moodle site
+
+    Returns:
+        The dataframe with the fields courseid, Module, Module_id and Site.
+    """
+
+    codes, items = pd.factorize(df['RelatedActivities'], use_na_sentinel=False)
+    items = pd.Series(np.asarray(items, dtype=object), dtype=object)
+
+    courseids = items.str.extract(r"/course/view\.php\?id=([^']*)", expand=False)
+    courseids = pd.to_numeric(courseids).fillna(0).astype('Int64')
+    modules = items.str.extract(r'(?:^|/)mod/([^/]*)', expand=False)
+    module_ids = pd.to_numeric(items.str.extract(r"(?:^|/)mod/[^/']*/view\.php\?id=(\d+)", expand=False))
+    sites = items.str.extract(r"(https?://[^/',\s\]]+)", expand=False)
+
+    df['courseid'] = courseids.array.take(codes)
+    df['Module'] = modules.to_numpy(dtype=object)[codes]
+    df['Module_id'] = module_ids.astype('Int64').array.take(codes)
+    df['Site'] = sites.to_numpy(dtype=object)[codes]
+
+    return df
+
+
+def add_course_id(df: DataFrame) -> DataFrame:
+    """
+    Add the course id by extracting it from the RelatedActivities field. The other fields extracted by
+    parse_related_activities are added as well.
+    """
+
+    df = parse_related_activities(df)
+
+    return df
+
+
+def get_courses(course_names: str = "", course_dates: str = "") -> DataFrame:
+    """
+    Load the course names and dates files once into a table indexed by courseid, to be joined to the logs by
+    add_course_name and get_startdate_enddate (see extracting). A course listed more than once in the names file keeps
+    its last name, and a name listed for more than one course goes to the first one. A course listed more than once in
+    the dates file keeps its latest start date and its earliest end date.
+
+    Args:
+        course_names: The path of the course names file (fields coursename, id).
+        course_dates: The path of the course dates file (fields id, startdate, enddate).
+
+    Returns:
+        The dataframe of the courses with the fields 'coursename', 'startdate' and 'enddate'.
+    """
+
+    courses = DataFrame(columns=['coursename', 'startdate', 'enddate'], index=pd.Index([], dtype='Int64', name='id'))
+
+    if course_names != "":
+        names = get_dataframe(course_names, columns=['id', 'coursename'])
+        # the header may contain spaces after the separators
+        names.columns = names.columns.str.strip()
+        names['id'] = names['id'].astype('Int64')
+        names['coursename'] = names['coursename'].astype('str')
+        names = names.drop_duplicates('coursename', keep='first').drop_duplicates('id', keep='last')
+        courses = courses.drop(columns='coursename').join(names.set_index('id')['coursename'], how='outer')
+
+    if course_dates != "":
+        dates = get_dataframe(course_dates, columns=['id', 'startdate', 'enddate'])
+        dates.columns = dates.columns.str.strip()
+        dates = dates.astype({'id': 'Int64', 'startdate': 'int64', 'enddate': 'int64'})
+        dates = dates.groupby('id').agg({'startdate': 'max', 'enddate': 'min'})
+        courses = courses.drop(columns=['startdate', 'enddate']).join(dates, how='outer')
+
+    courses.index = courses.index.astype('Int64')
+    courses.index.name = 'id'
+
+    return courses[['coursename', 'startdate', 'enddate']]
+
+
+def add_course_name(df: DataFrame, course_names) -> DataFrame:
     """
     Add the name of the course based on the courseid and name listed in the course_names file. Please be aware
     that actions performed in courses not listed in the file will be removed during cleaning.
@@ -92,7 +433,7 @@ def add_course_name(df: DataFrame, course_names: str) -> DataFrame:
 
     Args:
         df: The dataframe object.
-        course_names: The path of the course names file.
+        course_names: The path of the course names file, or the courses loaded by get_courses.
 
     Returns:
         The dataframe with the field course name.
@@ -100,26 +441,63 @@ def add_course_name(df: DataFrame, course_names: str) -> DataFrame:
     """
 
     # get data
-    course_names = get_dataframe(course_names, columns=['id', 'coursename'])
-    # set data type
-    course_names['id'] = course_names['id'].astype('Int64')
-    course_names['coursename'] = course_names['coursename'].astype('str')
-    names = course_names['coursename']
-
-    for name in names:
-        courseid = course_names.loc[course_names['coursename'] == name]['id'].values[0]
-        df.loc[df['courseid'] == courseid, 'Course_Area'] = name
+    if not isinstance(course_names, DataFrame):
+        course_names = get_courses(course_names=course_names)
+    names = course_names['coursename'].dropna()
+
+    if 'Course_Area' not in df:
+        df['Course_Area'] = np.nan
+    # join the names on courseid
+    joined = df['courseid'].map(names)
+    listed = joined.notnull().to_numpy()
+    if listed.any():
+        areas = df['Course_Area'].to_numpy(dtype=object, copy=True)
+        areas[listed] = joined.to_numpy(dtype=object)[listed]
+        df['Course_Area'] = areas
 
     return df
 
 
-def add_timestamps(df: DataFrame) -> DataFrame:
+def add_timestamps(df: DataFrame,
+                   time_format: str = tm.TIME_FORMAT,
+                   converter=None) -> DataFrame:
     """
     Add the column 'Unix_Time' to the dataframe containing the converted value of the time in a timestamp so that it
     can be used by other functions.
+
+    Args:
+        df: The dataframe object.
+        time_format: The format of the Time field, inferred if None.
+        converter: A function converting a single time in a timestamp, e.g. timing.convert_time_to_timestamp,
+            to use for custom formats that the vectorised parser does not handle.
+
+    Returns:
+        The dataframe with the field Unix_Time.
     """
 
-    df['Unix_Time'] = df.loc[:, 'Time'].map(lambda x: tm.convert_time_to_timestamp(x))
+    df['Unix_Time'] = tm.convert_times_to_timestamps(df['Time'], time_format=time_format, converter=converter)
+
+    return df
+
+
+def _split_paths(paths: np.ndarray, separator: str) -> np.ndarray:
+    """
+    Return the second part of each distinct path split on the separator.
+    """
+
+    return np.asarray([path.split(separator)[1] for path in paths], dtype=object)
+
+
+def decompose_path(df: DataFrame) -> DataFrame:
+    """
+    Add the Component and Event_name fields by splitting the Path field, e.g. \\mod_forum\\event\\discussion_viewed.
+    The distinct paths are split once and the results are mapped back to the records as categoricals, so that the
+    following functions work on integer codes rather than on strings.
+    """
+
+    codes, paths = pd.factorize(df['Path'])
+    df['Component'] = ru.to_categorical(_split_paths(paths, '\\'), codes)
+    df['Event_name'] = ru.to_categorical(_split_paths(paths, 'event\\'), codes)
 
     return df
 
@@ -129,7 +507,8 @@ def add_component(df: DataFrame) -> DataFrame:
     Add the component field to the dataframe.
     """
 
-    df['Component'] = [x.split('\\')[1] for x in df['Path']]
+    codes, paths = pd.factorize(df['Path'])
+    df['Component'] = ru.to_categorical(_split_paths(paths, '\\'), codes)
 
     return df
 
@@ -139,7 +518,8 @@ def add_event_name(df: DataFrame) -> DataFrame:
     Add the event_name field to the dataframe.
     """
 
-    df['Event_name'] = [x.split('event\\')[1] for x in df['Path']]
+    codes, paths = pd.factorize(df['Path'])
+    df['Event_name'] = ru.to_categorical(_split_paths(paths, 'event\\'), codes)
 
     return df
 
@@ -147,38 +527,10 @@ def add_event_name(df: DataFrame) -> DataFrame:
 def redefine_course_area(df: DataFrame) -> DataFrame:
     """
     Add the Course_Area field to those records that identify actions performed in the site outside a course and that
-    miss a value.
-    """
-
-    # authentication
-    df.loc[df['Event_name'] == 'user_loggedin', 'Course_Area'] = 'Authentication'
-    df.loc[df['Event_name'] == 'user_loggedout', 'Course_Area'] = 'Authentication'
-
-    # overall site
-    df.loc[(df['Event_name'] == 'course_viewed') & (df['courseid'] == 1), 'Course_Area'] = 'Moodle Site'
-    df.loc[(df['Event_name'] == 'user_created'), 'Course_Area'] = 'Moodle Site'
-    df.loc[(df['Event_name'] == 'user_deleted'), 'Course_Area'] = 'Moodle Site'
-    df.loc[(df['Event_name'] == 'role_updated'), 'Course_Area'] = 'Moodle Site'
-    df.loc[(df['Event_name'] == 'role_assigned') & (df['courseid'] == 1), 'Course_Area'] = 'Moodle Site'
-    df.loc[(df['Event_name'] == 'role_unassigned') & (df['courseid'] == 1), 'Course_Area'] = 'Moodle Site'
-    df.loc[(df['Event_name'] == 'user_enrolment_deleted') & (df['courseid'] == 1), 'Course_Area'] = 'Moodle Site'
-    df.loc[(df['Event_name'] == 'user_enrolment_updated') & (df['courseid'] == 1), 'Course_Area'] = 'Moodle Site'
-    df.loc[df['Event_name'].str.contains('course_category'), 'Course_Area'] = 'Moodle Site'
-    df.loc[df['Event_name'] == 'courses_searched', 'Course_Area'] = 'Moodle Site'
-    df.loc[df['Event_name'].str.contains('notification'), 'Course_Area'] = 'Moodle Site'
-    df.loc[(df['Event_name'] == 'user_report_viewed') &
-           (df['Component'] == 'mod_forum') & (df['courseid'] == 0), 'Course_Area'] = 'Moodle Site'
-
-    # profile
-    df.loc[df['Event_name'].str.contains('dashboard'), 'Course_Area'] = 'Profile'
-    df.loc[(df['Event_name'] == 'user_profile_viewed') & (df['courseid'] == 0), 'Course_Area'] = 'Profile'
-    df.loc[(df['Event_name'] == 'grade_report_viewed') & (df['courseid'] == 0), 'Course_Area'] = 'Profile'
-    df.loc[df['Event_name'] == 'user_password_updated', 'Course_Area'] = 'Profile'
-    df.loc[df['Event_name'] == 'user_updated', 'Course_Area'] = 'Profile'
-
-    # social interaction
-    df.loc[(df['Event_name'].str.contains('(?i)message')) &
-           (df['Component'] != 'mod_chat'), 'Course_Area'] = 'Social interaction'
+    miss a value. The rules are listed in the COURSE_AREA_RULES table of the rules module.
+    """
+
+    df = ru.apply_rules(df, 'course_area')
 
     return df
 
@@ -187,419 +539,198 @@ def redefine_component(df: DataFrame) -> DataFrame:
     """
     The component field can be labelled with the 'System' value even though the log is clearly generated when the user
     is performing an action on a specific module. Sometimes some records are recorded on different components even
-    though they are related to the same component. This function redefines the component field.
+    though they are related to the same component. This function redefines the component field according to the
+    COMPONENT_RULES table of the rules module.
 
     """
 
     # course activity completion updated
-    ccu = list(df.loc[df['Event_name'] == 'course_module_completion_updated'].index)
-    for idx in ccu:
-        text = df.loc[idx, 'RelatedActivities'].split('/')
-        df.loc[idx, 'Component'] = 'mod_' + text[text.index('mod') + 1]
+    if 'Module' not in df:
+        df = parse_related_activities(df)
+    ccu = df['Event_name'] == 'course_module_completion_updated'
+    if ccu.any():
+        components = 'mod_' + df.loc[ccu, 'Module'].astype(object)
+        if isinstance(df['Component'].dtype, pd.CategoricalDtype):
+            new_components = pd.Index(components.dropna().unique()).difference(df['Component'].cat.categories)
+            df['Component'] = df['Component'].cat.add_categories(new_components)
+        df.loc[ccu, 'Component'] = components
+
+    df = ru.apply_rules(df, 'component')
 
-    df.loc[df['Component'].str.contains('https'), 'Component'] = 'DELETE'
-
-    # assignment
-    df.loc[df['Component'] == 'assignsubmission_file', 'Component'] = 'File submissions'
-    df.loc[df['Component'] == 'assignsubmission_onlinetext', 'Component'] = 'Online text submissions'
-    df.loc[(df['Component'] == 'mod_assign'), 'Component'] = 'Assignment'
+    return df
 
-    # attendance
-    df.loc[(df['Component'] == 'mod_attendance'), 'Component'] = 'Attendance'
 
-    # authentication
-    df.loc[df['Event_name'] == 'user_loggedin', 'Component'] = 'Login'
-    df.loc[df['Event_name'] == 'user_loggedout', 'Component'] = 'Logout'
+def redefine_event_name(df: DataFrame) -> DataFrame:
+    """
+    Transform the path extracted from the statement.extension in the extended readable format. The rules are listed in
+    the EVENT_NAME_RULES table of the rules module and can be extended with rules.register_rule according to your
+    needs. The complete list of events is available on https://yoursite/report/eventlist/index.php
 
-    # big blue button
-    df.loc[df['Component'] == 'mod_bigbluebuttonbn', 'Component'] = 'Big Blue Button'
+    """
 
-    # book
-    df.loc[df['Component'] == 'mod_book', 'Component'] = 'Book'
-    df.loc[df['Component'] == 'booktool_print', 'Component'] = 'Book'
+    df = ru.apply_rules(df, 'event_name')
 
-    # chat
-    df.loc[df['Component'] == 'mod_chat', 'Component'] = 'Chat'
+    return df
 
-    # checklist
-    df.loc[df['Component'] == 'mod_checklist', 'Component'] = 'Checklist'
 
-    # choice
-    df.loc[df['Component'] == 'mod_choice', 'Component'] = 'Choice'
+def get_role_courses(df: DataFrame) -> []:
+    """
+    Return the ids of the courses whose roles are computed: the courses with at least a record with a Course_Area,
+    excluding the site-level ids 0 and 1.
+    """
 
-    # course home
-    df.loc[(df['courseid'] != 0) & (df['Event_name'] == 'course_viewed'), 'Component'] = 'Course home'
+    courseids = df.loc[df.Course_Area.notnull()]['courseid'].unique()
+    courseids = [courseid for courseid in courseids if courseid != 0 and courseid != 1]
 
-    # courses list
-    df.loc[df['Event_name'] == 'course_category_viewed', 'Component'] = 'Courses list'
-    df.loc[df['Event_name'] == 'courses_searched', 'Component'] = 'Courses list'
+    return courseids
 
-    # dashboard
-    df.loc[df['Event_name'].str.contains('dashboard'), 'Component'] = 'Dashboard'
 
-    # database
-    df.loc[df['Component'] == 'mod_data', 'Component'] = 'Database'
+def get_role_events(df: DataFrame, courseids: [] = None) -> DataFrame:
+    """
+    Return the role assignments and unassignments performed in the given courses in the order of the dataframe.
 
-    # enrollment
-    df.loc[df['Event_name'].str.contains('user_enrolment'), 'Component'] = 'Enrolment'
+    Returns:
+        The dataframe of the events with the fields 'courseid', 'Username', 'Unix_Time', 'Role', 'Assigned' and the
+        position 'Order' of the event in the logs.
+    """
 
-    # feedback
-    df.loc[df['Component'] == 'mod_feedback', 'Component'] = 'Feedback'
+    if courseids is None:
+        courseids = get_role_courses(df)
 
-    # file
-    df.loc[df['Component'] == 'mod_resource', 'Component'] = 'File'
+    selected = ((df.Component == 'Role') & df.courseid.isin(courseids) &
+                df.Verb.isin(['has been assigned', 'has been unassigned'])).to_numpy(dtype=bool, na_value=False)
+    events = df.loc[selected]
+    events = DataFrame({'courseid': events['courseid'].astype('int64').values,
+                        'Username': events['Username'].values,
+                        'Unix_Time': events['Unix_Time'].values if 'Unix_Time' in events else 0,
+                        'Role': events['Context'].values,
+                        'Assigned': (events['Verb'] == 'has been assigned').values,
+                        'Order': np.flatnonzero(selected)})
 
-    # folder
-    df.loc[df['Component'] == 'mod_folder', 'Component'] = 'Folder'
+    return events
 
-    # forum
-    df.loc[df['Component'] == 'mod_forum', 'Component'] = 'Forum'
 
-    # glossary
-    df.loc[df['Component'] == 'mod_glossary', 'Component'] = 'Glossary'
+def _format_roles(roles: []):
+    """
+    Return 'Guest' when no role is assigned, the role when there is only one and the list of roles otherwise.
+    """
 
-    # grades
-    df.loc[df['Event_name'] == 'grade_report_viewed', 'Component'] = 'Grades'
-    df.loc[df['Event_name'] == 'course_user_report_viewed', 'Component'] = 'Grades'
-    df.loc[df['Event_name'] == 'grade_item_updated', 'Component'] = 'Grades'
-    df.loc[df['Event_name'] == 'grade_item_created', 'Component'] = 'Grades'
+    if not roles:
+        return 'Guest'
+    if len(roles) == 1:
+        return roles[0]
+    return list(roles)
 
-    # group choice
-    df.loc[df['Component'] == 'mod_choicegroup', 'Component'] = 'Group choice'
 
-    # groups
-    df.loc[df['Event_name'] == 'group_member_added', 'Component'] = 'Groups'
-    df.loc[df['Event_name'] == 'group_member_removed', 'Component'] = 'Groups'
-    df.loc[(df['Event_name'].str.contains('group|Grouping')) &
-           (df['Event_name'] != 'group_message_sent'), 'Component'] = 'Groups'
+def _get_role_states(events: DataFrame) -> DataFrame:
+    """
+    Add to the role events the state of the role after each event: whether the user holds the role ('Holds') and the
+    position of the assignment that gave it ('Since'). A role is held when its last event is an assignment, and it was
+    given by the first assignment following the last unassignment, since repeated assignments have no effect.
+    """
 
-    # h5p
-    df.loc[df['Component'] == 'mod_h5pactivity', 'Component'] = 'H5P'
+    keys = ['courseid', 'Username', 'Role']
+    events = events.copy()
+    events['Holds'] = events['Assigned']
+    # each unassignment starts a new segment of the role history
+    events['Segment'] = (~events['Assigned']).astype('int64').groupby([events[key] for key in keys]).cumsum()
+    events['Since'] = np.where(events['Assigned'], events['Order'], np.nan)
+    events['Since'] = events.groupby(keys + ['Segment'])['Since'].cummin()
 
-    # imscp
-    df.loc[df['Component'] == 'mod_imscp', 'Component'] = 'IMS content package'
+    return events
 
-    # label
-    df.loc[(df['Component'] == 'mod_label'), 'Component'] = 'Label'
 
-    # lesson
-    df.loc[(df['Component'] == 'mod_lesson'), 'Component'] = 'Lesson'
+def get_role_assignments(events: DataFrame) -> DataFrame:
+    """
+    Compute the roles held by each user in each course at the end of the logs.
 
-    # lti
-    df.loc[(df['Component'] == 'mod_lti'), 'Component'] = 'External tool'
+    Args:
+        events: the role events returned by get_role_events
 
-    # messaging
-    df.loc[(df['Event_name'].str.contains('(?i)message')) & (df['Component'] != 'mod_chat'), 'Component'] = 'Messaging'
+    Returns:
+        The dataframe with the fields 'courseid', 'Username' and 'Role', where Role is a role name or the list of the
+        roles in order of assignment.
+    """
 
-    # notification
-    df.loc[df['Event_name'].str.contains('notification'), 'Component'] = 'Notification'
+    states = _get_role_states(events)
+    keys = ['courseid', 'Username']
 
-    # page
-    df.loc[(df['Component'] == 'mod_page'), 'Component'] = 'Page'
+    # the state of each role after its last event
+    last = states.drop_duplicates(keys + ['Role'], keep='last')
+    last = last.loc[last['Holds']].sort_values(keys + ['Since'])
+    roles = last.groupby(keys, sort=False)['Role'].agg(list)
 
-    # questionnaire
-    df.loc[(df['Component'] == 'mod_questionnaire'), 'Component'] = 'Questionnaire'
+    assignments = DataFrame({'courseid': states['courseid'], 'Username': states['Username']}).drop_duplicates()
+    assignments = assignments.merge(roles.rename('Role').reset_index(), on=keys, how='left')
+    assignments['Role'] = [_format_roles(role if isinstance(role, list) else []) for role in assignments['Role']]
 
-    # quiz
-    df.loc[(df['Event_name'].str.contains('Question')) & (df['Component'] == 'core'), 'Component'] = 'Quiz'
-    df.loc[(df['Component'] == 'mod_quiz'), 'Component'] = 'Quiz'
+    return assignments
 
-    # recent activity
-    df.loc[df['Event_name'] == 'recent_activity_viewed', 'Component'] = 'Recent activity'
 
-    # role
-    df.loc[df['Event_name'].str.contains('role'), 'Component'] = 'Role'
+def get_role_timeline(events: DataFrame) -> DataFrame:
+    """
+    Compute the roles held by each user in each course after every role event, so that the role in effect at a given
+    time can be retrieved with an as-of join on Unix_Time.
 
-    # scorm
-    df.loc[(df['Component'] == 'mod_scorm'), 'Component'] = 'SCORM package'
+    Args:
+        events: the role events returned by get_role_events
 
-    # site home
-    df.loc[(df['courseid'] == 1) & (df['Event_name'] == 'course_viewed'), 'Component'] = 'Site home'
+    Returns:
+        The dataframe with the fields 'courseid', 'Username', 'Unix_Time' and 'Role' sorted by Unix_Time.
+    """
 
-    # system
-    df.loc[df['Event_name'] == 'user_created', 'Component'] = 'System'
+    states = _get_role_states(events)
+    keys = ['courseid', 'Username']
 
-    # url
-    df.loc[(df['Component'] == 'mod_url'), 'Component'] = 'URL'
+    # pair every event of a user in a course with every role the user has in the course
+    moments = states[keys + ['Order', 'Unix_Time']]
+    pairs = moments.merge(states[keys + ['Role']].drop_duplicates(), on=keys).sort_values('Order')
+    # the last event of the role at or before the moment gives the state of the role
+    pairs = pd.merge_asof(pairs, states[keys + ['Role', 'Order', 'Holds', 'Since']].sort_values('Order'),
+                          on='Order', by=keys + ['Role'], direction='backward')
+    held = pairs.loc[pairs['Holds'].fillna(False).astype(bool)].sort_values(['Order', 'Since'])
+    roles = held.groupby('Order')['Role'].agg(list)
 
-    # user profile
-    df.loc[df['Event_name'] == 'user_list_viewed', 'Component'] = 'Profile'
-    df.loc[df['Event_name'] == 'user_updated', 'Component'] = 'User profile'
-    df.loc[df['Event_name'] == 'user_profile_viewed', 'Component'] = 'User profile'
+    timeline = moments.drop_duplicates('Order').set_index('Order')
+    timeline['Role'] = [_format_roles(roles.get(order, [])) for order in timeline.index]
+    # the role in effect at a given time is the one after the last event recorded at that time
+    timeline = timeline.sort_values(['Unix_Time', 'Order']).drop_duplicates(keys + ['Unix_Time'], keep='last')
+    timeline = timeline.reset_index(drop=True)
 
-    # wiki
-    df.loc[(df['Component'] == 'mod_wiki'), 'Component'] = 'Wiki'
+    return timeline
 
-    # wooclap
-    df.loc[(df['Component'] == 'mod_wooclap'), 'Component'] = 'Wooclap'
 
-    return df
+def get_role_state(events: DataFrame) -> DataFrame:
+    """
+    Compact the role events into the state of each role of each user in each course after the last event, so that the
+    roles can be computed again when new events are added without keeping the whole history. Each role is represented
+    by a single event: its first effective assignment if the role is held, its last unassignment otherwise. The state
+    followed by new events gives the same roles as the whole history (see get_role_assignments and get_role_timeline).
 
+    Args:
+        events: the role events returned by get_role_events
 
-def redefine_event_name(df: DataFrame) -> DataFrame:
+    Returns:
+        The role events of the state, in the format of get_role_events.
     """
-    Transform the path extracted from the statement.extension in the extended readable format. This function can be
-    modified according to your needs. The complete list of events is available on https://yoursite/report/eventlist/index.php
-
-    """
-
-    # assignment
-    df.loc[(df['Event_name'] == 'assessable_submitted'), 'Event_name'] = 'A submission has been submitted.'
-    df.loc[(df['Event_name'] == 'feedback_viewed'), 'Event_name'] = 'Feedback viewed'
-    df.loc[(df['Event_name'] ==
-            'remove_submission_form_viewed'), 'Event_name'] = 'Remove submission confirmation viewed.'
-    df.loc[(df['Event_name'] ==
-            'submission_confirmation_form_viewed'), 'Event_name'] = 'Submission confirmation form viewed.'
-    df.loc[(df['Event_name'] == 'submission_duplicated'), 'Event_name'] = 'The user duplicated their submission.'
-    df.loc[(df['Event_name'] == 'submission_form_viewed'), 'Event_name'] = 'Submission form viewed.'
-    df.loc[(df['Event_name'] == 'submission_graded'), 'Event_name'] = 'The submission has been graded.'
-    df.loc[(df['Event_name'] ==
-            'submission_status_viewed'), 'Event_name'] = 'The status of the submission has been viewed.'
-    df.loc[(df['Event_name'] == 'assessable_uploaded') &
-           (df['Component'] == 'File submissions'), 'Event_name'] = 'A file has been uploaded.'
-    df.loc[(df['Event_name'] == 'assessable_uploaded') &
-           (df['Component'] == 'Online text submissions'), 'Event_name'] = 'An online text has been uploaded.'
-    df.loc[(df['Event_name'] == 'submission_viewed') &
-           (df.Component == 'Assignment'), 'Event_name'] = 'Submission viewed.'
-    df.loc[df['Component'] == 'File submissions', 'Component'] = 'Assignment'
-    df.loc[df['Component'] == 'Online text submissions', 'Component'] = 'Assignment'
-    df.loc[(df['Event_name'] == 'submission_created') &
-           (df.Component == 'Assignment'), 'Event_name'] = 'Submission created.'
-    df.loc[(df['Event_name'] == 'submission_updated') &
-           (df.Component == 'Assignment'), 'Event_name'] = 'Submission updated.'
-
-    # attendance
-    df.loc[(df['Event_name'] == 'attendance_taken_by_student'), 'Event_name'] = 'Attendance taken by student'
-    df.loc[(df['Event_name'] == 'session_report_viewed'), 'Event_name'] = 'Session report viewed'
-
-    # big blue button
-    df.loc[(df['Event_name'] == 'activity_viewed'), 'Event_name'] = 'Activity viewed'
-    df.loc[(df['Event_name'] == 'bigbluebuttonbn_activity_management_viewed'), 'Event_name'] \
-        = 'BigBlueButtonBN activity management viewed'
-    df.loc[(df['Event_name'] == 'live_session_event'), 'Event_name'] = 'Live session event'
-    df.loc[(df['Event_name'] == 'meeting_created'), 'Event_name'] = 'Meeting created'
-    df.loc[(df['Event_name'] == 'meeting_ended'), 'Event_name'] = 'Meeting ended'
-    df.loc[(df['Event_name'] == 'meeting_joined'), 'Event_name'] = 'Meeting joined'
-    df.loc[(df['Event_name'] == 'meeting_left'), 'Event_name'] = 'Meeting left'
-    df.loc[(df['Event_name'] == 'recording_deleted'), 'Event_name'] = 'Recording deleted'
-    df.loc[(df['Event_name'] == 'recording_edited'), 'Event_name'] = 'Recording edited'
-    df.loc[(df['Event_name'] == 'recording_imported'), 'Event_name'] = 'Recording imported'
-    df.loc[(df['Event_name'] == 'recording_protected'), 'Event_name'] = 'Recording protected'
-    df.loc[(df['Event_name'] == 'recording_published'), 'Event_name'] = 'Recording published'
-    df.loc[(df['Event_name'] == 'recording_unprotected'), 'Event_name'] = 'Recording unprotected'
-    df.loc[(df['Event_name'] == 'recording_unpublished'), 'Event_name'] = 'Recording unpublished'
-    df.loc[(df['Event_name'] == 'recording_viewed'), 'Event_name'] = 'Recording viewed'
-
-    # book
-    df.loc[(df['Event_name'] == 'book_printed'), 'Event_name'] = 'Book printed'
-    df.loc[(df['Event_name'] == 'chapter_viewed'), 'Event_name'] = 'Chapter viewed'
-    df.loc[(df['Event_name'] == 'chapter_printed'), 'Event_name'] = 'Chapter printed'
-
-    # category
-    df.loc[(df['Event_name'] == 'course_category_viewed'), 'Event_name'] = 'Category viewed'
-    df.loc[(df['Event_name'] == 'search_results_viewed'), 'Event_name'] = 'Search results viewed'
-
-    # chat
-    df.loc[(df['Event_name'] == 'sessions_viewed'), 'Event_name'] = 'Sessions viewed'
-
-    # checklist
-    df.loc[(df['Event_name'] == 'checklist_completed'), 'Event_name'] = 'Checklist complete'
-    df.loc[(df['Event_name'] == 'student_checks_updated'), 'Event_name'] = 'Student checks updated'
-
-    # choice
-    df.loc[(df['Event_name'] == 'answer_created'), 'Event_name'] = 'Choice answer added'
-    df.loc[(df['Event_name'] == 'answer_deleted'), 'Event_name'] = 'Choice answer deleted'
-
-    # comment
-    df.loc[(df['Event_name'] == 'comment_created'), 'Event_name'] = 'Comment created'
-    df.loc[(df['Event_name'] == 'comment_deleted'), 'Event_name'] = 'Comment deleted'
-
-    # course
-    df.loc[(df['Event_name'] == 'course_viewed'), 'Event_name'] = 'Course viewed'
-    df.loc[(df['Event_name'] == 'course_completed'), 'Event_name'] = 'Course completed'
-    df.loc[(df['Event_name'] == 'course_information_viewed'), 'Event_name'] = 'Course summary viewed'
-    df.loc[(df['Event_name'] == 'course_module_completion_updated'), 'Event_name'] = 'Course activity completion updated'
-    df.loc[(df['Event_name'] == 'course_resources_list_viewed'), 'Event_name'] = 'Course module instance list viewed'
-    df.loc[(df['Event_name'] == 'courses_searched'), 'Event_name'] = 'Courses searched'
-    df.loc[(df['Event_name'] == 'course_user_report_viewed'), 'Event_name'] = 'Course user report viewed'
-    df.loc[(df['Event_name'] == 'course_module_instance_list_viewed'), 'Event_name'] = 'Course module instance list viewed'
-    df.loc[(df['Event_name'] == 'course_module_viewed'), 'Event_name'] = 'Course module viewed'
-
-    # dashboard
-    df.loc[(df['Event_name'] == 'dashboard_reset'), 'Event_name'] = 'Dashboard reset'
-    df.loc[(df['Event_name'] == 'dashboard_viewed'), 'Event_name'] = 'Dashboard viewed'
-
-    # database
-    df.loc[(df['Event_name'] == 'record_created'), 'Event_name'] = 'Record created'
-    df.loc[(df['Event_name'] == 'record_deleted'), 'Event_name'] = 'Record deleted'
-    df.loc[(df['Event_name'] == 'record_updated'), 'Event_name'] = 'Record updated'
-
-    # enrollment
-    df.loc[(df['Event_name'] == 'user_enrolment_created'), 'Event_name'] = 'User enrolled in course'
-    df.loc[(df['Event_name'] == 'user_enrolment_deleted'), 'Event_name'] = 'User unenrolled from course'
-    df.loc[(df['Event_name'] == 'user_enrolment_updated'), 'Event_name'] = 'User enrolment updated'
-
-    # feedback
-    df.loc[(df['Event_name'] == 'response_deleted'), 'Event_name'] = 'Response deleted'
-    df.loc[(df['Event_name'] == 'response_submitted') &
-           (df['Component'] == 'Feedback'), 'Event_name'] = 'Response submitted'
-
-    # folder
-    df.loc[(df['Event_name'] == 'all_files_downloaded'), 'Event_name'] = 'Zip archive of folder downloaded'
-
-    # forum
-    df.loc[(df['Event_name'] == 'assessable_uploaded') &
-           (df['Component'] == 'Forum'), 'Event_name'] = 'Some content has been posted.'
-    df.loc[(df['Event_name'] == 'course_searched'), 'Event_name'] = 'Course searched'
-    df.loc[(df['Event_name'] == 'discussion_created'), 'Event_name'] = 'Discussion created'
-    df.loc[(df['Event_name'] == 'discussion_deleted'), 'Event_name'] = 'Discussion deleted'
-    df.loc[(df['Event_name'] == 'discussion_subscription_created'), 'Event_name'] = 'Discussion subscription created'
-    df.loc[(df['Event_name'] == 'discussion_subscription_deleted'), 'Event_name'] = 'Discussion subscription deleted'
-    df.loc[(df['Event_name'] == 'discussion_deleted'), 'Event_name'] = 'Discussion deleted'
-    df.loc[(df['Event_name'] == 'discussion_viewed'), 'Event_name'] = 'Discussion viewed'
-    df.loc[(df['Event_name'] == 'post_created'), 'Event_name'] = 'Post created'
-    df.loc[(df['Event_name'] == 'post_deleted'), 'Event_name'] = 'Post deleted'
-    df.loc[(df['Event_name'] == 'post_updated'), 'Event_name'] = 'Post updated'
-    df.loc[(df['Event_name'] == 'readtracking_disabled'), 'Event_name'] = 'Read tracking disabled'
-    df.loc[(df['Event_name'] == 'readtracking_enabled'), 'Event_name'] = 'Read tracking enabled'
-    df.loc[(df['Event_name'] == 'subscription_created'), 'Event_name'] = 'Subscription created'
-    df.loc[(df['Event_name'] == 'subscription_deleted'), 'Event_name'] = 'Subscription deleted'
-    df.loc[(df['Event_name'] == 'user_report_viewed'), 'Event_name'] = 'User report viewed'
-
-    # glossary
-    df.loc[(df['Event_name'] == 'entry_created'), 'Event_name'] = 'Entry has been created'
-    df.loc[(df['Event_name'] == 'entry_deleted'), 'Event_name'] = 'Entry has been deleted'
-    df.loc[(df['Event_name'] == 'entry_updated'), 'Event_name'] = 'Entry has been updated'
-    df.loc[(df['Event_name'] == 'entry_viewed'), 'Event_name'] = 'Entry has been viewed'
-
-    # grade
-    df.loc[(df['Event_name'] == 'grade_item_created'), 'Event_name'] = 'Grade item created'
-    df.loc[(df['Event_name'] == 'grade_item_updated'), 'Event_name'] = 'Grade item updated'
-    df.loc[(df['Event_name'] == 'grade_report_viewed') &
-           (df.courseid == 0), 'Event_name'] = 'Grade overview report viewed'
-    df.loc[(df['Event_name'] == 'grade_report_viewed') &
-           (df.courseid != 0), 'Event_name'] = 'Grade user report viewed'
-
-    # group
-    df.loc[(df['Event_name'] == 'group_member_added'), 'Event_name'] = 'Group member added'
-    df.loc[(df['Event_name'] == 'group_member_removed'), 'Event_name'] = 'Group member removed'
-
-    # group choice
-    df.loc[(df['Event_name'] == 'choice_removed'), 'Event_name'] = 'Choice removed'
-    df.loc[(df['Event_name'] == 'choice_updated'), 'Event_name'] = 'Choice made'
-
-    # h5p
-    df.loc[(df['Event_name'] == 'report_viewed'), 'Event_name'] = 'Report viewed'
-    df.loc[(df['Event_name'] == 'statement_received'), 'Event_name'] = 'xAPI statement received'
-
-    # lesson
-    df.loc[(df['Event_name'] == 'content_page_viewed'), 'Event_name'] = 'Content page viewed'
-    df.loc[(df['Event_name'] == 'lesson_ended'), 'Event_name'] = 'Lesson ended'
-    df.loc[(df['Event_name'] == 'lesson_restarted'), 'Event_name'] = 'Lesson restarted'
-    df.loc[(df['Event_name'] == 'lesson_resumed'), 'Event_name'] = 'Lesson resumed'
-    df.loc[(df['Event_name'] == 'lesson_started'), 'Event_name'] = 'Lesson started'
-    df.loc[(df['Event_name'] == 'question_answered'), 'Event_name'] = 'Question answered'
-    df.loc[(df['Event_name'] == 'question_viewed'), 'Event_name'] = 'Question viewed'
-
-    # login
-    df.loc[(df['Event_name'] == 'user_loggedin'), 'Event_name'] = 'User has logged in'
-    df.loc[(df['Event_name'] == 'user_loggedout'), 'Event_name'] = 'User logged out'
-
-    # message
-    df.loc[(df['Event_name'] == 'group_message_sent'), 'Event_name'] = 'Group message sent'
-    df.loc[(df['Event_name'] == 'message_sent'), 'Event_name'] = 'Message sent'
-    df.loc[(df['Event_name'] == 'message_deleted'), 'Event_name'] = 'Message deleted'
-    df.loc[(df['Event_name'] == 'message_viewed'), 'Event_name'] = 'Message viewed'
-
-    # module
-    df.loc[(df['Event_name'] == 'course_module_viewed'), 'Event_name'] = 'Course module viewed'
-
-    # notification
-    df.loc[(df['Event_name'] == 'notification_sent'), 'Event_name'] = 'Notification sent'
-    df.loc[(df['Event_name'] == 'notification_viewed'), 'Event_name'] = 'Notification viewed'
-
-    # profile
-    df.loc[(df['Event_name'] == 'user_profile_viewed'), 'Event_name'] = 'User profile viewed'
-    df.loc[(df['Event_name'] == 'user_updated'), 'Event_name'] = 'User updated'
-
-    # questionnaire
-    df.loc[(df['Event_name'] == 'all_responses_viewed'), 'Event_name'] = 'All Responses report viewed'
-    df.loc[(df['Event_name'] == 'attempt_resumed'), 'Event_name'] = 'Attempt resumed'
-    df.loc[(df['Event_name'] == 'attempt_saved'), 'Event_name'] = 'Responses saved'
-    df.loc[(df['Event_name'] == 'attempt_submitted') &
-           (df.Component == 'Questionnaire'), 'Event_name'] = 'Responses submitted'
-    df.loc[(df['Event_name'] == 'response_viewed'), 'Event_name'] = 'Individual Responses report viewed'
-
-    # quiz
-    df.loc[(df['Event_name'] == 'attempt_abandoned'), 'Event_name'] = 'Quiz attempt abandoned'
-    df.loc[(df['Event_name'] == 'attempt_reviewed'), 'Event_name'] = 'Quiz attempt reviewed'
-    df.loc[(df['Event_name'] == 'attempt_started'), 'Event_name'] = 'Quiz attempt started'
-    df.loc[(df['Event_name'] == 'attempt_submitted') &
-           (df.Component == 'Quiz'), 'Event_name'] = 'Quiz attempt submitted'
-    df.loc[(df['Event_name'] == 'attempt_summary_viewed'), 'Event_name'] = 'Quiz attempt summary viewed'
-    df.loc[(df['Event_name'] == 'attempt_viewed'), 'Event_name'] = 'Quiz attempt viewed'
-
-    # recent activity
-    df.loc[(df['Event_name'] == 'recent_activity_viewed'), 'Event_name'] = 'Recent activity viewed'
-
-    # role
-    df.loc[(df['Event_name'] == 'role_assigned'), 'Event_name'] = 'Role assigned'
-    df.loc[(df['Event_name'] == 'role_unassigned'), 'Event_name'] = 'Role unassigned'
-    df.loc[(df['Event_name'] == 'role_updated'), 'Event_name'] = 'Role updated'
-
-    # scheduler
-    df.loc[(df['Event_name'] == 'booking_added'), 'Event_name'] = 'Scheduler booking added'
-    df.loc[(df['Event_name'] == 'booking_form_viewed'), 'Event_name'] = 'Scheduler booking form viewed'
-    df.loc[(df['Event_name'] == 'booking_removed'), 'Event_name'] = 'Scheduler booking removed'
-
-    # scorm
-    df.loc[(df['Event_name'] == 'sco_launched'), 'Event_name'] = 'Sco launched'
-    df.loc[(df['Event_name'] == 'scoreraw_submitted'), 'Event_name'] = 'Submitted SCORM raw score'
-    df.loc[(df['Event_name'] == 'status_submitted'), 'Event_name'] = 'Submitted SCORM status'
-
-    # survey
-    df.loc[(df['Event_name'] == 'response_submitted') &
-           (df['Component'] == 'Survey'), 'Event_name'] = 'Survey response submitted'
-
-    # tour
-    df.loc[(df['Event_name'] == 'tour_ended'), 'Event_name'] = 'Tour ended'
-    df.loc[(df['Event_name'] == 'tour_started'), 'Event_name'] = 'Tour started'
-
-    # user
-    df.loc[(df['Event_name'] == 'user_created'), 'Event_name'] = 'User created'
-    df.loc[(df['Event_name'] == 'user_deleted'), 'Event_name'] = 'User deleted'
-    df.loc[(df['Event_name'] == 'user_list_viewed'), 'Event_name'] = 'User list viewed'
-
-    # wiki
-    df.loc[(df['Event_name'] == 'comments_viewed') & (df['Component'] == 'Wiki'), 'Event_name'] = 'Comments viewed'
-    df.loc[(df['Event_name'] == 'page_created'), 'Event_name'] = 'Wiki page created'
-    df.loc[(df['Event_name'] == 'page_deleted'), 'Event_name'] = 'Wiki page deleted'
-    df.loc[(df['Event_name'] == 'page_diff_viewed'), 'Event_name'] = 'Wiki diff viewed'
-    df.loc[(df['Event_name'] == 'page_history_viewed'), 'Event_name'] = 'Wiki history viewed'
-    df.loc[(df['Event_name'] == 'page_map_viewed'), 'Event_name'] = 'Wiki page map viewed'
-    df.loc[(df['Event_name'] == 'page_updated'), 'Event_name'] = 'Wiki page updated'
-    df.loc[(df['Event_name'] == 'page_version_deleted'), 'Event_name'] = 'Wiki page version deleted'
-    df.loc[(df['Event_name'] == 'page_version_restored'), 'Event_name'] = 'Wiki page version restored'
-    df.loc[(df['Event_name'] == 'page_version_viewed'), 'Event_name'] = 'Wiki page version viewed'
-    df.loc[(df['Event_name'] == 'page_viewed'), 'Event_name'] = 'Wiki page viewed'
-
-    # workshop
-    df.loc[(df['Event_name'] == 'assessable_uploaded') &
-           (df['Component'] == 'Workshop'), 'Event_name'] = 'A submission has been uploaded.'
-    df.loc[(df['Event_name'] == 'submission_assessed'), 'Event_name'] = 'Submission assessed'
-    df.loc[(df['Event_name'] == 'submission_created') &
-           (df.Component == 'Workshop'), 'Event_name'] = 'Submission created'
-    df.loc[(df['Event_name'] == 'submission_deleted'), 'Event_name'] = 'Submission deleted'
-    df.loc[(df['Event_name'] == 'submission_reassessed'), 'Event_name'] = 'Submission re-assessed'
-    df.loc[(df['Event_name'] == 'submission_updated') &
-           (df.Component == 'Workshop'), 'Event_name'] = 'Submission updated'
-    df.loc[(df['Event_name'] == 'submission_viewed') &
-           (df.Component == 'Workshop'), 'Event_name'] = 'Submission viewed'
 
-    return df
+    states = _get_role_states(events)
+    last = states.drop_duplicates(['courseid', 'Username', 'Role'], keep='last')
 
+    times = pd.Series(events['Unix_Time'].values, index=events['Order'].values)
+    orders = np.where(last['Holds'], last['Since'], last['Order']).astype('int64')
+    state = DataFrame({'courseid': last['courseid'].values,
+                       'Username': last['Username'].values,
+                       'Unix_Time': times.loc[orders].values,
+                       'Role': last['Role'].values,
+                       'Assigned': last['Holds'].values.astype(bool),
+                       'Order': orders})
+    state = state.sort_values('Order').reset_index(drop=True)
 
-def add_role(df: DataFrame) -> DataFrame:
+    return state
+
+
+def add_role(df: DataFrame, time_aware: bool = False) -> DataFrame:
     """
     A role is a collection of permissions defined for the whole system that can be assigned to specific users in
     specific contexts. When a user logs in, they are considered "authenticated." Users can be teachers or students
@@ -610,43 +741,70 @@ def add_role(df: DataFrame) -> DataFrame:
     Please be aware that any system roles (suche as admin, manager, course-creator, or specifically created role) apply
     to the assigned users throughout the entire system, including the front page and all the courses. A user can be a
     teacher in a course and a student in another course. A manager can only be a manager.
+
+    Args:
+        df: The dataframe object sorted by sort_data.
+        time_aware: If False, the roles held at the end of the logs are applied to all the records of the user in the
+            course. If True, each record gets the roles in effect at its Unix_Time.
+
+    Returns:
+        The dataframe with the field Role.
     """
 
-    df["Role"] = np.nan
+    courseids = get_role_courses(df)
+    events = get_role_events(df, courseids)
+    if time_aware:
+        roles = get_role_timeline(events)
+    else:
+        roles = get_role_assignments(events)
+
+    df = apply_roles(df, courseids, roles, authenticated=bool(df.Course_Area.notnull().any()))
+
+    return df
 
-    courseids = df.loc[df.Course_Area.notnull()]['courseid'].unique()
-    for courseid in courseids:
-        if courseid != 0 and courseid != 1:
-            roles = df.loc[df.courseid == courseid].loc[df.Component == 'Role']
-            role_list = {}
-            for idx in range(len(roles)):
-                key = roles.iloc[idx]['Username']
-                role = roles.iloc[idx]['Context']
-                verb = roles.iloc[idx]['Verb']
-                role_list.setdefault(key, [])
-                if verb == 'has been assigned' and role not in role_list[key]:
-                    role_list[key].append(role)
-                if verb == 'has been unassigned' and role in role_list[key]:
-                    role_list[key].remove(role)
-
-            for item in role_list.items():
-                user_logs = list((df.loc[df.Username == item[0]].loc[df.courseid == courseid]).index)
-                for user_log in user_logs:
-                    role = item[1]
-                    if not role:
-                        df.iat[user_log, df.columns.get_loc('Role')] = 'Guest'
-                    else:
-                        if len(role) == 1:
-                            df.iat[user_log, df.columns.get_loc('Role')] = role[0]
-                        else:
-                            df.iat[user_log, df.columns.get_loc('Role')] = role
-
-            usernames = df.loc[df.courseid == courseid].Username.unique()
-            for username in usernames:
-                if username not in role_list.keys():
-                    df.loc[(df.Username == username) & (df.courseid == courseid), 'Role'] = 'Guest'
-
-        df.loc[df['Role'].isnull(), 'Role'] = 'Authenticated user'
+
+def apply_roles(df: DataFrame,
+                courseids: [],
+                roles: DataFrame,
+                authenticated: bool = True) -> DataFrame:
+    """
+    Add the Role field from roles computed beforehand, so that the roles can be computed on the whole logs and applied
+    to parts of them.
+
+    Args:
+        df: The dataframe object.
+        courseids: The courses whose roles are computed (see get_role_courses).
+        roles: The output of get_role_assignments or, for the roles in effect at the time of each record, the output
+            of get_role_timeline.
+        authenticated: Label the records outside the courses as 'Authenticated user'. They are left empty otherwise.
+
+    Returns:
+        The dataframe with the field Role.
+    """
+
+    df['Role'] = np.nan
+    if authenticated:
+        df['Role'] = 'Authenticated user'
+
+    # records of the users in the courses, users without any role are guests
+    in_course = df.courseid.isin(courseids).to_numpy(dtype=bool, na_value=False)
+    logs = DataFrame({'courseid': df.loc[in_course, 'courseid'].astype('int64').values,
+                      'Username': df.loc[in_course, 'Username'].values})
+
+    if 'Unix_Time' in roles:
+        logs['Unix_Time'] = df.loc[in_course, 'Unix_Time'].values
+        logs['Position'] = np.arange(len(logs))
+        logs = pd.merge_asof(logs.sort_values('Unix_Time', kind='stable'), roles,
+                             on='Unix_Time', by=['courseid', 'Username'], direction='backward')
+        logs = logs.sort_values('Position')
+    else:
+        logs = logs.merge(roles, on=['courseid', 'Username'], how='left')
+
+    values = logs['Role'].to_numpy(dtype=object)
+    values[pd.isnull(logs['Role']).values] = 'Guest'
+    role_column = df['Role'].to_numpy(dtype=object)
+    role_column[in_course] = values
+    df['Role'] = role_column
 
     # how to find multiple roles
     # df[df["Role"].apply(lambda d: isinstance(d, list))]
@@ -668,3 +826,37 @@ def add_status(df: DataFrame) -> DataFrame:
     df.loc[df['Status'].isnull(), 'Status'] = 'Available'
 
     return df
+
+
+def get_integration_stages(course_names) -> [tuple]:
+    """
+    Return the stages that rename the fields and integrate the logs with the fields that only depend on the record
+    itself, so that they can be applied to the whole logs as well as to chunks of them. course_names is the path of
+    the course names file or the courses loaded by get_courses.
+
+    Returns:
+        list of (name, function) tuples, see Pipeline.
+    """
+
+    return [('rename_columns', tr.rename_columns),
+            # --------------------
+            # DATA INTEGRATION
+            # --------------------
+            ('parse_related_activities', parse_related_activities),
+            ('add_course_name', lambda log_data: add_course_name(log_data, course_names)),
+            ('add_timestamps', add_timestamps),
+            ('decompose_path', decompose_path),
+            ('redefine_course_area', redefine_course_area),
+            ('redefine_component', redefine_component),
+            ('redefine_event_name', redefine_event_name),
+            ('add_status', add_status)]
+
+
+def integrate_logs(log_data: DataFrame, course_names) -> DataFrame:
+    """
+    Rename the fields and integrate the logs with the stages of get_integration_stages.
+    """
+
+    log_data = Pipeline(get_integration_stages(course_names)).run(log_data, instrument=False)
+
+    return log_data
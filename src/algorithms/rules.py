@@ -0,0 +1,704 @@
+import re
+import numpy as np
+import pandas as pd
+from pandas import DataFrame, Series
+
+
+# (target, value, conditions) rules applied in order, the last matching rule wins
+COURSE_AREA_RULES = [
+    # authentication
+    ('Course_Area', 'Authentication', [('Event_name', '==', 'user_loggedin')]),
+    ('Course_Area', 'Authentication', [('Event_name', '==', 'user_loggedout')]),
+
+    # overall site
+    ('Course_Area', 'Moodle Site', [('Event_name', '==', 'course_viewed'), ('courseid', '==', 1)]),
+    ('Course_Area', 'Moodle Site', [('Event_name', '==', 'user_created')]),
+    ('Course_Area', 'Moodle Site', [('Event_name', '==', 'user_deleted')]),
+    ('Course_Area', 'Moodle Site', [('Event_name', '==', 'role_updated')]),
+    ('Course_Area', 'Moodle Site', [('Event_name', '==', 'role_assigned'), ('courseid', '==', 1)]),
+    ('Course_Area', 'Moodle Site', [('Event_name', '==', 'role_unassigned'), ('courseid', '==', 1)]),
+    ('Course_Area', 'Moodle Site', [('Event_name', '==', 'user_enrolment_deleted'), ('courseid', '==', 1)]),
+    ('Course_Area', 'Moodle Site', [('Event_name', '==', 'user_enrolment_updated'), ('courseid', '==', 1)]),
+    ('Course_Area', 'Moodle Site', [('Event_name', 'contains', 'course_category')]),
+    ('Course_Area', 'Moodle Site', [('Event_name', '==', 'courses_searched')]),
+    ('Course_Area', 'Moodle Site', [('Event_name', 'contains', 'notification')]),
+    ('Course_Area', 'Moodle Site', [('Event_name', '==', 'user_report_viewed'), ('Component', '==', 'mod_forum'),
+                                    ('courseid', '==', 0)]),
+
+    # profile
+    ('Course_Area', 'Profile', [('Event_name', 'contains', 'dashboard')]),
+    ('Course_Area', 'Profile', [('Event_name', '==', 'user_profile_viewed'), ('courseid', '==', 0)]),
+    ('Course_Area', 'Profile', [('Event_name', '==', 'grade_report_viewed'), ('courseid', '==', 0)]),
+    ('Course_Area', 'Profile', [('Event_name', '==', 'user_password_updated')]),
+    ('Course_Area', 'Profile', [('Event_name', '==', 'user_updated')]),
+
+    # social interaction
+    ('Course_Area', 'Social interaction', [('Event_name', 'contains', '(?i)message'), ('Component', '!=', 'mod_chat')]),
+]
+
+
+COMPONENT_RULES = [
+    ('Component', 'DELETE', [('Component', 'contains', 'https')]),
+
+    # assignment
+    ('Component', 'File submissions', [('Component', '==', 'assignsubmission_file')]),
+    ('Component', 'Online text submissions', [('Component', '==', 'assignsubmission_onlinetext')]),
+    ('Component', 'Assignment', [('Component', '==', 'mod_assign')]),
+
+    # attendance
+    ('Component', 'Attendance', [('Component', '==', 'mod_attendance')]),
+
+    # authentication
+    ('Component', 'Login', [('Event_name', '==', 'user_loggedin')]),
+    ('Component', 'Logout', [('Event_name', '==', 'user_loggedout')]),
+
+    # big blue button
+    ('Component', 'Big Blue Button', [('Component', '==', 'mod_bigbluebuttonbn')]),
+
+    # book
+    ('Component', 'Book', [('Component', '==', 'mod_book')]),
+    ('Component', 'Book', [('Component', '==', 'booktool_print')]),
+
+    # chat
+    ('Component', 'Chat', [('Component', '==', 'mod_chat')]),
+
+    # checklist
+    ('Component', 'Checklist', [('Component', '==', 'mod_checklist')]),
+
+    # choice
+    ('Component', 'Choice', [('Component', '==', 'mod_choice')]),
+
+    # course home
+    ('Component', 'Course home', [('courseid', '!=', 0), ('Event_name', '==', 'course_viewed')]),
+
+    # courses list
+    ('Component', 'Courses list', [('Event_name', '==', 'course_category_viewed')]),
+    ('Component', 'Courses list', [('Event_name', '==', 'courses_searched')]),
+
+    # dashboard
+    ('Component', 'Dashboard', [('Event_name', 'contains', 'dashboard')]),
+
+    # database
+    ('Component', 'Database', [('Component', '==', 'mod_data')]),
+
+    # enrollment
+    ('Component', 'Enrolment', [('Event_name', 'contains', 'user_enrolment')]),
+
+    # feedback
+    ('Component', 'Feedback', [('Component', '==', 'mod_feedback')]),
+
+    # file
+    ('Component', 'File', [('Component', '==', 'mod_resource')]),
+
+    # folder
+    ('Component', 'Folder', [('Component', '==', 'mod_folder')]),
+
+    # forum
+    ('Component', 'Forum', [('Component', '==', 'mod_forum')]),
+
+    # glossary
+    ('Component', 'Glossary', [('Component', '==', 'mod_glossary')]),
+
+    # grades
+    ('Component', 'Grades', [('Event_name', '==', 'grade_report_viewed')]),
+    ('Component', 'Grades', [('Event_name', '==', 'course_user_report_viewed')]),
+    ('Component', 'Grades', [('Event_name', '==', 'grade_item_updated')]),
+    ('Component', 'Grades', [('Event_name', '==', 'grade_item_created')]),
+
+    # group choice
+    ('Component', 'Group choice', [('Component', '==', 'mod_choicegroup')]),
+
+    # groups
+    ('Component', 'Groups', [('Event_name', '==', 'group_member_added')]),
+    ('Component', 'Groups', [('Event_name', '==', 'group_member_removed')]),
+    ('Component', 'Groups', [('Event_name', 'contains', 'group|Grouping'), ('Event_name', '!=', 'group_message_sent')]),
+
+    # h5p
+    ('Component', 'H5P', [('Component', '==', 'mod_h5pactivity')]),
+
+    # imscp
+    ('Component', 'IMS content package', [('Component', '==', 'mod_imscp')]),
+
+    # label
+    ('Component', 'Label', [('Component', '==', 'mod_label')]),
+
+    # lesson
+    ('Component', 'Lesson', [('Component', '==', 'mod_lesson')]),
+
+    # lti
+    ('Component', 'External tool', [('Component', '==', 'mod_lti')]),
+
+    # messaging
+    ('Component', 'Messaging', [('Event_name', 'contains', '(?i)message'), ('Component', '!=', 'mod_chat')]),
+
+    # notification
+    ('Component', 'Notification', [('Event_name', 'contains', 'notification')]),
+
+    # page
+    ('Component', 'Page', [('Component', '==', 'mod_page')]),
+
+    # questionnaire
+    ('Component', 'Questionnaire', [('Component', '==', 'mod_questionnaire')]),
+
+    # quiz
+    ('Component', 'Quiz', [('Event_name', 'contains', 'Question'), ('Component', '==', 'core')]),
+    ('Component', 'Quiz', [('Component', '==', 'mod_quiz')]),
+
+    # recent activity
+    ('Component', 'Recent activity', [('Event_name', '==', 'recent_activity_viewed')]),
+
+    # role
+    ('Component', 'Role', [('Event_name', 'contains', 'role')]),
+
+    # scorm
+    ('Component', 'SCORM package', [('Component', '==', 'mod_scorm')]),
+
+    # site home
+    ('Component', 'Site home', [('courseid', '==', 1), ('Event_name', '==', 'course_viewed')]),
+
+    # system
+    ('Component', 'System', [('Event_name', '==', 'user_created')]),
+
+    # url
+    ('Component', 'URL', [('Component', '==', 'mod_url')]),
+
+    # user profile
+    ('Component', 'Profile', [('Event_name', '==', 'user_list_viewed')]),
+    ('Component', 'User profile', [('Event_name', '==', 'user_updated')]),
+    ('Component', 'User profile', [('Event_name', '==', 'user_profile_viewed')]),
+
+    # wiki
+    ('Component', 'Wiki', [('Component', '==', 'mod_wiki')]),
+
+    # wooclap
+    ('Component', 'Wooclap', [('Component', '==', 'mod_wooclap')]),
+]
+
+
+EVENT_NAME_RULES = [
+    # assignment
+    ('Event_name', 'A submission has been submitted.', [('Event_name', '==', 'assessable_submitted')]),
+    ('Event_name', 'Feedback viewed', [('Event_name', '==', 'feedback_viewed')]),
+    ('Event_name', 'Remove submission confirmation viewed.', [('Event_name', '==', 'remove_submission_form_viewed')]),
+    ('Event_name', 'Submission confirmation form viewed.',
+     [('Event_name', '==', 'submission_confirmation_form_viewed')]),
+    ('Event_name', 'The user duplicated their submission.', [('Event_name', '==', 'submission_duplicated')]),
+    ('Event_name', 'Submission form viewed.', [('Event_name', '==', 'submission_form_viewed')]),
+    ('Event_name', 'The submission has been graded.', [('Event_name', '==', 'submission_graded')]),
+    ('Event_name', 'The status of the submission has been viewed.', [('Event_name', '==', 'submission_status_viewed')]),
+    ('Event_name', 'A file has been uploaded.', [('Event_name', '==', 'assessable_uploaded'),
+                                                 ('Component', '==', 'File submissions')]),
+    ('Event_name', 'An online text has been uploaded.', [('Event_name', '==', 'assessable_uploaded'),
+                                                         ('Component', '==', 'Online text submissions')]),
+    ('Event_name', 'Submission viewed.', [('Event_name', '==', 'submission_viewed'),
+                                          ('Component', '==', 'Assignment')]),
+    ('Component', 'Assignment', [('Component', '==', 'File submissions')]),
+    ('Component', 'Assignment', [('Component', '==', 'Online text submissions')]),
+    ('Event_name', 'Submission created.', [('Event_name', '==', 'submission_created'),
+                                           ('Component', '==', 'Assignment')]),
+    ('Event_name', 'Submission updated.', [('Event_name', '==', 'submission_updated'),
+                                           ('Component', '==', 'Assignment')]),
+
+    # attendance
+    ('Event_name', 'Attendance taken by student', [('Event_name', '==', 'attendance_taken_by_student')]),
+    ('Event_name', 'Session report viewed', [('Event_name', '==', 'session_report_viewed')]),
+
+    # big blue button
+    ('Event_name', 'Activity viewed', [('Event_name', '==', 'activity_viewed')]),
+    ('Event_name', 'BigBlueButtonBN activity management viewed',
+     [('Event_name', '==', 'bigbluebuttonbn_activity_management_viewed')]),
+    ('Event_name', 'Live session event', [('Event_name', '==', 'live_session_event')]),
+    ('Event_name', 'Meeting created', [('Event_name', '==', 'meeting_created')]),
+    ('Event_name', 'Meeting ended', [('Event_name', '==', 'meeting_ended')]),
+    ('Event_name', 'Meeting joined', [('Event_name', '==', 'meeting_joined')]),
+    ('Event_name', 'Meeting left', [('Event_name', '==', 'meeting_left')]),
+    ('Event_name', 'Recording deleted', [('Event_name', '==', 'recording_deleted')]),
+    ('Event_name', 'Recording edited', [('Event_name', '==', 'recording_edited')]),
+    ('Event_name', 'Recording imported', [('Event_name', '==', 'recording_imported')]),
+    ('Event_name', 'Recording protected', [('Event_name', '==', 'recording_protected')]),
+    ('Event_name', 'Recording published', [('Event_name', '==', 'recording_published')]),
+    ('Event_name', 'Recording unprotected', [('Event_name', '==', 'recording_unprotected')]),
+    ('Event_name', 'Recording unpublished', [('Event_name', '==', 'recording_unpublished')]),
+    ('Event_name', 'Recording viewed', [('Event_name', '==', 'recording_viewed')]),
+
+    # book
+    ('Event_name', 'Book printed', [('Event_name', '==', 'book_printed')]),
+    ('Event_name', 'Chapter viewed', [('Event_name', '==', 'chapter_viewed')]),
+    ('Event_name', 'Chapter printed', [('Event_name', '==', 'chapter_printed')]),
+
+    # category
+    ('Event_name', 'Category viewed', [('Event_name', '==', 'course_category_viewed')]),
+    ('Event_name', 'Search results viewed', [('Event_name', '==', 'search_results_viewed')]),
+
+    # chat
+    ('Event_name', 'Sessions viewed', [('Event_name', '==', 'sessions_viewed')]),
+
+    # checklist
+    ('Event_name', 'Checklist complete', [('Event_name', '==', 'checklist_completed')]),
+    ('Event_name', 'Student checks updated', [('Event_name', '==', 'student_checks_updated')]),
+
+    # choice
+    ('Event_name', 'Choice answer added', [('Event_name', '==', 'answer_created')]),
+    ('Event_name', 'Choice answer deleted', [('Event_name', '==', 'answer_deleted')]),
+
+    # comment
+    ('Event_name', 'Comment created', [('Event_name', '==', 'comment_created')]),
+    ('Event_name', 'Comment deleted', [('Event_name', '==', 'comment_deleted')]),
+
+    # course
+    ('Event_name', 'Course viewed', [('Event_name', '==', 'course_viewed')]),
+    ('Event_name', 'Course completed', [('Event_name', '==', 'course_completed')]),
+    ('Event_name', 'Course summary viewed', [('Event_name', '==', 'course_information_viewed')]),
+    ('Event_name', 'Course activity completion updated', [('Event_name', '==', 'course_module_completion_updated')]),
+    ('Event_name', 'Course module instance list viewed', [('Event_name', '==', 'course_resources_list_viewed')]),
+    ('Event_name', 'Courses searched', [('Event_name', '==', 'courses_searched')]),
+    ('Event_name', 'Course user report viewed', [('Event_name', '==', 'course_user_report_viewed')]),
+    ('Event_name', 'Course module instance list viewed',
+     [('Event_name', '==', 'course_module_instance_list_viewed')]),
+    ('Event_name', 'Course module viewed', [('Event_name', '==', 'course_module_viewed')]),
+
+    # dashboard
+    ('Event_name', 'Dashboard reset', [('Event_name', '==', 'dashboard_reset')]),
+    ('Event_name', 'Dashboard viewed', [('Event_name', '==', 'dashboard_viewed')]),
+
+    # database
+    ('Event_name', 'Record created', [('Event_name', '==', 'record_created')]),
+    ('Event_name', 'Record deleted', [('Event_name', '==', 'record_deleted')]),
+    ('Event_name', 'Record updated', [('Event_name', '==', 'record_updated')]),
+
+    # enrollment
+    ('Event_name', 'User enrolled in course', [('Event_name', '==', 'user_enrolment_created')]),
+    ('Event_name', 'User unenrolled from course', [('Event_name', '==', 'user_enrolment_deleted')]),
+    ('Event_name', 'User enrolment updated', [('Event_name', '==', 'user_enrolment_updated')]),
+
+    # feedback
+    ('Event_name', 'Response deleted', [('Event_name', '==', 'response_deleted')]),
+    ('Event_name', 'Response submitted', [('Event_name', '==', 'response_submitted'),
+                                          ('Component', '==', 'Feedback')]),
+
+    # folder
+    ('Event_name', 'Zip archive of folder downloaded', [('Event_name', '==', 'all_files_downloaded')]),
+
+    # forum
+    ('Event_name', 'Some content has been posted.', [('Event_name', '==', 'assessable_uploaded'),
+                                                     ('Component', '==', 'Forum')]),
+    ('Event_name', 'Course searched', [('Event_name', '==', 'course_searched')]),
+    ('Event_name', 'Discussion created', [('Event_name', '==', 'discussion_created')]),
+    ('Event_name', 'Discussion deleted', [('Event_name', '==', 'discussion_deleted')]),
+    ('Event_name', 'Discussion subscription created', [('Event_name', '==', 'discussion_subscription_created')]),
+    ('Event_name', 'Discussion subscription deleted', [('Event_name', '==', 'discussion_subscription_deleted')]),
+    ('Event_name', 'Discussion viewed', [('Event_name', '==', 'discussion_viewed')]),
+    ('Event_name', 'Post created', [('Event_name', '==', 'post_created')]),
+    ('Event_name', 'Post deleted', [('Event_name', '==', 'post_deleted')]),
+    ('Event_name', 'Post updated', [('Event_name', '==', 'post_updated')]),
+    ('Event_name', 'Read tracking disabled', [('Event_name', '==', 'readtracking_disabled')]),
+    ('Event_name', 'Read tracking enabled', [('Event_name', '==', 'readtracking_enabled')]),
+    ('Event_name', 'Subscription created', [('Event_name', '==', 'subscription_created')]),
+    ('Event_name', 'Subscription deleted', [('Event_name', '==', 'subscription_deleted')]),
+    ('Event_name', 'User report viewed', [('Event_name', '==', 'user_report_viewed')]),
+
+    # glossary
+    ('Event_name', 'Entry has been created', [('Event_name', '==', 'entry_created')]),
+    ('Event_name', 'Entry has been deleted', [('Event_name', '==', 'entry_deleted')]),
+    ('Event_name', 'Entry has been updated', [('Event_name', '==', 'entry_updated')]),
+    ('Event_name', 'Entry has been viewed', [('Event_name', '==', 'entry_viewed')]),
+
+    # grade
+    ('Event_name', 'Grade item created', [('Event_name', '==', 'grade_item_created')]),
+    ('Event_name', 'Grade item updated', [('Event_name', '==', 'grade_item_updated')]),
+    ('Event_name', 'Grade overview report viewed', [('Event_name', '==', 'grade_report_viewed'),
+                                                    ('courseid', '==', 0)]),
+    ('Event_name', 'Grade user report viewed', [('Event_name', '==', 'grade_report_viewed'),
+                                                ('courseid', '!=', 0)]),
+
+    # group
+    ('Event_name', 'Group member added', [('Event_name', '==', 'group_member_added')]),
+    ('Event_name', 'Group member removed', [('Event_name', '==', 'group_member_removed')]),
+
+    # group choice
+    ('Event_name', 'Choice removed', [('Event_name', '==', 'choice_removed')]),
+    ('Event_name', 'Choice made', [('Event_name', '==', 'choice_updated')]),
+
+    # h5p
+    ('Event_name', 'Report viewed', [('Event_name', '==', 'report_viewed')]),
+    ('Event_name', 'xAPI statement received', [('Event_name', '==', 'statement_received')]),
+
+    # lesson
+    ('Event_name', 'Content page viewed', [('Event_name', '==', 'content_page_viewed')]),
+    ('Event_name', 'Lesson ended', [('Event_name', '==', 'lesson_ended')]),
+    ('Event_name', 'Lesson restarted', [('Event_name', '==', 'lesson_restarted')]),
+    ('Event_name', 'Lesson resumed', [('Event_name', '==', 'lesson_resumed')]),
+    ('Event_name', 'Lesson started', [('Event_name', '==', 'lesson_started')]),
+    ('Event_name', 'Question answered', [('Event_name', '==', 'question_answered')]),
+    ('Event_name', 'Question viewed', [('Event_name', '==', 'question_viewed')]),
+
+    # login
+    ('Event_name', 'User has logged in', [('Event_name', '==', 'user_loggedin')]),
+    ('Event_name', 'User logged out', [('Event_name', '==', 'user_loggedout')]),
+
+    # message
+    ('Event_name', 'Group message sent', [('Event_name', '==', 'group_message_sent')]),
+    ('Event_name', 'Message sent', [('Event_name', '==', 'message_sent')]),
+    ('Event_name', 'Message deleted', [('Event_name', '==', 'message_deleted')]),
+    ('Event_name', 'Message viewed', [('Event_name', '==', 'message_viewed')]),
+
+    # notification
+    ('Event_name', 'Notification sent', [('Event_name', '==', 'notification_sent')]),
+    ('Event_name', 'Notification viewed', [('Event_name', '==', 'notification_viewed')]),
+
+    # profile
+    ('Event_name', 'User profile viewed', [('Event_name', '==', 'user_profile_viewed')]),
+    ('Event_name', 'User updated', [('Event_name', '==', 'user_updated')]),
+
+    # questionnaire
+    ('Event_name', 'All Responses report viewed', [('Event_name', '==', 'all_responses_viewed')]),
+    ('Event_name', 'Attempt resumed', [('Event_name', '==', 'attempt_resumed')]),
+    ('Event_name', 'Responses saved', [('Event_name', '==', 'attempt_saved')]),
+    ('Event_name', 'Responses submitted', [('Event_name', '==', 'attempt_submitted'),
+                                           ('Component', '==', 'Questionnaire')]),
+    ('Event_name', 'Individual Responses report viewed', [('Event_name', '==', 'response_viewed')]),
+
+    # quiz
+    ('Event_name', 'Quiz attempt abandoned', [('Event_name', '==', 'attempt_abandoned')]),
+    ('Event_name', 'Quiz attempt reviewed', [('Event_name', '==', 'attempt_reviewed')]),
+    ('Event_name', 'Quiz attempt started', [('Event_name', '==', 'attempt_started')]),
+    ('Event_name', 'Quiz attempt submitted', [('Event_name', '==', 'attempt_submitted'),
+                                              ('Component', '==', 'Quiz')]),
+    ('Event_name', 'Quiz attempt summary viewed', [('Event_name', '==', 'attempt_summary_viewed')]),
+    ('Event_name', 'Quiz attempt viewed', [('Event_name', '==', 'attempt_viewed')]),
+
+    # recent activity
+    ('Event_name', 'Recent activity viewed', [('Event_name', '==', 'recent_activity_viewed')]),
+
+    # role
+    ('Event_name', 'Role assigned', [('Event_name', '==', 'role_assigned')]),
+    ('Event_name', 'Role unassigned', [('Event_name', '==', 'role_unassigned')]),
+    ('Event_name', 'Role updated', [('Event_name', '==', 'role_updated')]),
+
+    # scheduler
+    ('Event_name', 'Scheduler booking added', [('Event_name', '==', 'booking_added')]),
+    ('Event_name', 'Scheduler booking form viewed', [('Event_name', '==', 'booking_form_viewed')]),
+    ('Event_name', 'Scheduler booking removed', [('Event_name', '==', 'booking_removed')]),
+
+    # scorm
+    ('Event_name', 'Sco launched', [('Event_name', '==', 'sco_launched')]),
+    ('Event_name', 'Submitted SCORM raw score', [('Event_name', '==', 'scoreraw_submitted')]),
+    ('Event_name', 'Submitted SCORM status', [('Event_name', '==', 'status_submitted')]),
+
+    # survey
+    ('Event_name', 'Survey response submitted', [('Event_name', '==', 'response_submitted'),
+                                                 ('Component', '==', 'Survey')]),
+
+    # tour
+    ('Event_name', 'Tour ended', [('Event_name', '==', 'tour_ended')]),
+    ('Event_name', 'Tour started', [('Event_name', '==', 'tour_started')]),
+
+    # user
+    ('Event_name', 'User created', [('Event_name', '==', 'user_created')]),
+    ('Event_name', 'User deleted', [('Event_name', '==', 'user_deleted')]),
+    ('Event_name', 'User list viewed', [('Event_name', '==', 'user_list_viewed')]),
+
+    # wiki
+    ('Event_name', 'Comments viewed', [('Event_name', '==', 'comments_viewed'), ('Component', '==', 'Wiki')]),
+    ('Event_name', 'Wiki page created', [('Event_name', '==', 'page_created')]),
+    ('Event_name', 'Wiki page deleted', [('Event_name', '==', 'page_deleted')]),
+    ('Event_name', 'Wiki diff viewed', [('Event_name', '==', 'page_diff_viewed')]),
+    ('Event_name', 'Wiki history viewed', [('Event_name', '==', 'page_history_viewed')]),
+    ('Event_name', 'Wiki page map viewed', [('Event_name', '==', 'page_map_viewed')]),
+    ('Event_name', 'Wiki page updated', [('Event_name', '==', 'page_updated')]),
+    ('Event_name', 'Wiki page version deleted', [('Event_name', '==', 'page_version_deleted')]),
+    ('Event_name', 'Wiki page version restored', [('Event_name', '==', 'page_version_restored')]),
+    ('Event_name', 'Wiki page version viewed', [('Event_name', '==', 'page_version_viewed')]),
+    ('Event_name', 'Wiki page viewed', [('Event_name', '==', 'page_viewed')]),
+
+    # workshop
+    ('Event_name', 'A submission has been uploaded.', [('Event_name', '==', 'assessable_uploaded'),
+                                                       ('Component', '==', 'Workshop')]),
+    ('Event_name', 'Submission assessed', [('Event_name', '==', 'submission_assessed')]),
+    ('Event_name', 'Submission created', [('Event_name', '==', 'submission_created'),
+                                          ('Component', '==', 'Workshop')]),
+    ('Event_name', 'Submission deleted', [('Event_name', '==', 'submission_deleted')]),
+    ('Event_name', 'Submission re-assessed', [('Event_name', '==', 'submission_reassessed')]),
+    ('Event_name', 'Submission updated', [('Event_name', '==', 'submission_updated'),
+                                          ('Component', '==', 'Workshop')]),
+    ('Event_name', 'Submission viewed', [('Event_name', '==', 'submission_viewed'),
+                                         ('Component', '==', 'Workshop')]),
+]
+
+
+RULE_TABLES = {'course_area': COURSE_AREA_RULES,
+               'component': COMPONENT_RULES,
+               'event_name': EVENT_NAME_RULES}
+
+# operators of the (field, operator, operand) conditions, 'contains' matches a regular expression
+OPERATORS = ['==', '!=', 'in', 'contains']
+
+# compiled programs of the rule tables, rebuilt when a table changes
+_compiled = {}
+
+
+def register_rule(table: str,
+                  target: str,
+                  value,
+                  conditions: [tuple],
+                  position: int = None):
+    """
+    Add a site specific rule to one of the rule tables. Rules are appended by default, so that they are applied after
+    (and take precedence over) the predefined rules.
+
+    Args:
+        table: 'course_area', 'component' or 'event_name'
+        target: the field to set
+        value: the value to assign to the target field
+        conditions: list of (field, operator, operand) tuples that must all be satisfied
+        position: the position of the rule in the table, appended if None
+
+    Example:
+        register_rule('component', 'Component', 'Scheduler', [('Component', '==', 'mod_scheduler')])
+    """
+
+    if table not in RULE_TABLES:
+        raise ValueError("Unknown rule table '{}'. Available tables: {}".format(table, list(RULE_TABLES)))
+    for condition in conditions:
+        if len(condition) != 3 or condition[1] not in OPERATORS:
+            raise ValueError("Invalid condition {}. Operators: {}".format(condition, OPERATORS))
+
+    rule = (target, value, [tuple(condition) for condition in conditions])
+    if position is None:
+        RULE_TABLES[table].append(rule)
+    else:
+        RULE_TABLES[table].insert(position, rule)
+
+    # the table has to be compiled again
+    _compiled.pop(table, None)
+
+
+def get_rules(table: str) -> []:
+    """
+    Return a copy of the list of rules of the given table.
+    """
+
+    return list(RULE_TABLES[table])
+
+
+def compile_rules(table: str) -> dict:
+    """
+    Compile a rule table into a program. Consecutive rules that rename a single value of a field (e.g. Event_name
+    'user_loggedin' -> 'User has logged in') are merged into a single lookup, the other rules keep their conditions
+    with the regular expressions already compiled. The program is cached until the table is modified.
+
+    Returns:
+        A dictionary with the ordered steps of the program, the fields read by the conditions and the target fields.
+    """
+
+    if table in _compiled:
+        return _compiled[table]
+
+    steps = []
+    keys = []
+    targets = []
+    for target, value, conditions in RULE_TABLES[table]:
+        for column, operator, operand in conditions:
+            if column not in keys:
+                keys.append(column)
+        if target not in targets:
+            targets.append(target)
+
+        if len(conditions) == 1 and conditions[0][0] == target and conditions[0][1] == '==':
+            operand = conditions[0][2]
+            if steps and steps[-1][0] == 'map' and steps[-1][1] == target:
+                mapping = steps[-1][2]
+            else:
+                mapping = {}
+                steps.append(('map', target, mapping))
+            # compose the new rename with the previous ones so that the lookup keeps the sequential semantics
+            for key in mapping:
+                if mapping[key] == operand:
+                    mapping[key] = value
+            mapping.setdefault(operand, value)
+        else:
+            compiled_conditions = []
+            for column, operator, operand in conditions:
+                if operator == 'contains':
+                    operand = re.compile(operand)
+                elif operator == 'in':
+                    operand = set(operand)
+                compiled_conditions.append((column, operator, operand))
+            steps.append(('set', target, value, compiled_conditions))
+
+    program = {'steps': steps, 'keys': keys, 'targets': targets}
+    _compiled[table] = program
+
+    return program
+
+
+def factorize_column(column: Series) -> (np.ndarray, np.ndarray):
+    """
+    Encode a column as integer codes and an object array of the distinct values. Missing values get their own code
+    and are returned as None, unhashable values (such as lists of roles) are encoded as tuples.
+    """
+
+    try:
+        codes, uniques = pd.factorize(column, use_na_sentinel=False)
+    except TypeError:
+        codes, uniques = pd.factorize(column.map(lambda x: tuple(x) if isinstance(x, list) else x),
+                                      use_na_sentinel=False)
+
+    uniques = np.asarray(uniques, dtype=object)
+    uniques[pd.isna(uniques)] = None
+
+    return codes, uniques
+
+
+def factorize_columns(df: DataFrame, columns: []) -> (np.ndarray, dict):
+    """
+    Encode the distinct combinations of values of the given columns.
+
+    Returns:
+        The code of the combination of each record and, for each column, the object array of its values in the
+        distinct combinations.
+    """
+
+    combined = np.zeros(len(df), dtype=np.int64)
+    size = 1
+    column_codes = {}
+    for column in columns:
+        codes, uniques = factorize_column(df[column])
+        column_codes[column] = (codes, uniques)
+        if size * max(len(uniques), 1) >= 2 ** 62:
+            combined, distinct = pd.factorize(combined)
+            size = len(distinct)
+        combined = combined * len(uniques) + codes
+        size *= max(len(uniques), 1)
+
+    codes, distinct = pd.factorize(combined)
+
+    # codes are numbered in order of appearance: the first occurrences are where their running maximum increases
+    if len(codes):
+        running_max = np.maximum.accumulate(codes)
+        first = np.flatnonzero(np.concatenate([[True], running_max[1:] > running_max[:-1]]))
+    else:
+        first = np.array([], dtype=np.int64)
+
+    values = {}
+    for column in columns:
+        column_code, uniques = column_codes[column]
+        values[column] = uniques[column_code[first]]
+
+    return codes, values
+
+
+def _evaluate(values: dict, column: str, operator: str, operand) -> np.ndarray:
+    """
+    Evaluate a compiled condition on the distinct combinations.
+    """
+
+    array = values[column]
+    if operator == '==':
+        mask = array == operand
+    elif operator == '!=':
+        mask = array != operand
+    elif operator == 'in':
+        mask = np.fromiter((value in operand for value in array), dtype=bool, count=len(array))
+    else:
+        mask = np.fromiter((isinstance(value, str) and operand.search(value) is not None for value in array),
+                           dtype=bool, count=len(array))
+
+    return np.asarray(mask, dtype=bool)
+
+
+def evaluate_conditions(values: dict, conditions: [tuple], size: int) -> np.ndarray:
+    """
+    Evaluate a list of (field, operator, operand) conditions on the distinct combinations returned by
+    factorize_columns.
+
+    Returns:
+        The boolean mask of the combinations that satisfy every condition.
+    """
+
+    mask = np.ones(size, dtype=bool)
+    for column, operator, operand in conditions:
+        if operator not in OPERATORS:
+            raise ValueError("Invalid condition {}. Operators: {}".format((column, operator, operand), OPERATORS))
+        if operator == 'contains':
+            operand = re.compile(operand)
+        elif operator == 'in':
+            operand = set(operand)
+        mask &= _evaluate(values, column, operator, operand)
+
+    return mask
+
+
+def to_categorical(values: np.ndarray, codes: np.ndarray) -> pd.Categorical:
+    """
+    Build the categorical of the records from the values of the distinct combinations and the combination code of each
+    record, without hashing the values of every record. The categories are sorted, so that the categorical sorts as
+    the strings would.
+    """
+
+    value_codes, categories = pd.factorize(pd.Series(values, dtype=object), sort=True)
+
+    return pd.Categorical.from_codes(np.where(codes < 0, -1, value_codes[codes]), categories=categories)
+
+
+def apply_rules(df: DataFrame, table: str) -> DataFrame:
+    """
+    Apply a rule table to the dataframe. The rules are evaluated once for each distinct combination of the fields they
+    read, then the results are mapped back to the records through the combination codes.
+    """
+
+    program = compile_rules(table)
+    keys = program['keys']
+    if len(df) == 0:
+        return df
+
+    codes, values = factorize_columns(df, keys)
+    size = codes.max() + 1
+
+    # targets that are not read by any condition are only overwritten where a rule matches
+    written = {}
+    for target in program['targets']:
+        if target not in keys:
+            written[target] = (np.full(size, None, dtype=object), np.zeros(size, dtype=bool))
+
+    for step in program['steps']:
+        if step[0] == 'map':
+            target, mapping = step[1], step[2]
+            values[target] = np.array([mapping.get(value, value) for value in values[target]], dtype=object)
+            continue
+
+        target, value, conditions = step[1], step[2], step[3]
+        mask = np.ones(size, dtype=bool)
+        for column, operator, operand in conditions:
+            mask &= _evaluate(values, column, operator, operand)
+        if target in values:
+            values[target][mask] = value
+        else:
+            written[target][0][mask] = value
+            written[target][1][mask] = True
+
+    for target in program['targets']:
+        if target in values:
+            if target in df and isinstance(df[target].dtype, pd.CategoricalDtype):
+                df[target] = to_categorical(values[target], codes)
+                continue
+            result = values[target][codes]
+            result[pd.isna(result)] = np.nan
+            df[target] = result
+        else:
+            new_values, assigned = written[target]
+            rows = assigned[codes]
+            if not rows.any():
+                continue
+            if target in df:
+                original = df[target]
+                result = original.to_numpy(dtype=object, copy=True)
+            else:
+                original = pd.Series(dtype=object)
+                result = np.full(len(df), np.nan, dtype=object)
+            result[rows] = new_values[codes[rows]]
+            if isinstance(original.dtype, pd.CategoricalDtype):
+                result = pd.Categorical(result, categories=sorted(set(result[pd.notna(result)])))
+            df[target] = result
+
+    return df
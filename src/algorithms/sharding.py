@@ -0,0 +1,191 @@
+import numpy as np
+import pandas as pd
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pandas import DataFrame
+import src.algorithms.integrating as it
+import src.algorithms.timing as tm
+from src.classes.pipeline import Pipeline
+
+
+# integration stages run on the whole logs before they are split by course, see integrate_shards
+UNSHARDED_STAGES = ['rename_columns', 'parse_related_activities']
+
+# site-level course ids, whose records (and those without course) form a shard of their own
+SITE_COURSES = [0, 1]
+
+# dataframe shared with the forked processes of map_shards, which take their shard from it
+_shared = {}
+
+
+def orient_logs(df: DataFrame, time_format: str = tm.TIME_FORMAT) -> DataFrame:
+    """
+    Reverse the logs if they are recorded from the newest to the earliest, as sort_data does, so that the shards are
+    sorted in the order of sort_data. Only the times of the first and the last records are converted.
+    """
+
+    if len(df) < 2:
+        return df
+
+    first, last = tm.convert_times_to_timestamps(df['Time'].iloc[[0, -1]], time_format=time_format)
+    if last < first:
+        df = df[::-1].copy()
+        df = df.reset_index(drop=True)
+        df['ID'] = df.index
+
+    return df
+
+
+def split_courses(df: DataFrame, shards: int) -> [np.ndarray]:
+    """
+    Split the records by course in shards of about the same size: the records of a course are all in the same shard,
+    and the records of the SITE_COURSES and those without course are in a shard of their own.
+
+    Args:
+        df: The dataframe with the field courseid.
+        shards: The number of shards of the courses.
+
+    Returns:
+        The sorted positions of the records of each shard, the site-level shard first, without the empty shards.
+    """
+
+    courseids = df['courseid'].to_numpy(dtype='float64', na_value=np.nan)
+    site = np.isnan(courseids) | np.isin(courseids, SITE_COURSES)
+    codes, uniques = pd.factorize(courseids)
+    codes[site] = -1
+    sizes = np.bincount(codes[~site], minlength=len(uniques))
+
+    # the largest courses first, each one in the smallest shard
+    shard_sizes = np.zeros(max(shards, 1), dtype=np.int64)
+    course_shards = np.zeros(len(uniques), dtype=np.int64)
+    for code in np.argsort(-sizes, kind='stable'):
+        if sizes[code]:
+            course_shards[code] = np.argmin(shard_sizes)
+            shard_sizes[course_shards[code]] += sizes[code]
+
+    record_shards = np.where(site, -1, course_shards[np.where(site, 0, codes)])
+    order = np.argsort(record_shards, kind='stable')
+    bounds = np.searchsorted(record_shards[order], np.arange(-1, len(shard_sizes) + 1))
+    positions = [order[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+    return [shard for shard in positions if len(shard)]
+
+
+def sort_shard(df: DataFrame, positions: np.ndarray) -> (DataFrame, np.ndarray):
+    """
+    Sort the shard in the order of sort_data: by Unix_Time and ID, then by position in the logs.
+
+    Args:
+        df: The records of the shard.
+        positions: The positions of the records in the logs.
+
+    Returns:
+        The sorted shard and the positions of its records in the logs.
+    """
+
+    order = np.lexsort((positions, df['ID'].to_numpy(), df['Unix_Time'].to_numpy()))
+    df = df.take(order).reset_index(drop=True)
+
+    return df, positions[order]
+
+
+def merge_shards(shards: [(DataFrame, np.ndarray)]) -> DataFrame:
+    """
+    Merge the sorted shards returned by sort_shard in the order of sort_data, and number the records as sort_data
+    does.
+    """
+
+    frames = [shard for shard, positions in shards]
+    # the categorical fields of the shards take the union of their sorted categories, so that they stay categorical
+    for column in frames[0].columns:
+        dtypes = [frame[column].dtype for frame in frames]
+        if all(isinstance(dtype, pd.CategoricalDtype) for dtype in dtypes):
+            categories = pd.api.types.union_categoricals([frame[column] for frame in frames],
+                                                         sort_categories=True).categories
+            frames = [frame.assign(**{column: frame[column].cat.set_categories(categories)}) for frame in frames]
+    df = pd.concat(frames, ignore_index=True)
+    positions = np.concatenate([positions for shard, positions in shards])
+
+    order = np.lexsort((positions, df['ID'].to_numpy(), df['Unix_Time'].to_numpy()))
+    df = df.take(order).reset_index(drop=True)
+    df['ID'] = df.index
+
+    return df
+
+
+def _map_shared(function, positions: np.ndarray, args: tuple):
+    """
+    Apply the function to the shard of the dataframe shared with the forked process.
+    """
+    return function(_shared['df'].take(positions).reset_index(drop=True), positions, *args)
+
+
+def map_shards(function, df: DataFrame, shards: [np.ndarray], processes: int, *args) -> list:
+    """
+    Apply the function to the records of each shard in a pool of processes, in the current process if processes is 1.
+    The function is called with the records of the shard (indexed from 0), their positions in the logs and args, and
+    must be defined at the top level of a module so that it can be sent to the processes.
+
+    Where the processes can be forked, they share the memory of the dataframe and take their shard from it, so that
+    only the positions of the shards are sent to them. Otherwise the shards are sent.
+
+    Returns:
+        The results of the function for each shard, in the order of the shards.
+    """
+
+    if processes <= 1 or len(shards) <= 1:
+        return [function(df.take(positions).reset_index(drop=True), positions, *args) for positions in shards]
+
+    workers = min(processes, len(shards))
+    if 'fork' in multiprocessing.get_all_start_methods():
+        _shared['df'] = df
+        try:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as executor:
+                futures = [executor.submit(_map_shared, function, positions, args) for positions in shards]
+                results = [future.result() for future in futures]
+        finally:
+            _shared.clear()
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(function, df.take(positions).reset_index(drop=True), positions, *args)
+                       for positions in shards]
+            results = [future.result() for future in futures]
+
+    return results
+
+
+def consolidate_shard(shard: DataFrame, positions: np.ndarray, courses: DataFrame) -> (DataFrame, np.ndarray):
+    """
+    Integrate the records of a shard of courses with the integration stages that are not UNSHARDED_STAGES, sort them
+    as sort_data does and add their roles, which only depend on the records of their course.
+
+    Returns:
+        The shard sorted and its positions in the logs, see sort_shard.
+    """
+
+    stages = [stage for stage in it.get_integration_stages(courses) if stage[0] not in UNSHARDED_STAGES]
+    shard = Pipeline(stages).run(shard, instrument=False)
+    shard, positions = sort_shard(shard, positions)
+    shard = it.add_role(shard)
+
+    return shard, positions
+
+
+def integrate_shards(log_data: DataFrame, courses: DataFrame, processes: int) -> DataFrame:
+    """
+    Split the logs by course (see split_courses), consolidate the shards in a pool of processes with
+    consolidate_shard and merge them in the order of sort_data. The result is the same as the integration stages
+    followed by sort_data and add_role.
+    """
+
+    log_data = orient_logs(log_data)
+    shards = split_courses(log_data, processes)
+    log_data = merge_shards(map_shards(consolidate_shard, log_data, shards, processes, courses))
+
+    # the records outside the courses are authenticated if any record of the logs has a Course_Area
+    if log_data.Course_Area.notnull().any():
+        roles = log_data['Role'].to_numpy(dtype=object)
+        roles[pd.isnull(roles)] = 'Authenticated user'
+        log_data['Role'] = roles
+
+    return log_data
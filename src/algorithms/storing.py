@@ -0,0 +1,640 @@
+import os
+import re
+import glob
+import json
+import shutil
+import sqlite3
+import numpy as np
+import pandas as pd
+from pandas import DataFrame, Series
+from pandas.api.types import union_categoricals
+from src.classes.records import Records
+from src.classes.query import Query
+from src.classes.sqlrecords import SQLRecords
+import src.algorithms.compacting as cp
+import src.algorithms.transforming as tr
+
+
+# file extensions of the supported formats
+FORMATS = {'parquet': '.parquet', 'feather': '.feather'}
+
+# indexes of the tables of the records databases (see save_database), the name of the table is added to their name
+DATABASE_INDEXES = {'course_user_time': ['courseid', 'Username', 'Unix_Time'],
+                    'user_time': ['Username', 'Unix_Time'],
+                    'area_role': ['Course_Area', 'Role'],
+                    'time': ['Unix_Time']}
+
+# directory of the dataset where the state of the incremental consolidation is kept, and file of the watermark
+STATE_DIRECTORY = '_state'
+STATE_FILE = 'state.json'
+
+# directory of the dataset where the files written by a run of the incremental consolidation are kept until they
+# replace those of the dataset, and file of the list of the replacements (see commit_staging)
+STAGING_DIRECTORY = '_staging'
+JOURNAL_FILE = '_journal.json'
+
+# file of the fields and the dictionaries of the arrays of a directory written by save_arrays
+ARRAYS_FILE = 'dictionaries.json'
+
+
+def get_months(df: DataFrame) -> np.ndarray:
+    """
+    Return the month (YYYY-MM) of each record computed from the Unix_Time field.
+    """
+
+    codes, times = pd.factorize(df['Unix_Time'].values.astype('datetime64[s]').astype('datetime64[M]'))
+    months = np.asarray([str(time)[:7] for time in times], dtype=object)
+
+    return months[codes]
+
+
+def _partition_name(field: str, value) -> str:
+    """
+    Return the name of the directory of a partition, e.g. courseid=5.
+    """
+
+    if pd.isna(value):
+        value = 'null'
+    elif isinstance(value, (int, np.integer)) or (isinstance(value, (float, np.floating)) and value == int(value)):
+        value = int(value)
+
+    return '{}={}'.format(field, value)
+
+
+def save_consolidated_data(df: DataFrame,
+                           directory: str,
+                           file_format: str = 'parquet',
+                           by_month: bool = False,
+                           append: bool = False,
+                           staging: str = "") -> [str]:
+    """
+    Save the consolidated dataframe in a columnar format, so that the types of the fields (Unix_Time, courseid,
+    categoricals) are preserved and the data do not have to be parsed again. The records are partitioned by courseid and
+    optionally by month, e.g. directory/courseid=5/month=2022-01/part-00000.parquet, so that a course or a period can
+    be loaded without reading the whole site. The users with more than one role are stored with
+    transforming.join_roles. Compact dataframes are expanded, since the dictionaries of their attributes are not saved.
+
+    Args:
+        df: The consolidated dataframe.
+        directory: The directory of the dataset.
+        file_format: 'parquet' or 'feather'.
+        by_month: Partition the courses by month as well.
+        append: Add the records to an existing dataset instead of replacing it.
+        staging: The staging directory of the dataset (see commit_staging): the records are added to the dataset
+            once the files written in it are committed. The dataset is not modified.
+
+    Returns:
+        The list of the written files.
+    """
+
+    if file_format not in FORMATS:
+        raise ValueError("Unknown format '{}'. Available formats: {}".format(file_format, list(FORMATS)))
+
+    if not append and staging == "":
+        for file_path in glob.glob(os.path.join(directory, 'courseid=*', '**', 'part-*'), recursive=True):
+            os.remove(file_path)
+
+    if cp.get_dictionaries(df):
+        df = cp.expand_data(df)
+    df = tr.join_roles(df.reset_index(drop=True))
+    keys = [df['courseid']]
+    if by_month:
+        keys.append(pd.Series(get_months(df), index=df.index))
+
+    written = []
+    for values, partition in df.groupby(keys, sort=True, dropna=False, observed=True):
+        values = values if isinstance(values, tuple) else (values,)
+        partition_name = _partition_name('courseid', values[0])
+        if by_month:
+            partition_name = os.path.join(partition_name, _partition_name('month', values[1]))
+        partition_directory = os.path.join(staging or directory, partition_name)
+        os.makedirs(partition_directory, exist_ok=True)
+
+        # new parts are added to the existing ones, and to those already staged
+        number = _next_part_number([os.path.join(directory, partition_name), partition_directory])
+        file_path = os.path.join(partition_directory, 'part-{:05d}{}'.format(number, FORMATS[file_format]))
+        _write_file(partition.reset_index(drop=True), file_path)
+        written.append(file_path)
+
+    return written
+
+
+def _next_part_number(partition_directories: [str]) -> int:
+    """
+    Return the number following those of the parts of the partition directories.
+    """
+
+    numbers = [int(re.match(r'part-(\d+)', os.path.basename(file_path)).group(1))
+               for partition_directory in partition_directories
+               for file_path in glob.glob(os.path.join(partition_directory, 'part-*'))]
+
+    return max(numbers, default=-1) + 1
+
+
+def _write_file(df: DataFrame, file_path: str):
+    """
+    Write a part of the dataset in the format given by the extension of the file.
+    """
+
+    if file_path.endswith(FORMATS['parquet']):
+        df.to_parquet(file_path, index=False)
+    else:
+        df.to_feather(file_path)
+
+
+def _read_file(file_path: str, columns: [str] = None) -> DataFrame:
+    """
+    Read a part of the dataset in the format given by the extension of the file.
+    """
+
+    if file_path.endswith(FORMATS['parquet']):
+        return pd.read_parquet(file_path, columns=columns)
+
+    return pd.read_feather(file_path, columns=columns)
+
+
+def update_values(directory: str,
+                  field: str,
+                  values: Series,
+                  courseids: [],
+                  months: [str] = None,
+                  staging: str = "") -> int:
+    """
+    Set the field of the records already saved whose ID is in the index of values. Only the files of the partitions of
+    the given courses (and months, if the dataset is partitioned by month) are read, and only those containing one of
+    the records are written again.
+
+    Args:
+        directory: The directory of the dataset.
+        field: The field to set.
+        values: The values of the field indexed by ID.
+        courseids: The courses of the records.
+        months: The months (YYYY-MM) of the records.
+        staging: The staging directory of the dataset (see commit_staging): the files are written to the same paths
+            in it, and replace those of the dataset once they are committed. The dataset is not modified.
+
+    Returns:
+        The number of records updated.
+    """
+
+    if len(values) == 0:
+        return 0
+
+    updated = 0
+    for course_directory in _select_partitions(directory, 'courseid', courseids):
+        month_directories = _select_partitions(course_directory, 'month', months) or [course_directory]
+        for partition_directory in month_directories:
+            for file_path in sorted(glob.glob(os.path.join(partition_directory, 'part-*'))):
+                if staging != "":
+                    staged_path = os.path.join(staging, os.path.relpath(file_path, directory))
+                    # a file already staged is updated again
+                    file_path, written_path = (staged_path if os.path.exists(staged_path) else file_path), staged_path
+                else:
+                    written_path = file_path
+                # the ids are read first, the whole file only if it has to be written again
+                selected = _read_file(file_path, ['ID'])['ID'].isin(values.index).to_numpy()
+                if not selected.any():
+                    continue
+                part = _read_file(file_path)
+                column = part[field].to_numpy(copy=True)
+                column[selected] = values.loc[part['ID'].to_numpy()[selected]].to_numpy()
+                part[field] = column
+                os.makedirs(os.path.dirname(written_path), exist_ok=True)
+                _write_file(part, written_path)
+                updated += int(selected.sum())
+
+    return updated
+
+
+def get_partition_files(directory: str, courseids: []) -> [str]:
+    """
+    Return the paths of the files of the partitions of the given courses, of all the courses if courseids is None.
+    """
+
+    return [file_path for course_directory in _select_partitions(directory, 'courseid', courseids)
+            for file_path in sorted(glob.glob(os.path.join(course_directory, '**', 'part-*'), recursive=True))]
+
+
+def remove_partitions(directory: str, courseids: []):
+    """
+    Delete the files of the partitions of the given courses, before they are written again.
+    """
+
+    for file_path in get_partition_files(directory, courseids):
+        os.remove(file_path)
+
+
+def _select_partitions(directory: str, field: str, values: []) -> [str]:
+    """
+    Return the partition directories of the field, only those of the given values if values is not None.
+    """
+
+    partitions = sorted(glob.glob(os.path.join(directory, field + '=*')))
+    if values is None:
+        return partitions
+
+    names = set(_partition_name(field, value) for value in values)
+
+    return [partition for partition in partitions if os.path.basename(partition) in names]
+
+
+def concat_frames(frames: [DataFrame]) -> DataFrame:
+    """
+    Concatenate dataframes keeping the categorical fields categorical when their categories differ.
+    """
+
+    if not frames:
+        return DataFrame()
+
+    frames = list(frames)
+    for column in frames[0].columns:
+        if all(isinstance(frame[column].dtype, pd.CategoricalDtype) for frame in frames):
+            categories = union_categoricals([frame[column] for frame in frames], ignore_order=True).categories
+            categories = sorted(categories)
+            for i, frame in enumerate(frames):
+                frames[i] = frame.assign(**{column: frame[column].cat.set_categories(categories)})
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def load_consolidated_data(directory: str,
+                           courseids: [] = None,
+                           months: [str] = None,
+                           columns: [str] = None) -> DataFrame:
+    """
+    Load a dataset saved with save_consolidated_data. Only the partitions of the selected courses and months are read,
+    and only the selected columns of them.
+
+    Args:
+        directory: The directory of the dataset.
+        courseids: The ids of the courses to load, all if None.
+        months: The months (YYYY-MM) to load, all if None. The dataset must be partitioned by month.
+        columns: The fields to load, all if None.
+
+    Returns:
+        The consolidated dataframe sorted as it was saved.
+    """
+
+    file_paths = []
+    for course_directory in _select_partitions(directory, 'courseid', courseids):
+        month_directories = _select_partitions(course_directory, 'month', months)
+        if months is None and not month_directories:
+            month_directories = [course_directory]
+        for partition_directory in month_directories:
+            file_paths += sorted(glob.glob(os.path.join(partition_directory, 'part-*')))
+
+    frames = [_read_file(file_path, columns) for file_path in file_paths]
+
+    df = concat_frames(frames)
+    if columns is not None:
+        df = df.reindex(columns=columns)
+    # the partitions are read course by course
+    if 'ID' in df:
+        df = df.sort_values('ID', kind='stable').reset_index(drop=True)
+    df = tr.split_roles(df)
+
+    return df
+
+
+def load_records(directory: str,
+                 courseids: [] = None,
+                 months: [str] = None,
+                 columns: [str] = None) -> Records:
+    """
+    Load a dataset saved with save_consolidated_data in a Records object (see load_consolidated_data).
+    """
+
+    df = load_consolidated_data(directory, courseids=courseids, months=months, columns=columns)
+    records = Records(df)
+
+    return records
+
+
+def _get_period_months(directory: str, start, end) -> [str]:
+    """
+    Return the months (YYYY-MM) of the month partitions of the dataset between the months of start and end (Unix
+    times, None for no bound), None if the dataset is not partitioned by month.
+    """
+
+    partitions = glob.glob(os.path.join(directory, 'courseid=*', 'month=*'))
+    if not partitions:
+        return None
+
+    months = sorted(set(os.path.basename(partition)[len('month='):] for partition in partitions))
+    if start is not None:
+        months = [month for month in months if month >= pd.Timestamp(start, unit='s').strftime('%Y-%m')]
+    if end is not None:
+        months = [month for month in months if month <= pd.Timestamp(end, unit='s').strftime('%Y-%m')]
+
+    return months
+
+
+def query_consolidated_data(directory: str, query: Query, copy: bool = False) -> Records:
+    """
+    Run a query on a dataset saved with save_consolidated_data, loading only what its plan reads (see
+    Query.get_plan): the partitions of the courses of its courseid filter, the months of its period when the dataset
+    is partitioned by month, and its fields, e.g.
+
+        query_consolidated_data(directory, Query().where(courseid=[5], Role=['Student']).select(['Username']))
+
+    Args:
+        directory: The directory of the dataset.
+        query: The query, its records are ignored.
+        copy: Return a copy of the records of the query, see Query.collect.
+
+    Returns:
+        The Records object of the selected fields of the selected records.
+    """
+
+    plan = query.get_plan()
+    courseids = plan['index_filters'].get('courseid')
+    months = _get_period_months(directory, *plan['period']) if plan['period'] != (None, None) else None
+    records = load_records(directory, courseids=None if courseids is None else list(courseids), months=months,
+                           columns=plan['fields'])
+
+    return query.bind(records).collect(copy=copy)
+
+
+def save_database(df: DataFrame, path: str, table: str = 'records', chunksize: int = 100000) -> int:
+    """
+    Bulk load the consolidated data in a table of a SQLite database, replacing the table if it exists, and create the
+    indexes of DATABASE_INDEXES, so that the records of a course, of a user or of a period are read from a few pages of
+    the database (see SQLRecords). Compact dataframes are expanded, and the roles of the users with more than one role
+    are joined (see transforming.join_roles).
+
+    Args:
+        df: The consolidated dataframe.
+        path: The path of the database, created if it does not exist.
+        table: The table of the records.
+        chunksize: The number of records inserted at once.
+
+    Returns:
+        The number of records loaded.
+    """
+
+    if cp.get_dictionaries(df):
+        df = cp.expand_data(df)
+    df = tr.join_roles(df)
+
+    connection = sqlite3.connect(path)
+    try:
+        # the table is rebuilt from the dataframe if the load is interrupted
+        connection.execute('PRAGMA journal_mode = OFF')
+        connection.execute('PRAGMA synchronous = OFF')
+        df.to_sql(table, connection, if_exists='replace', index=False, chunksize=chunksize)
+        for name, fields in DATABASE_INDEXES.items():
+            if all(field in df for field in fields):
+                connection.execute('CREATE INDEX "{0}_{1}" ON "{0}" ({2})'
+                                   .format(table, name, ', '.join('"{}"'.format(field) for field in fields)))
+        # statistics of the indexes for the query planner
+        connection.execute('ANALYZE')
+        connection.commit()
+    finally:
+        connection.close()
+
+    return len(df)
+
+
+def load_database(path: str, table: str = 'records') -> SQLRecords:
+    """
+    Open the records of a database written by save_database in a SQLRecords object.
+    """
+
+    records = SQLRecords(path, table)
+
+    return records
+
+
+def save_arrays(df: DataFrame, directory: str, columns: [str] = None) -> int:
+    """
+    Save the consolidated data as a directory of NumPy arrays, one <field>.npy file per field, that can be read
+    without pandas, e.g. np.load(directory + '/Event_name.npy', mmap_mode='r'). The dataframe is saved in compact form
+    (see compacting.compact_data): the categorical fields are saved as the codes of their categories, the usernames as
+    their ids and the other fields as integers or floats. The categories and the usernames are saved in the
+    ARRAYS_FILE of the directory together with the fields and their types. The missing values of the nullable integer
+    fields are saved in a <field>.mask.npy file.
+
+    Args:
+        df: The consolidated dataframe, in compact form or not.
+        directory: The directory of the arrays, created if it does not exist.
+        columns: The fields to save, all if None.
+
+    Returns:
+        The number of records saved.
+    """
+
+    if not cp.get_dictionaries(df):
+        df = cp.compact_data(df)
+    dictionaries = dict(cp.get_dictionaries(df))
+    if columns is not None:
+        df = df[columns]
+
+    os.makedirs(directory, exist_ok=True)
+    fields = {}
+    for field in df.columns:
+        values = df[field]
+        if values.dtype == object:
+            # the fields that compact_data does not know are saved as categoricals
+            dictionaries[field] = cp.extend_dictionary(None, values.unique())
+            values = Series(pd.Categorical(values, categories=dictionaries[field]))
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            array, kind = np.asarray(values.cat.codes), 'categorical'
+        elif isinstance(values.dtype, pd.api.extensions.ExtensionDtype):
+            array, kind = values.to_numpy(dtype=values.dtype.numpy_dtype, na_value=0), 'nullable'
+            np.save(os.path.join(directory, field + '.mask.npy'), values.isna().to_numpy())
+        else:
+            array, kind = values.to_numpy(), 'array'
+        np.save(os.path.join(directory, field + '.npy'), array)
+        fields[field] = {'kind': kind, 'dtype': array.dtype.name}
+
+    # the fields are listed once their arrays are written
+    metadata = {'rows': len(df),
+                'fields': fields,
+                'dictionaries': dict((field, list(dictionary)) for field, dictionary in dictionaries.items()
+                                     if field in fields)}
+    path = os.path.join(directory, ARRAYS_FILE)
+    with open(path + '.tmp', 'w') as file:
+        json.dump(metadata, file)
+    os.replace(path + '.tmp', path)
+
+    return len(df)
+
+
+def load_arrays(directory: str, columns: [str] = None) -> DataFrame:
+    """
+    Load the arrays saved with save_arrays in a compact dataframe whose fields are memory maps of the files: they are
+    not copied in memory, and the processes that load the same arrays share the pages of the files. The dataframe is
+    read-only, and its original form can be restored with compacting.expand_data.
+
+    Args:
+        directory: The directory of the arrays.
+        columns: The fields to load, all if None.
+
+    Returns:
+        The compact dataframe.
+    """
+
+    with open(os.path.join(directory, ARRAYS_FILE)) as file:
+        metadata = json.load(file)
+    fields = metadata['fields']
+    if columns is None:
+        columns = list(fields)
+    missing = [column for column in columns if column not in fields]
+    if missing:
+        raise ValueError("Unknown fields {}. Available fields: {}".format(missing, list(fields)))
+
+    dictionaries = dict((field, pd.Index(values, dtype=object))
+                        for field, values in metadata['dictionaries'].items() if field in columns)
+    data = {}
+    for field in columns:
+        array = np.load(os.path.join(directory, field + '.npy'), mmap_mode='r')
+        if fields[field]['kind'] == 'categorical':
+            data[field] = pd.Categorical.from_codes(array, categories=dictionaries[field])
+        elif fields[field]['kind'] == 'nullable':
+            mask = np.load(os.path.join(directory, field + '.mask.npy'), mmap_mode='r')
+            data[field] = pd.arrays.IntegerArray(array, mask)
+        else:
+            data[field] = array
+
+    # the arrays are not consolidated in blocks, so they are not copied
+    df = DataFrame(data, columns=columns, copy=False)
+    df.attrs[cp.DICTIONARIES] = dictionaries
+
+    return df
+
+
+def load_array_records(directory: str, columns: [str] = None) -> Records:
+    """
+    Load the arrays saved with save_arrays in a Records object, without copying them (see load_arrays).
+    """
+
+    records = Records(load_arrays(directory, columns=columns))
+
+    return records
+
+
+def save_state(directory: str, state: dict, tables: dict):
+    """
+    Save the state of the incremental consolidation next to the dataset: the watermark and the options of the dataset
+    in state.json, and the tables of the state (e.g. the role state, see integrating.get_role_state) in parquet files.
+
+    Args:
+        directory: The directory of the dataset.
+        state: The watermark and the options of the dataset.
+        tables: The dataframes of the state by name.
+    """
+
+    state_directory = os.path.join(directory, STATE_DIRECTORY)
+    os.makedirs(state_directory, exist_ok=True)
+
+    # each file is written atomically, the state and the dataset are replaced together by commit_staging
+    for name, table in tables.items():
+        path = os.path.join(state_directory, name + '.parquet')
+        table.reset_index(drop=True).to_parquet(path + '.tmp', index=False)
+        os.replace(path + '.tmp', path)
+    state = dict(state, tables=sorted(tables))
+    path = os.path.join(state_directory, STATE_FILE)
+    with open(path + '.tmp', 'w') as file:
+        json.dump(state, file, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def load_state(directory: str) -> (dict, dict):
+    """
+    Load the state saved with save_state.
+
+    Returns:
+        The watermark and the options of the dataset, and the dataframes of the state by name. (None, None) if the
+        dataset has no state.
+    """
+
+    state_path = os.path.join(directory, STATE_DIRECTORY, STATE_FILE)
+    if not os.path.exists(state_path):
+        return None, None
+
+    with open(state_path) as file:
+        state = json.load(file)
+    tables = dict((name, pd.read_parquet(os.path.join(directory, STATE_DIRECTORY, name + '.parquet')))
+                  for name in state.pop('tables'))
+
+    return state, tables
+
+
+def get_staging_directory(directory: str) -> str:
+    """
+    Return the staging directory of the dataset, emptied of the files of a run that was not committed.
+    """
+
+    staging = os.path.join(directory, STAGING_DIRECTORY)
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    return staging
+
+
+def commit_staging(directory: str, removed: [str] = None):
+    """
+    Replace the files of the dataset by those of its staging directory (see get_staging_directory) and delete the
+    removed files, so that the files written by a run are added to the dataset together. The list of the changes is
+    written to the JOURNAL_FILE first: a run interrupted before the journal is written leaves the dataset as it was,
+    and the changes of a run interrupted after it are applied by recover_staging. The state file is replaced last.
+
+    Args:
+        directory: The directory of the dataset.
+        removed: The paths of the files of the dataset to delete, e.g. the partitions written again.
+    """
+
+    staging = os.path.join(directory, STAGING_DIRECTORY)
+    staged = [os.path.relpath(file_path, staging)
+              for file_path in sorted(glob.glob(os.path.join(staging, '**', '*'), recursive=True))
+              if os.path.isfile(file_path)]
+    staged.sort(key=lambda file_path: file_path == os.path.join(STATE_DIRECTORY, STATE_FILE))
+    # the files replaced by staged files are not deleted, so that the journal can be applied again
+    removed = sorted(set(os.path.relpath(file_path, directory) for file_path in removed or []) - set(staged))
+
+    path = os.path.join(directory, JOURNAL_FILE)
+    with open(path + '.tmp', 'w') as file:
+        json.dump({'staged': staged, 'removed': removed}, file, indent=2)
+    os.replace(path + '.tmp', path)
+
+    _apply_journal(directory)
+
+
+def _apply_journal(directory: str):
+    """
+    Apply the changes of the JOURNAL_FILE of the dataset, the changes already applied are skipped.
+    """
+
+    path = os.path.join(directory, JOURNAL_FILE)
+    with open(path) as file:
+        journal = json.load(file)
+
+    staging = os.path.join(directory, STAGING_DIRECTORY)
+    for file_path in journal['removed']:
+        if os.path.exists(os.path.join(directory, file_path)):
+            os.remove(os.path.join(directory, file_path))
+    for file_path in journal['staged']:
+        if os.path.exists(os.path.join(staging, file_path)):
+            os.makedirs(os.path.dirname(os.path.join(directory, file_path)), exist_ok=True)
+            os.replace(os.path.join(staging, file_path), os.path.join(directory, file_path))
+
+    shutil.rmtree(staging, ignore_errors=True)
+    os.remove(path)
+
+
+def recover_staging(directory: str) -> bool:
+    """
+    Complete the commit of a run interrupted after its journal was written (see commit_staging), and remove the files
+    staged by a run interrupted before.
+
+    Returns:
+        Whether the changes of an interrupted commit were applied.
+    """
+
+    if os.path.exists(os.path.join(directory, JOURNAL_FILE)):
+        _apply_journal(directory)
+        return True
+
+    shutil.rmtree(os.path.join(directory, STAGING_DIRECTORY), ignore_errors=True)
+
+    return False
@@ -0,0 +1,282 @@
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+import src.algorithms.integrating as it
+import src.algorithms.timing as tm
+import src.algorithms.transforming as tr
+
+
+def read_log_chunks(logs: str = "",
+                    directory: str = "",
+                    chunksize: int = 100000,
+                    dtype: dict = None):
+    """
+    Read the extracted logs in chunks instead of loading them at once. As in get_dataframe, the records get the 'index'
+    field with their position in the file. The files of xAPI statements are read by integrating.read_xapi_chunks.
+
+    Args:
+        logs: The path of a unique log file.
+        directory: The path of the directory that contains the course files.
+        chunksize: The number of records of each chunk.
+        dtype: The types of the fields, transforming.LOG_DTYPES if None.
+
+    Returns:
+        A generator of dataframes.
+    """
+
+    if dtype is None:
+        dtype = tr.LOG_DTYPES
+    if directory != '':
+        file_paths = it.get_log_files(directory)
+    else:
+        file_paths = [logs]
+
+    for file_path in file_paths:
+        if it.is_xapi_file(file_path):
+            yield from it.read_xapi_chunks(file_path, chunksize)
+            continue
+        # the index of the chunks continues from one chunk to the next
+        for chunk in pd.read_csv(file_path, sep=',', chunksize=chunksize, dtype=dtype):
+            chunk.reset_index(inplace=True)
+            yield chunk
+
+
+def write_run(frames, directory: str, name: str, block_size: int) -> [str]:
+    """
+    Write sorted dataframes into a run of pickled blocks of at most block_size records.
+
+    Returns:
+        The list of the paths of the blocks in order.
+    """
+
+    paths = []
+    pending = []
+    pending_size = 0
+
+    def flush(block):
+        path = os.path.join(directory, '{}_{}.pkl'.format(name, len(paths)))
+        block.to_pickle(path)
+        paths.append(path)
+
+    for frame in frames:
+        pending.append(frame)
+        pending_size += len(frame)
+        while pending_size >= block_size:
+            block = pd.concat(pending) if len(pending) > 1 else pending[0]
+            flush(block.iloc[:block_size])
+            rest = block.iloc[block_size:]
+            pending = [rest] if len(rest) else []
+            pending_size = len(rest)
+
+    if pending_size:
+        flush(pd.concat(pending) if len(pending) > 1 else pending[0])
+
+    return paths
+
+
+def merge_runs(runs: [[str]], by: [str], remove: bool = True):
+    """
+    Merge runs of blocks sorted by Unix_Time into a single stream sorted by the given fields (Unix_Time first). Only
+    one block per run is kept in memory: the records older than the last time loaded from every run cannot be preceded
+    by records still on disk, so they are sorted and returned, while the run with the oldest last time loads its next
+    block.
+
+    Args:
+        runs: The lists of the paths of the blocks of each run.
+        by: The fields to sort the records by.
+        remove: Delete the blocks once loaded.
+
+    Returns:
+        A generator of sorted dataframes.
+    """
+
+    def load(run):
+        path = run.pop(0)
+        block = pd.read_pickle(path)
+        if remove:
+            os.remove(path)
+        return block
+
+    runs = [list(run) for run in runs if run]
+    buffers = [load(run) for run in runs]
+
+    while True:
+        pending = [i for i in range(len(runs)) if runs[i]]
+        if not pending:
+            remaining = [buffer for buffer in buffers if len(buffer)]
+            if remaining:
+                yield pd.concat(remaining).sort_values(by=by, kind='stable')
+            return
+
+        frontier = min(buffers[i]['Unix_Time'].iloc[-1] if len(buffers[i]) else float('-inf') for i in pending)
+        ready = []
+        for i, buffer in enumerate(buffers):
+            older = (buffer['Unix_Time'] < frontier).to_numpy()
+            if older.any():
+                ready.append(buffer.loc[older])
+                buffers[i] = buffer.loc[~older]
+        if ready:
+            yield pd.concat(ready).sort_values(by=by, kind='stable')
+
+        for i in pending:
+            if not len(buffers[i]) or buffers[i]['Unix_Time'].iloc[-1] <= frontier:
+                buffers[i] = pd.concat([buffers[i], load(runs[i])])
+
+
+def sort_runs(runs: [[str]],
+              by: [str],
+              directory: str,
+              block_size: int,
+              fan_in: int = 16):
+    """
+    Sort the records of the runs with an external merge sort: groups of at most fan_in runs are merged into new runs
+    until at most fan_in runs are left, so that at most fan_in blocks are in memory at the same time.
+
+    Returns:
+        A generator of sorted dataframes.
+    """
+
+    level = 0
+    while len(runs) > fan_in:
+        merged = []
+        for start in range(0, len(runs), fan_in):
+            name = 'merge_{}_{}'.format(level, start)
+            merged.append(write_run(merge_runs(runs[start:start + fan_in], by), directory, name, block_size))
+        runs = merged
+        level += 1
+
+    return merge_runs(runs, by)
+
+
+def append_csv(df: DataFrame, path: str, first: bool):
+    """
+    Write the dataframe to a csv file, creating it for the first dataframe and appending the following ones.
+    """
+
+    df.to_csv(path, mode='w' if first else 'a', header=first)
+
+
+def write_consolidated_data(course_names: str,
+                            output: str,
+                            logs: str = "",
+                            directory: str = "",
+                            chunksize: int = 100000,
+                            time_aware: bool = False,
+                            spill_directory: str = None,
+                            fan_in: int = 16) -> int:
+    """
+    Consolidate the logs in streaming mode and write them to a csv file, for logs that do not fit in memory. The
+    result is the same as get_consolidated_data. The logs are read in chunks that are integrated and written to
+    temporary sorted runs, while the role events of the courses are collected. The roles are then computed on the
+    collected events, and the runs are merged in the order of sort_data. The durations are computed block by block
+    with the last record of each user carried to the next block. Since that record's Duration depends on later
+    blocks, the blocks are written to the temporary directory once more and completed before they are written to the
+    csv file. The memory used depends on chunksize and on the number of users rather than on the size of the logs.
+
+    Args:
+        course_names: The path of the course names file.
+        output: The path of the csv file of the consolidated data.
+        logs: The path of a unique log file.
+        directory: The path of the directory that contains the course files.
+        chunksize: The number of records read at once.
+        time_aware: Assign the roles in effect at the time of each record (see add_role).
+        spill_directory: The directory of the temporary files, the default temporary directory if None.
+        fan_in: The maximum number of runs merged at once.
+
+    Returns:
+        The number of records written.
+    """
+
+    block_size = max(chunksize // fan_in, 1)
+    courses = it.get_courses(course_names=course_names)
+
+    with tempfile.TemporaryDirectory(dir=spill_directory) as temp_directory:
+        runs = []
+        events = []
+        courseids = set()
+        authenticated = False
+        first_time = last_time = None
+        position = 0
+
+        # --------------------
+        # ROW-LOCAL STAGES
+        # --------------------
+        for number, chunk in enumerate(read_log_chunks(logs, directory, chunksize)):
+            chunk = it.integrate_logs(chunk, courses)
+            # position of the record in the logs, used to break ties as sort_data does
+            chunk['Position'] = np.arange(position, position + len(chunk))
+            chunk['Reversed'] = -chunk['Position']
+            position += len(chunk)
+
+            if first_time is None:
+                first_time = chunk['Unix_Time'].iloc[0]
+            last_time = chunk['Unix_Time'].iloc[-1]
+
+            with_area = chunk['Course_Area'].notnull()
+            authenticated = authenticated or bool(with_area.any())
+            courseids.update(chunk.loc[with_area, 'courseid'].unique())
+
+            chunk_events = it.get_role_events(chunk, [c for c in chunk['courseid'].unique() if c != 0 and c != 1])
+            chunk_events['ID'] = chunk['ID'].values[chunk_events['Order']]
+            chunk_events['Position'] = chunk['Position'].values[chunk_events['Order']]
+            events.append(chunk_events)
+
+            chunk = chunk.sort_values(['Unix_Time', 'ID', 'Position'])
+            runs.append(write_run([chunk], temp_directory, 'run_{}'.format(number), block_size))
+
+        # logs recorded from the newest to the oldest are reversed by sort_data before sorting
+        if first_time is not None and last_time < first_time:
+            by = ['Unix_Time', 'Reversed']
+        else:
+            by = ['Unix_Time', 'ID', 'Position']
+
+        # --------------------
+        # ROLES
+        # --------------------
+        if position == 0:
+            append_csv(DataFrame(columns=tr.CONSOLIDATED_FIELDS), output, first=True)
+            return 0
+
+        courseids = [courseid for courseid in courseids if courseid != 0 and courseid != 1]
+        events = pd.concat(events)
+        events = events.loc[events['courseid'].isin(courseids)].copy()
+        events['Reversed'] = -events['Position']
+        events = events.sort_values(by=by)
+        events['Order'] = np.arange(len(events))
+        if time_aware:
+            roles = it.get_role_timeline(events)
+        else:
+            roles = it.get_role_assignments(events)
+
+        # --------------------
+        # SORTED OUTPUT
+        # --------------------
+        blocks = []
+        completed = []
+        sessions = None
+        sorted_records = 0
+        for block in sort_runs(runs, by, temp_directory, block_size, fan_in):
+            block.index = np.arange(sorted_records, sorted_records + len(block))
+            block['ID'] = block.index
+            block, sessions, durations = tm.add_duration_incremental(block, sessions)
+            completed.append(durations)
+            path = os.path.join(temp_directory, 'output_{}.pkl'.format(len(blocks)))
+            block.to_pickle(path)
+            blocks.append((path, len(block)))
+            sorted_records += len(block)
+
+        # the durations of the last records of the users in each block are known from the following blocks
+        completed = pd.concat(completed).sort_index()
+        written = 0
+        for path, len_block in blocks:
+            block = pd.read_pickle(path)
+            os.remove(path)
+            start, stop = np.searchsorted(completed.index, [written, written + len_block])
+            block.loc[completed.index[start:stop], 'Duration'] = completed.values[start:stop]
+            block = it.apply_roles(block, courseids, roles, authenticated)
+            append_csv(block.reindex(columns=tr.CONSOLIDATED_FIELDS), output, first=written == 0)
+            written += len(block)
+
+    return written
@@ -1,4 +1,14 @@
 from datetime import datetime
+import numpy as np
+import pandas as pd
+from pandas import DataFrame, Series
+
+
+# format of the timestamps of the extracted logs, e.g. 2022-01-31 22:59:03+00:00
+TIME_FORMAT = "%Y-%m-%d %X%z"
+
+# positions of the separators in the timestamps of the extracted logs
+_TIME_LAYOUT = {4: '-', 7: '-', 10: ' ', 13: ':', 16: ':', 22: ':'}
 
 
 def convert_time_to_timestamp(dt: str) -> int:
@@ -14,8 +24,330 @@ def convert_time_to_timestamp(dt: str) -> int:
     """
 
     # date is converted in a date and time string format
-    date_to_string = datetime.strptime(dt, "%Y-%m-%d %X%z")
+    date_to_string = datetime.strptime(dt, TIME_FORMAT)
     # date and time string format is converted in unix timestamp
     time_to_timestamp = int(datetime.timestamp(date_to_string))
 
     return time_to_timestamp
+
+
+def _parse_log_times(values: np.ndarray, return_offsets: bool = False) -> np.ndarray:
+    """
+    Parse the timestamps in the layout of the extracted logs (YYYY-MM-DD HH:MM:SS+HH:MM) with numpy: the date and time
+    are parsed as ISO datetimes and the offset is read from the digits of the strings.
+
+    Returns: the array of the int64 timestamps, None if a value does not have the layout. If return_offsets is True,
+    also the UTC offsets in seconds.
+    """
+
+    try:
+        strings = values.astype('U25')
+    except (TypeError, ValueError):
+        return None
+    if len(strings) == 0 or not (np.char.str_len(strings) == 25).all():
+        return None
+
+    characters = strings.view(np.uint32).reshape(len(strings), 25)
+    for position, separator in _TIME_LAYOUT.items():
+        if not (characters[:, position] == ord(separator)).all():
+            return None
+    signs = characters[:, 19]
+    digits = characters[:, [20, 21, 23, 24]].astype(np.int64) - ord('0')
+    if not (((signs == ord('+')) | (signs == ord('-'))).all() and ((digits >= 0) & (digits <= 9)).all()):
+        return None
+
+    try:
+        local = strings.astype('U19').astype('datetime64[s]').astype(np.int64)
+    except ValueError:
+        return None
+    offsets = (digits[:, 0] * 10 + digits[:, 1]) * 3600 + (digits[:, 2] * 10 + digits[:, 3]) * 60
+    offsets = np.where(signs == ord('-'), -1, 1) * offsets
+
+    if return_offsets:
+        return local - offsets, offsets
+
+    return local - offsets
+
+
+def normalize_xapi_timestamps(times: Series) -> Series:
+    """
+    Return the ISO 8601 timestamps of the xAPI statements (e.g. 2022-01-01T10:00:00.123Z) in the layout of the
+    extracted logs (YYYY-MM-DD HH:MM:SS+HH:MM): the fractions of seconds are dropped and the timestamps without offset
+    are in UTC. The values that are not ISO 8601 timestamps are left unchanged.
+    """
+
+    parts = times.str.extract(r'^(\d{4}-\d{2}-\d{2})[T ](\d{2}:\d{2}:\d{2})(?:\.\d+)?(Z|[+-]\d{2}:?\d{2})?$')
+    matched = parts[0].notnull()
+    if not matched.any():
+        return times
+
+    offsets = parts[2].fillna('+00:00').replace('Z', '+00:00')
+    offsets = offsets.where(offsets.str.len() == 6, offsets.str[:3] + ':' + offsets.str[3:])
+    normalized = times.copy()
+    normalized[matched] = (parts[0] + ' ' + parts[1] + offsets)[matched]
+
+    return normalized
+
+
+def get_utc_offsets(times: Series, timestamps: np.ndarray = None) -> np.ndarray:
+    """
+    Return the UTC offsets in minutes of the datetime strings in the layout of the extracted logs
+    (YYYY-MM-DD HH:MM:SS+HH:MM), None if a value does not have the layout or, when the timestamps of the strings are
+    given, if a string does not match its timestamp.
+    """
+
+    parsed = _parse_log_times(times.to_numpy(dtype=object), return_offsets=True)
+    if parsed is None:
+        return None
+    if timestamps is not None and not np.array_equal(parsed[0], np.asarray(timestamps, dtype=np.int64)):
+        return None
+
+    return parsed[1] // 60
+
+
+def format_log_times(timestamps: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """
+    Return the datetime strings in the layout of the extracted logs of the timestamps at the given UTC offsets in
+    minutes, the reverse of get_utc_offsets.
+    """
+
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    local = np.datetime_as_string((timestamps + offsets * 60).astype('datetime64[s]'))
+    # ISO datetimes have a T between the date and the time
+    characters = local.astype('U19').view(np.uint32).reshape(len(local), 19)
+    characters[:, 10] = ord(' ')
+    local = characters.reshape(-1).view('U19')
+
+    codes, uniques = pd.factorize(offsets)
+    suffixes = np.array(['{}{:02d}:{:02d}'.format('-' if offset < 0 else '+', abs(offset) // 60, abs(offset) % 60)
+                         for offset in uniques], dtype='U6')
+
+    return np.char.add(local, suffixes[codes]).astype(object)
+
+
+def convert_times_to_timestamps(times: Series,
+                                time_format: str = TIME_FORMAT,
+                                unique: bool = True,
+                                converter=None) -> np.ndarray:
+    """
+    Convert a series of datetime strings in timestamps. The strings are parsed at once with pandas and normalised to
+    UTC. Since logs recorded in the same second share the same string, by default only the distinct strings are
+    parsed and the results are mapped back to the records. The timestamps in the layout of the extracted logs are
+    parsed with numpy, the others with pandas.
+
+    Args:
+        times: the series of the datetime strings
+        time_format: the format of the strings, inferred from the first value if None
+        unique: parse only the distinct strings
+        converter: a function converting a single string in a timestamp (e.g. convert_time_to_timestamp) to use
+            instead of the vectorised parser for custom formats
+
+    Returns: the array of the int64 timestamps.
+
+    """
+
+    if unique:
+        codes, values = pd.factorize(times, use_na_sentinel=False)
+        values = np.asarray(values, dtype=object)
+    else:
+        codes, values = None, times.to_numpy(dtype=object)
+
+    if converter is not None:
+        timestamps = np.fromiter((converter(value) for value in values), dtype=np.int64, count=len(values))
+    else:
+        if pd.isna(values).any():
+            raise ValueError("The logs contain records without time")
+        timestamps = _parse_log_times(values) if time_format == TIME_FORMAT else None
+        if timestamps is None:
+            parsed = pd.to_datetime(values, format=time_format, utc=True)
+            timestamps = parsed.values.astype(np.int64) // 10 ** 9
+
+    if codes is not None:
+        timestamps = timestamps[codes]
+
+    return timestamps
+
+
+# seconds of inactivity after which the next event of a user starts a new session
+SESSION_TIMEOUT = 1800
+
+# components of the events that end a session
+LOGOUT_COMPONENTS = ['Logout']
+
+# fields of the last record of each user kept between parts of the logs (see add_duration_incremental)
+SESSION_STATE_FIELDS = ['ID', 'Username', 'Unix_Time', 'courseid', 'Last_courseid', 'Logout', 'Session_ID']
+
+
+def stable_argsort(codes: np.ndarray) -> np.ndarray:
+    """
+    Return the stable argsort of non-negative integer codes. The codes are sorted 16 bits at a time, least significant
+    first, since numpy sorts 16-bit integers with a radix sort.
+    """
+
+    order = np.arange(len(codes))
+    if len(codes) == 0:
+        return order
+
+    shift = 0
+    top = int(codes.max())
+    while shift == 0 or top >> shift:
+        digits = ((codes[order] >> shift) & 0xFFFF).astype(np.uint16)
+        order = order[np.argsort(digits, kind='stable')]
+        shift += 16
+
+    return order
+
+
+def add_duration(df: DataFrame,
+                 timeout: int = SESSION_TIMEOUT,
+                 logouts: [str] = None,
+                 course_switch: bool = True) -> DataFrame:
+    """
+    Add the Duration and Session_ID fields to the dataframe sorted by sort_data. The records of each user are taken in
+    order of time with a stable sort on the user codes, and all the differences are computed at once on the sorted
+    arrays.
+
+    The Duration of a record is the number of seconds until the next record of the same user. It is left empty for the
+    last record of the user, for the logout events and when the next record comes after more than timeout seconds. A
+    session of a user starts with their first record, after a logout, after timeout seconds of inactivity and, if
+    course_switch is True, when the user moves from a course to another one: the records outside the courses (courseid
+    0 or 1, e.g. the login and the dashboard) do not end a session, and a record of a course ends it if the last course
+    of the user was another one. The sessions are numbered from 0 in order of their first record. The logs processed
+    in consecutive parts are given the same fields by add_duration_incremental.
+
+    Args:
+        df: The dataframe object sorted by sort_data.
+        timeout: The seconds of inactivity that end a session.
+        logouts: The components of the events that end a session, LOGOUT_COMPONENTS if None.
+        course_switch: End the sessions when the user moves to another course.
+
+    Returns:
+        The dataframe with the fields Duration and Session_ID.
+    """
+
+    df = _add_sessions(df, None, timeout, logouts, course_switch, incremental=False)
+
+    return df
+
+
+def add_duration_incremental(df: DataFrame,
+                             state: DataFrame,
+                             timeout: int = SESSION_TIMEOUT,
+                             logouts: [str] = None,
+                             course_switch: bool = True) -> (DataFrame, DataFrame, Series):
+    """
+    Add the Duration and Session_ID fields to a part of the logs sorted by sort_data, the logs being processed in
+    consecutive parts (see add_duration). The state of the previous parts is the last record of each user, whose
+    Duration depends on the records of the following parts, with the last course of the user. Since the last record of
+    each user is in their latest session, the sessions of the part are numbered after the highest Session_ID of the
+    state.
+
+    Args:
+        df: The part of the logs sorted by sort_data.
+        state: The state returned for the previous part of the logs, None or an empty dataframe for the first part.
+        timeout: The seconds of inactivity that end a session.
+        logouts: The components of the events that end a session, LOGOUT_COMPONENTS if None.
+        course_switch: End the sessions when the user moves to another course.
+
+    Returns:
+        The dataframe with the fields Duration and Session_ID, the state for the next part and the series of the
+        Durations computed for the records of the previous parts, indexed by ID.
+    """
+
+    df, state, completed = _add_sessions(df, state, timeout, logouts, course_switch, incremental=True)
+
+    return df, state, completed
+
+
+def _add_sessions(df: DataFrame,
+                  state: DataFrame,
+                  timeout: int,
+                  logouts: [str],
+                  course_switch: bool,
+                  incremental: bool):
+    """
+    Add the Duration and Session_ID fields, see add_duration and add_duration_incremental. The state for the next part
+    is only computed if incremental is True.
+    """
+
+    if logouts is None:
+        logouts = LOGOUT_COMPONENTS
+    if state is None or len(state) == 0:
+        state = DataFrame(columns=SESSION_STATE_FIELDS)
+    first_session = int(state['Session_ID'].max()) + 1 if len(state) else 0
+    # the last record of each user in the previous parts precedes the records of the part
+    previous = len(state)
+
+    usernames = df['Username']
+    courseids = df['courseid']
+    times = df['Unix_Time'].to_numpy(dtype=np.int64)
+    logout = df['Component'].isin(logouts).to_numpy(dtype=bool)
+    if previous:
+        usernames = pd.concat([state['Username'].astype(object), usernames.astype(object)], ignore_index=True)
+        courseids = pd.concat([state.get('Last_courseid', state['courseid']).astype('float64'),
+                               Series(courseids.to_numpy(dtype='float64', na_value=np.nan))], ignore_index=True)
+        times = np.concatenate([state['Unix_Time'].to_numpy(dtype=np.int64), times])
+        logout = np.concatenate([state['Logout'].to_numpy(dtype=bool), logout])
+
+    users = pd.factorize(usernames, use_na_sentinel=False)[0]
+    course_values = courseids.to_numpy(dtype='float64', na_value=np.nan)
+    courses = pd.factorize(course_values, use_na_sentinel=False)[0]
+    in_course = ~np.isnan(course_values) & (course_values != 0) & (course_values != 1)
+    order = stable_argsort(users)
+    users, courses, times, logout = users[order], courses[order], times[order], logout[order]
+    in_course = in_course[order]
+
+    # consecutive records of the same user
+    same_user = users[1:] == users[:-1]
+    gaps = np.diff(times)
+    ends = ~same_user | (gaps > timeout) | logout[:-1]
+
+    # last record in a course of the user up to each record, the first record of the user if there is none
+    last_in_course = np.maximum.accumulate(np.where(in_course | np.concatenate([[True], ~same_user]),
+                                                    np.arange(len(order)), 0))
+    last_course = np.where(in_course[last_in_course], courses[last_in_course], -1)
+    switches = in_course[1:] & (last_course[:-1] >= 0) & (courses[1:] != last_course[:-1])
+    starts = np.concatenate([[True], ends | (course_switch & switches)])
+
+    durations = np.full(len(order), np.nan)
+    durations[:-1] = np.where(ends, np.nan, gaps)
+
+    # sessions are numbered in order of their first record, the sessions of the previous parts keep their number
+    in_order = np.zeros(len(order), dtype=bool)
+    in_order[order] = starts
+    in_order[:previous] = False
+    numbers = first_session + np.cumsum(in_order) - 1
+    if previous:
+        numbers[:previous] = state['Session_ID'].to_numpy(dtype=np.int64)
+    sessions = numbers[order]
+    sessions = sessions[np.maximum.accumulate(np.where(starts, np.arange(len(order)), 0))]
+
+    all_durations = np.empty(len(order))
+    all_durations[order] = durations
+    all_sessions = np.empty(len(order), dtype=np.int64)
+    all_sessions[order] = sessions
+
+    df['Duration'] = all_durations[previous:]
+    df['Session_ID'] = all_sessions[previous:]
+
+    if not incremental:
+        return df
+
+    # the last record of each user, in the sorted arrays and in the records
+    sorted_last = np.flatnonzero(np.concatenate([~same_user, [True]]))
+    sorted_last = sorted_last[np.argsort(order[sorted_last])]
+    last = order[sorted_last]
+    ids = np.concatenate([state['ID'].to_numpy(dtype=np.int64), df['ID'].to_numpy(dtype=np.int64)])
+    state = DataFrame({'ID': ids[last],
+                       'Username': usernames.to_numpy(dtype=object)[last],
+                       'Unix_Time': times[sorted_last],
+                       'courseid': np.concatenate([state['courseid'].to_numpy(dtype='float64', na_value=np.nan),
+                                                   df['courseid'].to_numpy(dtype='float64', na_value=np.nan)])[last],
+                       'Last_courseid': np.where(in_course[last_in_course], course_values[order][last_in_course],
+                                                 np.nan)[sorted_last],
+                       'Logout': logout[sorted_last],
+                       'Session_ID': all_sessions[last]})
+    completed = Series(all_durations[:previous], index=ids[:previous]).dropna()
+
+    return df, state, completed
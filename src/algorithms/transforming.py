@@ -1,6 +1,37 @@
+import numpy as np
+import pandas as pd
 from pandas import DataFrame
 
 
+# types of the fields of the extracted logs csv file. Modify them according to your names.
+LOG_DTYPES = {'timestamp': 'str',
+              'Email': 'str',
+              'ACTION_VERB': 'str',
+              'OBJECT_ID': 'str',
+              'OBJECT_NAME': 'str',
+              'OBJECT_TYPE': 'str',
+              'OBJECT_DESCRIPTION': 'str',
+              'RelatedActivities': 'str',
+              'Context': 'str'}
+
+# fields of the consolidated dataset, in order
+CONSOLIDATED_FIELDS = ['ID', 'Unix_Time', 'Time', 'Role', 'Username', 'courseid', 'Course_Area', 'Context', 'Component',
+                       'Event_name', 'Duration', 'Session_ID', 'Status']
+
+# paths of the fields of the extracted logs in the xAPI statements, the first path found in a statement is used. The
+# keys of the context extensions are IRIs: the last part of the IRI is compared with the key of the path, and the
+# values of the extensions that are objects are searched for the key as well. Modify them according to your LRS.
+XAPI_FIELDS = {'timestamp': [('timestamp',)],
+               'Email': [('actor', 'name')],
+               'ACTION_VERB': [('verb', 'display', 'en')],
+               'OBJECT_ID': [('object', 'definition', 'id'), ('object', 'id')],
+               'OBJECT_NAME': [('object', 'definition', 'name', 'en')],
+               'OBJECT_TYPE': [('object', 'definition', 'type')],
+               'OBJECT_DESCRIPTION': [('object', 'definition', 'description', 'en')],
+               'RelatedActivities': [('contextActivities', 'grouping'), ('context', 'contextActivities', 'grouping')],
+               'Context': [('context', 'extensions', 'event_name')]}
+
+
 def rename_columns(df: DataFrame) -> DataFrame:
     """
     Rename the fields of the extracted logs csv file. Modify the function according to your names.
@@ -31,3 +62,51 @@ def convert_role(df: DataFrame) -> DataFrame:
     df.loc[df.Role == 'administratif role', 'Role'] = 'Administrative'
 
     return df
+
+
+# separator of the roles of a user with more than one role in a course, when the roles are stored as text
+ROLE_SEPARATOR = '|'
+
+
+def join_roles(df: DataFrame) -> DataFrame:
+    """
+    Return the dataframe where the lists of roles of the users with more than one role are joined in a single string,
+    so that the Role field can be stored in formats that do not support lists.
+    """
+
+    if 'Role' not in df or isinstance(df['Role'].dtype, pd.CategoricalDtype):
+        return df
+
+    is_list = np.frompyfunc(lambda role: isinstance(role, list), 1, 1)(df['Role'].values).astype(bool)
+    if is_list.any():
+        df = df.copy()
+        roles = df['Role'].to_numpy(dtype=object, copy=True)
+        roles[is_list] = [ROLE_SEPARATOR.join(role) for role in roles[is_list]]
+        df['Role'] = roles
+
+    return df
+
+
+def split_roles(df: DataFrame) -> DataFrame:
+    """
+    Return the dataframe where the roles joined by join_roles are split again into lists.
+    """
+
+    if 'Role' not in df or len(df) == 0:
+        return df
+
+    codes, roles = pd.factorize(df['Role'])
+    roles = np.asarray(roles, dtype=object)
+    joined = np.fromiter((isinstance(role, str) and ROLE_SEPARATOR in role for role in roles), dtype=bool,
+                         count=len(roles))
+    if joined.any():
+        df = df.copy()
+        values = df['Role'].to_numpy(dtype=object, copy=True)
+        for code in np.flatnonzero(joined):
+            rows = np.flatnonzero(codes == code)
+            split = roles[code].split(ROLE_SEPARATOR)
+            for row in rows:
+                values[row] = list(split)
+        df['Role'] = values
+
+    return df
@@ -0,0 +1,266 @@
+import os
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+import src.algorithms.aggregating as ag
+import src.algorithms.integrating as it
+import src.algorithms.sorting as st
+import src.algorithms.storing as sr
+import src.algorithms.timing as tm
+import src.algorithms.transforming as tr
+from src.classes.pipeline import Pipeline
+
+
+# integration stages run on the logs of the second of the watermark and after it to find the new records, the other
+# stages of integrating.get_integration_stages only run on those records
+WATERMARK_STAGES = ['rename_columns', 'add_timestamps']
+
+# fields of the logs (as renamed by transforming.rename_columns) that identify a record, so that the records of the
+# second of the watermark that are already consolidated are recognized when they are read again
+RECORD_FIELDS = ['Time', 'Username', 'Verb', 'OBJECT_ID', 'Context', 'Object', 'Description', 'RelatedActivities',
+                 'Path']
+
+
+def _role_event_courses(df: DataFrame) -> []:
+    """
+    Return the ids of all the courses of the dataframe, excluding the site-level ids 0 and 1, whose role events are
+    kept in the state of the incremental consolidation.
+    """
+
+    courseids = df['courseid'].dropna().unique()
+
+    return [courseid for courseid in courseids if courseid != 0 and courseid != 1]
+
+
+def _get_record_keys(df: DataFrame) -> DataFrame:
+    """
+    Return the RECORD_FIELDS of the logs as strings, the missing fields and values as empty strings.
+    """
+
+    keys = {}
+    for field in RECORD_FIELDS:
+        if field in df:
+            keys[field] = df[field].astype(object).where(df[field].notnull(), '').astype(str).to_numpy()
+        else:
+            keys[field] = np.full(len(df), '', dtype=object)
+
+    return DataFrame(keys, index=df.index)
+
+
+def _is_consolidated(keys: DataFrame, boundary: DataFrame) -> np.ndarray:
+    """
+    Return whether the records of the second of the watermark are already consolidated: a record is consolidated if
+    its keys are in the boundary, the keys of the consolidated records of that second, at most as many times as they
+    are in the boundary.
+    """
+
+    keys = keys.reset_index(drop=True)
+    # occurrence of each record among the records with the same keys
+    occurrences = keys.groupby(RECORD_FIELDS, sort=False).cumcount().to_numpy()
+    counts = boundary.groupby(RECORD_FIELDS, sort=False).size().rename('Count').reset_index()
+    counts = keys.merge(counts, on=RECORD_FIELDS, how='left')['Count'].fillna(0).to_numpy()
+
+    return occurrences < counts
+
+
+def update_consolidated_data(course_names: str,
+                             store: str,
+                             logs: str = "",
+                             directory: str = "",
+                             time_aware: bool = False,
+                             file_format: str = 'parquet',
+                             by_month: bool = False,
+                             cubes: bool = False) -> int:
+    """
+    Consolidate only the logs recorded after the last run and append them to the dataset saved in store (see
+    storing.save_consolidated_data), so that a periodic run costs in proportion to the new logs. The state of the
+    dataset is kept in the store: the watermark, i.e. the last Unix_Time and ID consolidated, and the role state of
+    the users in the courses (see integrating.get_role_state). The logs older than the watermark are dropped as soon as
+    their times are parsed, so that the stages of the integration only run on the new logs (see WATERMARK_STAGES).
+    The logs with a Unix_Time greater than the watermark are new, and so are those of the second of the watermark that
+    are not in the boundary, the keys of the records of that second already consolidated (see RECORD_FIELDS), since
+    the logs of a second may be split between two runs (identical records of that second are taken for the records
+    already consolidated, as many times as they were consolidated). The logs older than the watermark are not
+    consolidated, in a cumulative export they are the logs of the previous runs: their number is kept in the state as
+    skipped. The new logs get the IDs following the last one and their roles
+    are computed from the role state followed by the new role events. The last record of each user is kept in the
+    state as well, so that the sessions continue and the Duration of that record is set once the next record of the
+    user arrives (see timing.add_duration_incremental). The first run, on a store without state, consolidates the
+    whole logs.
+
+    With final roles (time_aware False), the users whose roles have changed get the new roles in their previous records
+    too, so the partitions of their courses are written again. With the roles in effect at the time of each record the
+    previous records are left unchanged, except in courses that were not role courses before, whose previous records get
+    their roles from the role state, since the history of the role events is not kept.
+
+    The files of a run are written to the staging directory of the store and added to the dataset together with the
+    state (see storing.commit_staging): a run interrupted before the commit leaves the dataset and its state as they
+    were, and the commit of a run interrupted during the commit is completed by the next run.
+
+    The activity cubes of the dataset (see aggregating.build_cubes) are kept in its CUBES_DIRECTORY and updated with
+    the counts of the new records and of the previous records whose roles are written again, rather than built again.
+
+    Args:
+        course_names: The path of the course names file.
+        store: The directory of the consolidated dataset.
+        logs: The path of a unique log file.
+        directory: The path of the directory that contains the course files.
+        time_aware: Assign the roles in effect at the time of each record (see add_role).
+        file_format: The format of the dataset if it is created, 'parquet' or 'feather'.
+        by_month: Partition the dataset by month as well if it is created.
+        cubes: Build the cubes of the dataset if it has none, they are updated at each run once they are built.
+
+    Returns:
+        The number of records added.
+    """
+
+    # the changes of an interrupted run are applied or discarded
+    sr.recover_staging(store)
+    state, tables = sr.load_state(store)
+    if state is None:
+        state = {'Unix_Time': None, 'ID': -1, 'courseids': [], 'authenticated': False, 'skipped': 0,
+                 'time_aware': time_aware, 'format': file_format, 'by_month': by_month}
+        tables = {'roles': DataFrame(columns=['courseid', 'Username', 'Unix_Time', 'Role', 'Assigned', 'Order']),
+                  'sessions': DataFrame(columns=tm.SESSION_STATE_FIELDS),
+                  'boundary': DataFrame(columns=RECORD_FIELDS)}
+    elif state['time_aware'] != time_aware:
+        raise ValueError("The dataset was consolidated with time_aware={}".format(state['time_aware']))
+    role_state = tables['roles']
+    cubes_directory = os.path.join(store, ag.CUBES_DIRECTORY)
+    cube_data = ag.load_cubes(cubes_directory)
+
+    if directory != '':
+        log_data = it.collect_log_files(directory, dtype=tr.LOG_DTYPES)
+    else:
+        log_data = it.get_dataframe(logs, dtype=tr.LOG_DTYPES)
+
+    # --------------------
+    # WATERMARK
+    # --------------------
+    # the logs older than the watermark are dropped as soon as they are read, only their times are parsed
+    watermark = state['Unix_Time']
+    skipped = 0
+    if watermark is not None:
+        times = tm.convert_times_to_timestamps(log_data['timestamp'])
+        skipped = int((times < watermark).sum())
+        log_data = log_data.loc[times >= watermark].reset_index(drop=True)
+
+    stages = it.get_integration_stages(it.get_courses(course_names=course_names))
+    log_data = Pipeline([stage for stage in stages if stage[0] in WATERMARK_STAGES]).run(log_data, instrument=False)
+
+    if watermark is not None:
+        at_watermark = np.flatnonzero(log_data['Unix_Time'].to_numpy() == watermark)
+        # the records of the second of the watermark are new unless they are in the boundary (the datasets saved
+        # without boundary have all the records of that second)
+        if len(at_watermark):
+            new = np.ones(len(log_data), dtype=bool)
+            if 'boundary' in tables:
+                new[at_watermark] = ~_is_consolidated(_get_record_keys(log_data.iloc[at_watermark]),
+                                                      tables['boundary'])
+            else:
+                new[at_watermark] = False
+            log_data = log_data.loc[new]
+    if len(log_data) == 0:
+        return 0
+
+    # keys of the records of the last second, the boundary of the next run
+    last = log_data['Unix_Time'].max()
+    boundary = _get_record_keys(log_data.loc[log_data['Unix_Time'] == last]).reset_index(drop=True)
+    if last == watermark and 'boundary' in tables:
+        boundary = pd.concat([tables['boundary'], boundary], ignore_index=True)
+
+    # the records are integrated once they are known to be new
+    log_data = log_data.reset_index(drop=True)
+    log_data = Pipeline([stage for stage in stages if stage[0] not in WATERMARK_STAGES]).run(log_data, instrument=False)
+    log_data = st.sort_data(log_data)
+    log_data['ID'] += state['ID'] + 1
+
+    # --------------------
+    # ROLES
+    # --------------------
+    previous_courseids = set(state['courseids'])
+    courseids = sorted(previous_courseids | set(int(courseid) for courseid in it.get_role_courses(log_data)))
+    authenticated = state['authenticated'] or bool(log_data.Course_Area.notnull().any())
+
+    events = it.get_role_events(log_data, _role_event_courses(log_data))
+    events['Order'] += state['ID'] + 1
+    events = pd.concat([role_state.astype(events.dtypes.to_dict()), events], ignore_index=True)
+    role_events = events.loc[events['courseid'].isin(courseids)]
+    if time_aware:
+        roles = it.get_role_timeline(role_events)
+    else:
+        roles = it.get_role_assignments(role_events)
+
+    log_data = it.apply_roles(log_data, courseids, roles, authenticated)
+    log_data, sessions, durations = tm.add_duration_incremental(log_data, tables['sessions'])
+    log_data = log_data.reindex(columns=tr.CONSOLIDATED_FIELDS)
+
+    # --------------------
+    # PREVIOUS RECORDS
+    # --------------------
+    # the files are written to the staging directory, and replace those of the dataset once they are all written
+    staging = sr.get_staging_directory(store)
+    removed = []
+    if state['Unix_Time'] is not None:
+        # previous records whose roles are different from those they were given
+        if authenticated != state['authenticated']:
+            rewritten = None
+        else:
+            rewritten = set(courseids) - previous_courseids
+            if not time_aware:
+                before = it.get_role_assignments(role_state.loc[role_state['courseid'].isin(courseids)])
+                after = it.get_role_assignments(role_events)
+                changed = after.merge(before, on=['courseid', 'Username'], how='left', suffixes=('', '_before'))
+                changed = changed.loc[changed['Role'].map(str) != changed['Role_before'].map(str)]
+                rewritten |= set(changed['courseid'])
+            rewritten = sorted(int(courseid) for courseid in rewritten)
+
+        previous = DataFrame()
+        if rewritten is None or rewritten:
+            previous = sr.load_consolidated_data(store, courseids=rewritten)
+        # the counts of the previous records with their former roles are removed from the cubes
+        if cube_data and len(previous):
+            cube_data = ag.update_cubes(cube_data, added=None, removed=previous.copy())
+
+        # courses without previous records are not in the store
+        if len(previous):
+            if time_aware:
+                previous_roles = it.get_role_timeline(role_state.loc[role_state['courseid'].isin(courseids)])
+            else:
+                previous_roles = roles
+            previous = it.apply_roles(previous, courseids, previous_roles, authenticated)
+            if cube_data:
+                cube_data = ag.update_cubes(cube_data, added=previous)
+            # durations of the last records of the users in the previous runs
+            ids = previous['ID'].to_numpy()
+            ended = np.isin(ids, durations.index)
+            previous.loc[ended, 'Duration'] = durations.loc[ids[ended]].to_numpy()
+            removed = sr.get_partition_files(store, rewritten)
+            sr.save_consolidated_data(previous, store, state['format'], state['by_month'], append=True,
+                                      staging=staging)
+
+        # durations of the last records of the users in the previous runs of the courses not written again
+        if rewritten is not None:
+            completed = tables['sessions'].loc[tables['sessions']['ID'].isin(durations.index)]
+            completed = completed.loc[~completed['courseid'].isin(rewritten)]
+            sr.update_values(store, 'Duration', durations, list(completed['courseid'].unique()),
+                             list(set(sr.get_months(completed))) if state['by_month'] else None, staging=staging)
+
+    sr.save_consolidated_data(log_data, store, state['format'], state['by_month'], append=True, staging=staging)
+
+    if cube_data:
+        ag.save_cubes(os.path.join(staging, ag.CUBES_DIRECTORY), ag.update_cubes(cube_data, added=log_data))
+
+    state.update({'Unix_Time': int(log_data['Unix_Time'].iloc[-1]),
+                  'ID': int(log_data['ID'].iloc[-1]),
+                  'courseids': [int(courseid) for courseid in courseids],
+                  'authenticated': authenticated,
+                  'skipped': skipped})
+    sr.save_state(staging, state, {'roles': it.get_role_state(events), 'sessions': sessions, 'boundary': boundary})
+    sr.commit_staging(store, removed)
+
+    # the cubes of a dataset that has none are built from the whole dataset once it is committed
+    if not cube_data and cubes:
+        ag.save_cubes(cubes_directory, ag.build_cubes(sr.load_consolidated_data(store)))
+
+    return len(log_data)
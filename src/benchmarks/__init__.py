@@ -0,0 +1,5 @@
+__all__ = ["benchmarking", "generating", "serving"]
+
+from .benchmarking import *
+from .generating import *
+from .serving import *
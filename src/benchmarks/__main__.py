@@ -0,0 +1,21 @@
+import argparse
+import pandas as pd
+from src.benchmarks.benchmarking import benchmark
+
+
+parser = argparse.ArgumentParser(description='Benchmark the consolidation on synthetic logs.')
+parser.add_argument('--rows', type=int, default=1000000)
+parser.add_argument('--courses', type=int, default=20)
+parser.add_argument('--users', type=int, default=5000)
+parser.add_argument('--seed', type=int, default=0)
+parser.add_argument('--queries', type=int, default=100)
+parser.add_argument('--no-memory', action='store_true', help='do not measure the memory (faster)')
+parser.add_argument('--output', default='', help='csv file of the report')
+arguments = parser.parse_args()
+
+result = benchmark(arguments.rows, arguments.courses, arguments.users, arguments.seed, arguments.queries,
+                   memory=not arguments.no_memory)
+with pd.option_context('display.width', 120, 'display.max_columns', 10):
+    print(result.to_string(index=False, float_format='{:,.2f}'.format))
+if arguments.output != '':
+    result.to_csv(arguments.output, index=False)
@@ -0,0 +1,164 @@
+"""
+Benchmark of the stages of the consolidation on synthetic logs (see generating.py).
+
+Each stage of get_consolidated_data, the cleaning and the extraction of records is timed and, optionally, profiled
+for the peak of the memory allocated during the stage. The report gives the throughput of each stage in records per
+second, so that the results of different versions can be compared. Run from the root of the repository:
+
+    python -m src.benchmarks --rows 1000000 --courses 20 --users 5000 --output report.csv
+"""
+
+import os
+import time
+import tempfile
+import tracemalloc
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+import src.algorithms.cleaning as cl
+import src.algorithms.extracting as ex
+import src.algorithms.integrating as it
+import src.algorithms.sorting as st
+import src.algorithms.timing as tm
+import src.algorithms.transforming as tr
+from src.classes.records import Records
+import src.benchmarks.generating as gn
+
+
+def measure(function, *args, memory: bool = True, **kwargs) -> (object, float, float):
+    """
+    Call the function and measure the seconds it takes and, if memory is True, the peak of the memory it allocates.
+
+    Returns:
+        The result of the function, the seconds and the peak of the memory in megabytes (nan if not measured).
+    """
+
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    seconds = time.perf_counter() - start
+    peak = np.nan
+    if memory:
+        peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+
+    return result, seconds, peak
+
+
+def _extract(records: Records, queries: [dict]) -> int:
+    """
+    Run the extraction queries and return the number of records extracted.
+    """
+
+    return sum(len(ex.extract_records(records, **query).get_df()) for query in queries)
+
+
+def benchmark_consolidation(logs: str,
+                            course_names: str,
+                            course_dates: str = "",
+                            queries: int = 100,
+                            memory: bool = True,
+                            seed: int = 0) -> DataFrame:
+    """
+    Run the stages of the consolidation one by one on the logs, then the cleaning and the extraction of records.
+
+    Args:
+        logs: The path of the log file.
+        course_names: The path of the course names file.
+        course_dates: The path of the course dates file, the date filter is not measured if empty.
+        queries: The number of extraction queries (random course, role and users).
+        memory: Measure the peak of the memory allocated by each stage.
+        seed: The seed of the extraction queries.
+
+    Returns:
+        The dataframe of the report with the fields 'Stage', 'Rows', 'Seconds', 'Rows/s' and 'Peak MB'. The Rows of
+        extract_records are the number of queries.
+    """
+
+    report = []
+
+    def run(stage, function, *args, rows=None, **kwargs):
+        result, seconds, peak = measure(function, *args, memory=memory, **kwargs)
+        rows = len(result) if rows is None else rows
+        report.append({'Stage': stage, 'Rows': rows, 'Seconds': seconds,
+                       'Rows/s': rows / seconds if seconds > 0 else np.inf, 'Peak MB': peak})
+        return result
+
+    df = run('get_dataframe', it.get_dataframe, logs, dtype=tr.LOG_DTYPES)
+    courses = run('get_courses', it.get_courses, course_names=course_names, course_dates=course_dates, rows=len(df))
+    df = run('rename_columns', tr.rename_columns, df)
+    df = run('parse_related_activities', it.parse_related_activities, df)
+    df = run('add_course_name', it.add_course_name, df, courses)
+    df = run('add_timestamps', it.add_timestamps, df)
+    df = run('decompose_path', it.decompose_path, df)
+    df = run('redefine_course_area', it.redefine_course_area, df)
+    df = run('redefine_component', it.redefine_component, df)
+    df = run('redefine_event_name', it.redefine_event_name, df)
+    df = run('add_status', it.add_status, df)
+    df = run('sort_data', st.sort_data, df)
+    df = run('add_role', it.add_role, df)
+    df = run('add_duration', tm.add_duration, df)
+    rows, stages = len(df), len(report)
+    df = run('select_columns', df.reindex, columns=['ID', 'Unix_Time', 'Time', 'Role', 'Username', 'courseid',
+                                                    'Course_Area', 'Context', 'Component', 'Event_name', 'Duration',
+                                                    'Session_ID', 'Status'])
+    df = run('clean_automatic_events', cl.clean_automatic_events, df, rows=len(df))
+    df = run('clean_specific_events', cl.clean_specific_events, df, rows=len(df))
+
+    records = Records(df)
+    rng = np.random.default_rng(seed)
+    areas = df['Course_Area'].dropna().unique()
+    usernames = df['Username'].unique()
+    extraction = [{'course_area': list(rng.choice(areas, 1)) if len(areas) else None,
+                   'role': ['Student'],
+                   'username': list(rng.choice(usernames, min(5, len(usernames)), replace=False))}
+                  for _ in range(queries)]
+    # the first queries build the indexes of the records
+    run('extract_records', _extract, records, extraction, rows=queries)
+    if course_dates != "":
+        run('get_startdate_enddate', ex.get_startdate_enddate, df, courses, rows=len(df))
+
+    report = DataFrame(report)
+    # the stages of get_consolidated_data
+    seconds = report['Seconds'].iloc[:stages].sum()
+    total = DataFrame([{'Stage': 'consolidation', 'Rows': rows, 'Seconds': seconds, 'Rows/s': rows / seconds,
+                        'Peak MB': report['Peak MB'].iloc[:stages].max()}])
+
+    return pd.concat([report, total], ignore_index=True)
+
+
+def benchmark(rows: int = 1000000,
+              courses: int = 20,
+              users: int = 5000,
+              seed: int = 0,
+              queries: int = 100,
+              memory: bool = True,
+              directory: str = None) -> DataFrame:
+    """
+    Generate synthetic logs and the course files in a temporary directory and run benchmark_consolidation.
+
+    Args:
+        rows: The number of records of the logs.
+        courses: The number of courses.
+        users: The number of users.
+        seed: The seed of the logs and of the queries.
+        queries: The number of extraction queries.
+        memory: Measure the peak of the memory allocated by each stage.
+        directory: The directory of the temporary files, the default temporary directory if None.
+
+    Returns:
+        The dataframe of the report.
+    """
+
+    with tempfile.TemporaryDirectory(dir=directory) as temp_directory:
+        logs = os.path.join(temp_directory, 'logs.csv')
+        names = os.path.join(temp_directory, 'names.csv')
+        dates = os.path.join(temp_directory, 'dates.csv')
+        gn.write_logs(logs, rows, courses=courses, users=users, seed=seed)
+        gn.write_course_files(courses, names, dates)
+
+        report = benchmark_consolidation(logs, names, dates, queries=queries, memory=memory, seed=seed)
+
+    return report
+
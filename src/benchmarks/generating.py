@@ -0,0 +1,375 @@
+"""
+Seeded generator of synthetic Moodle xAPI logs in the layout of the extracted logs (see transforming.rename_columns),
+to measure the consolidation on logs of any size.
+
+The logs are generated with numpy: the strings of the fields are built once for each distinct value (events, modules,
+users) and the records only hold their codes, so that millions of records are generated in seconds. Large logs are
+written in chunks of consecutive periods of time, so that the file is sorted by time as the extracted logs are. The
+logs can also be turned into the xAPI statements they are extracted from (get_statements), to measure the reading of
+the statements or to serve them from the stand-in LRS of serving.py.
+"""
+
+import ast
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+
+# url of the synthetic site
+SITE = 'https://your_moodle_site'
+
+# fields of the extracted logs
+LOG_FIELDS = ['timestamp', 'Email', 'ACTION_VERB', 'OBJECT_ID', 'OBJECT_NAME', 'OBJECT_TYPE', 'OBJECT_DESCRIPTION',
+              'RelatedActivities', 'Context']
+
+# events of the logs: (path, verb, object type, level, relative frequency), where level is 'module' for the events of
+# the activities of a course, 'course' for the events of a course and 'site' for the events outside the courses. The
+# module of the module level events has the type of the component of the path (mod_<type>), any type for core events
+EVENTS = [
+    ('\\core\\event\\course_viewed', 'viewed', 'http://id.tincanapi.com/activitytype/lms/course', 'course', 20),
+    ('\\core\\event\\user_loggedin', 'logged in to', 'http://id.tincanapi.com/activitytype/lms', 'site', 6),
+    ('\\core\\event\\user_loggedout', 'logged out of', 'http://id.tincanapi.com/activitytype/lms', 'site', 3),
+    ('\\core\\event\\dashboard_viewed', 'viewed', 'http://id.tincanapi.com/activitytype/lms', 'site', 4),
+    ('\\core\\event\\notification_sent', 'sent', 'http://id.tincanapi.com/activitytype/lms', 'site', 2),
+    ('\\core\\event\\course_user_report_viewed', 'viewed', 'http://id.tincanapi.com/activitytype/user-profile',
+     'course', 1),
+    ('\\core\\event\\grade_item_updated', 'updated', 'http://id.tincanapi.com/activitytype/lms', 'course', 1),
+    ('\\core\\event\\course_module_completion_updated', 'completed', 'http://adlnet.gov/expapi/activities/module',
+     'module', 6),
+    ('\\mod_forum\\event\\course_module_viewed', 'viewed', 'http://id.tincanapi.com/activitytype/discussion',
+     'module', 8),
+    ('\\mod_forum\\event\\discussion_viewed', 'viewed', 'http://id.tincanapi.com/activitytype/discussion', 'module', 6),
+    ('\\mod_forum\\event\\post_created', 'created', 'http://id.tincanapi.com/activitytype/forum-reply', 'module', 2),
+    ('\\mod_quiz\\event\\course_module_viewed', 'viewed', 'http://adlnet.gov/expapi/activities/assessment', 'module',
+     6),
+    ('\\mod_quiz\\event\\attempt_started', 'started', 'http://adlnet.gov/expapi/activities/assessment', 'module', 3),
+    ('\\mod_quiz\\event\\attempt_submitted', 'submitted', 'http://adlnet.gov/expapi/activities/assessment', 'module',
+     3),
+    ('\\mod_assign\\event\\course_module_viewed', 'viewed', 'http://adlnet.gov/expapi/activities/assessment', 'module',
+     5),
+    ('\\mod_assign\\event\\assessable_submitted', 'submitted', 'http://adlnet.gov/expapi/activities/assessment',
+     'module', 2),
+    ('\\mod_resource\\event\\course_module_viewed', 'viewed', 'http://adlnet.gov/expapi/activities/file', 'module', 8),
+    ('\\mod_page\\event\\course_module_viewed', 'viewed', 'http://adlnet.gov/expapi/activities/link', 'module', 5),
+    ('\\mod_url\\event\\course_module_viewed', 'viewed', 'http://adlnet.gov/expapi/activities/link', 'module', 3),
+]
+
+# role events: (path, verb)
+ROLE_EVENTS = [('\\core\\event\\role_assigned', 'has been assigned'),
+               ('\\core\\event\\role_unassigned', 'has been unassigned')]
+
+# roles assigned in the courses and their relative frequency
+ROLES = [('student role', 90), ('editingteacher role', 6), ('teacher role', 4)]
+
+# types of the modules of the courses, the module at position p of a course has the type p % len(MODULE_TYPES)
+MODULE_TYPES = ['forum', 'quiz', 'assign', 'resource', 'page', 'url']
+
+# number of modules of each course
+MODULES_PER_COURSE = 40
+
+# mean number of records of a session and mean seconds between the records of a session
+SESSION_LENGTH = 15
+SESSION_GAP = 60
+
+
+def _normalize(weights: []) -> np.ndarray:
+    """
+    Return the probabilities proportional to the weights.
+    """
+
+    weights = np.asarray(weights, dtype=np.float64)
+
+    return weights / weights.sum()
+
+
+def get_usernames(users: int, seed: int = 0) -> np.ndarray:
+    """
+    Return the pseudonymised usernames of the users, sha1 digests as in the extracted logs.
+    """
+
+    return np.asarray([hashlib.sha1('{}-{}'.format(seed, user).encode()).hexdigest() for user in range(users)],
+                      dtype=object)
+
+
+def get_courses(courses: int, first_courseid: int = 2) -> DataFrame:
+    """
+    Return the courses of the synthetic site with their ids, names and modules.
+
+    Returns:
+        The dataframe of the modules with the fields 'courseid', 'coursename', 'Module' (the type of module) and
+        'Module_id'.
+    """
+
+    module_types = MODULE_TYPES
+    courseids = np.repeat(np.arange(first_courseid, first_courseid + courses), MODULES_PER_COURSE)
+    positions = np.tile(np.arange(MODULES_PER_COURSE), courses)
+    modules = DataFrame({'courseid': courseids,
+                         'coursename': ['Course {}'.format(courseid) for courseid in courseids],
+                         'Module': [module_types[position % len(module_types)] for position in positions],
+                         'Module_id': courseids * 1000 + positions})
+
+    return modules
+
+
+def write_course_files(courses: int,
+                       names_path: str,
+                       dates_path: str = "",
+                       start: str = '2022-01-01',
+                       days: int = 180,
+                       first_courseid: int = 2):
+    """
+    Write the course names file and, if dates_path is given, the course dates file of the synthetic courses.
+    """
+
+    courseids = np.arange(first_courseid, first_courseid + courses)
+    DataFrame({'coursename': ['Course {}'.format(courseid) for courseid in courseids],
+               'id': courseids}).to_csv(names_path, index=False)
+
+    if dates_path != "":
+        startdate = int(pd.Timestamp(start, tz='UTC').timestamp())
+        DataFrame({'id': courseids,
+                   'startdate': startdate,
+                   'enddate': startdate + days * 86400}).to_csv(dates_path, index=False)
+
+
+def generate_logs(rows: int,
+                  courses: int = 10,
+                  users: int = 1000,
+                  seed: int = 0,
+                  start: str = '2022-01-01',
+                  days: int = 180,
+                  role_events: float = 0.01,
+                  deleted: float = 0.01,
+                  period: (float, float) = (0.0, 1.0),
+                  chunk: int = 0) -> DataFrame:
+    """
+    Generate synthetic logs in the layout of the extracted logs, sorted by time.
+
+    Each user is enrolled in one to three courses and is more or less active (the activity of the users follows a
+    Zipf-like distribution). The records come in sessions of a user in one of their courses, of SESSION_LENGTH records
+    SESSION_GAP seconds apart on average, that often start with a login and sometimes end with a logout. The records
+    are course, module or site level events, or role assignments and unassignments of the user in the course. The
+    same seed gives the same site (users, courses, modules) and the same logs.
+
+    Args:
+        rows: The number of records.
+        courses: The number of courses.
+        users: The number of users.
+        seed: The seed of the generator.
+        start: The date of the first record.
+        days: The number of days covered by the logs.
+        role_events: The fraction of role assignments and unassignments.
+        deleted: The fraction of actions on deleted modules.
+        period: The fractions of the days covered by the records, to generate the logs in consecutive parts.
+        chunk: The number of the part, so that each part gets its own random records.
+
+    Returns:
+        The dataframe of the logs.
+    """
+
+    # the site only depends on the seed
+    site = np.random.default_rng(seed)
+    usernames = get_usernames(users, seed)
+    activity = _normalize(1.0 / np.arange(1, users + 1) ** 0.8)
+    site.shuffle(activity)
+    enrolments = site.integers(2, 2 + courses, size=(users, 3))
+    enrolled = site.integers(1, 4, size=users)
+    roles = site.choice(len(ROLES), size=(users, 3), p=_normalize([weight for role, weight in ROLES]))
+    modules = get_courses(courses)
+
+    rng = np.random.default_rng([seed, chunk])
+
+    # --------------------
+    # SESSIONS
+    # --------------------
+    # the records come in sessions of a user in one of their courses, the sessions start at random times of the period
+    lengths = rng.geometric(1 / SESSION_LENGTH, size=rows // SESSION_LENGTH + 1)
+    while lengths.sum() < rows:
+        lengths = np.concatenate([lengths, rng.geometric(1 / SESSION_LENGTH, size=rows // SESSION_LENGTH + 1)])
+    lengths = lengths[:np.searchsorted(np.cumsum(lengths), rows) + 1]
+    sessions = len(lengths)
+    session = np.repeat(np.arange(sessions), lengths)[:rows]
+    first_of_session = np.concatenate([[True], session[1:] != session[:-1]])
+    last_of_session = np.concatenate([session[1:] != session[:-1], [True]])
+
+    first = int(pd.Timestamp(start, tz='UTC').timestamp())
+    begin, end = first + int(period[0] * days * 86400), first + int(period[1] * days * 86400)
+    session_start = rng.integers(begin, max(end, begin + 1), size=sessions)
+    gaps = rng.exponential(SESSION_GAP, size=rows).astype(np.int64)
+    elapsed = np.cumsum(gaps)
+    elapsed -= np.repeat(elapsed[first_of_session] - gaps[first_of_session], lengths)[:rows]
+    times = np.minimum(session_start[session] + elapsed, max(end - 1, begin))
+
+    session_user = rng.choice(users, size=sessions, p=activity)
+    session_enrolment = rng.integers(0, 3, size=sessions) % enrolled[session_user]
+    user = session_user[session]
+    enrolment = session_enrolment[session]
+    courseid = enrolments[user, enrolment]
+
+    # kind of record: event of the catalog or role event, the sessions may start with a login and end with a logout
+    is_role = rng.random(rows) < role_events
+    paths = [path for path, *fields in EVENTS]
+    weights = [weight for *fields, weight in EVENTS]
+    weights[paths.index('\\core\\event\\user_loggedin')] = 0
+    weights[paths.index('\\core\\event\\user_loggedout')] = 0
+    event = rng.choice(len(EVENTS), size=rows, p=_normalize(weights))
+    event[first_of_session & (rng.random(rows) < 0.6)] = paths.index('\\core\\event\\user_loggedin')
+    event[last_of_session & (rng.random(rows) < 0.3)] = paths.index('\\core\\event\\user_loggedout')
+    is_role &= ~first_of_session
+    levels = np.asarray([level for path, verb, object_type, level, weight in EVENTS], dtype=object)
+    level = levels[event]
+    level[is_role] = 'course'
+
+    # module of the module level events, of the type of the component of the event
+    event_types = np.asarray([MODULE_TYPES.index(path.split('\\')[1][4:]) if path.startswith('\\mod_') else -1
+                              for path in paths])
+    module_type_index = event_types[event]
+    any_type = module_type_index < 0
+    module_type_index[any_type] = rng.integers(0, len(MODULE_TYPES), size=int(any_type.sum()))
+    counts = (MODULES_PER_COURSE - module_type_index + len(MODULE_TYPES) - 1) // len(MODULE_TYPES)
+    position = module_type_index + len(MODULE_TYPES) * rng.integers(0, counts)
+    module = (courseid - 2) * MODULES_PER_COURSE + position
+    module_type = modules['Module'].to_numpy(dtype=object)
+    module_id = modules['Module_id'].to_numpy()
+
+    # records sorted by time
+    order = np.argsort(times, kind='stable')
+    times, user, enrolment, courseid, event, is_role, level, module = (times[order], user[order], enrolment[order],
+                                                                     courseid[order], event[order], is_role[order],
+                                                                     level[order], module[order])
+
+    # --------------------
+    # FIELDS
+    # --------------------
+    timestamp = np.char.add(np.char.replace(np.datetime_as_string(times.astype('datetime64[s]'), unit='s'), 'T', ' '),
+                            '+00:00').astype(object)
+
+    paths = np.asarray([path for path, *fields in EVENTS] + [path for path, verb in ROLE_EVENTS], dtype=object)
+    verbs = np.asarray([verb for path, verb, *fields in EVENTS] + [verb for path, verb in ROLE_EVENTS], dtype=object)
+    object_types = np.asarray([object_type for path, verb, object_type, *fields in EVENTS] +
+                              ['http://id.tincanapi.com/activitytype/lms'] * len(ROLE_EVENTS), dtype=object)
+    # role events: most of the roles are assigned
+    kind = event.copy()
+    kind[is_role] = len(EVENTS) + (rng.random(int(is_role.sum())) < 0.15)
+
+    # urls of the objects and related activities, built for each distinct module, course and site level object
+    module_urls = np.asarray(['{}/mod/{}/view.php?id={}'.format(SITE, module_type[i], module_id[i])
+                              for i in range(len(module_id))], dtype=object)
+    course_urls = np.asarray(['{}/course/view.php?id={}'.format(SITE, courseid)
+                              for courseid in range(2 + courses)], dtype=object)
+    module_related = np.asarray(["['{}', '{}', '{}', 'http://moodle.org']".format(
+        module_urls[i], SITE, course_urls[2 + i // MODULES_PER_COURSE]) for i in range(len(module_id))], dtype=object)
+    course_related = np.asarray(["['{}', '{}', 'http://moodle.org']".format(course_url, SITE)
+                                 for course_url in course_urls], dtype=object)
+    site_related = "['{}', 'http://moodle.org']".format(SITE)
+
+    is_module = level == 'module'
+    is_course = level == 'course'
+    object_id = np.full(rows, SITE, dtype=object)
+    object_id[is_module] = module_urls[module[is_module]]
+    object_id[is_course] = course_urls[courseid[is_course]]
+    related = np.full(rows, site_related, dtype=object)
+    related[is_module] = module_related[module[is_module]]
+    related[is_course] = course_related[courseid[is_course]]
+
+    object_name = np.full(rows, 'Moodle site', dtype=object)
+    object_name[is_module] = np.char.add('module ', module_id[module[is_module]].astype(str)).astype(object)
+    object_name[is_course] = np.char.add('Course ', courseid[is_course].astype(str)).astype(object)
+    role_names = np.asarray([role for role, weight in ROLES], dtype=object)
+    object_name[is_role] = role_names[roles[user[is_role], enrolment[is_role]]]
+    object_name[(rng.random(rows) < deleted) & ~is_role] = 'not available'
+
+    description = np.full(rows, 'the event of the synthetic logs', dtype=object)
+
+    logs = DataFrame({'timestamp': timestamp,
+                      'Email': usernames[user],
+                      'ACTION_VERB': verbs[kind],
+                      'OBJECT_ID': object_id,
+                      'OBJECT_NAME': object_name,
+                      'OBJECT_TYPE': object_types[kind],
+                      'OBJECT_DESCRIPTION': description,
+                      'RelatedActivities': related,
+                      'Context': paths[kind]})
+
+    return logs
+
+
+def write_logs(path: str,
+               rows: int,
+               chunksize: int = 1000000,
+               **parameters) -> int:
+    """
+    Write synthetic logs to a csv file in chunks of consecutive periods of time, so that logs larger than the memory
+    can be generated. The parameters are those of generate_logs.
+
+    Returns:
+        The number of records written.
+    """
+
+    chunks = max((rows + chunksize - 1) // chunksize, 1)
+    written = 0
+    for chunk in range(chunks):
+        size = min(chunksize, rows - written)
+        logs = generate_logs(size, period=(chunk / chunks, (chunk + 1) / chunks), chunk=chunk, **parameters)
+        logs.to_csv(path, mode='w' if chunk == 0 else 'a', header=chunk == 0, index=False)
+        written += size
+
+    return written
+
+
+def get_statements(logs: DataFrame) -> [dict]:
+    """
+    Return the xAPI statements of the logs of generate_logs, with the fields at the paths of transforming.XAPI_FIELDS,
+    stored at their timestamp.
+    """
+
+    timestamps = pd.to_datetime(logs['timestamp'], utc=True).dt.strftime('%Y-%m-%dT%H:%M:%SZ').to_numpy()
+    # the related activities of each distinct value
+    related = dict((value, [{'id': activity, 'objectType': 'Activity'} for activity in ast.literal_eval(value)])
+                   for value in logs['RelatedActivities'].unique())
+
+    statements = []
+    for position, record in enumerate(logs.itertuples(index=False)):
+        statements.append({
+            'id': hashlib.sha1('{}-{}'.format(record.timestamp, position).encode()).hexdigest(),
+            'actor': {'name': record.Email, 'objectType': 'Agent'},
+            'verb': {'id': 'http://adlnet.gov/expapi/verbs/' + record.ACTION_VERB.replace(' ', '-'),
+                     'display': {'en': record.ACTION_VERB}},
+            'object': {'id': record.OBJECT_ID, 'objectType': 'Activity',
+                       'definition': {'id': record.OBJECT_ID, 'type': record.OBJECT_TYPE,
+                                      'name': {'en': record.OBJECT_NAME},
+                                      'description': {'en': record.OBJECT_DESCRIPTION}}},
+            'context': {'platform': 'Moodle',
+                        'contextActivities': {'grouping': related[record.RelatedActivities]},
+                        'extensions': {'http://lrs.learninglocker.net/define/extensions/info':
+                                       {'event_name': record.Context}}},
+            'timestamp': timestamps[position],
+            'stored': timestamps[position]})
+
+    return statements
+
+
+def write_statements(path: str,
+                     rows: int,
+                     chunksize: int = 1000000,
+                     **parameters) -> int:
+    """
+    Write the xAPI statements of synthetic logs to a JSON lines file (see get_statements), in chunks as write_logs.
+
+    Returns:
+        The number of statements written.
+    """
+
+    chunks = max((rows + chunksize - 1) // chunksize, 1)
+    written = 0
+    with open(path, 'w') as file:
+        for chunk in range(chunks):
+            size = min(chunksize, rows - written)
+            logs = generate_logs(size, period=(chunk / chunks, (chunk + 1) / chunks), chunk=chunk, **parameters)
+            for statement in get_statements(logs):
+                file.write(json.dumps(statement) + '\n')
+            written += size
+
+    return written
@@ -0,0 +1,128 @@
+"""
+Stand-in LRS serving xAPI statements from memory on the statements endpoint, to run the fetching of the statements
+(see fetching.py) without a real LRS:
+
+    server = serve_statements(get_statements(generate_logs(10000)), page_size=500, failures=0.05)
+    fetch_statements(server.url, directory, since='2022-01-01', until='2022-07-01')
+    server.shutdown()
+
+The statements are filtered by the since and until parameters on their stored timestamp and returned in pages of at
+most page_size statements, with the more link of the next page. A fraction of the requests can fail with the status
+503, with or without a Retry-After header, to exercise the retries.
+"""
+
+import json
+import random
+import threading
+import numpy as np
+import pandas as pd
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs, urlencode
+
+
+# path of the xAPI endpoint of the server
+ENDPOINT_PATH = '/data/xAPI/'
+
+
+class _StatementHandler(BaseHTTPRequestHandler):
+    """
+    Handler of the requests of the statements endpoint, with connections kept alive.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def __reply(self, status: int, body: dict, headers: dict = None):
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.send_header('X-Experience-API-Version', '1.0.3')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            failure = server.random.random() < server.failures
+
+        parts = urlsplit(self.path)
+        if parts.path != ENDPOINT_PATH + 'statements':
+            return self.__reply(404, {'error': 'unknown resource {}'.format(parts.path)})
+        if 'X-Experience-API-Version' not in self.headers:
+            return self.__reply(400, {'error': 'missing X-Experience-API-Version header'})
+        if failure:
+            with server.lock:
+                server.failed += 1
+            headers = {'Retry-After': str(server.retry_after)} if server.retry_after is not None else None
+            return self.__reply(503, {'error': 'unavailable'}, headers)
+
+        parameters = dict((name, values[0]) for name, values in parse_qs(parts.query).items())
+        selected = np.ones(len(server.stored), dtype=bool)
+        if 'since' in parameters:
+            selected &= server.stored > pd.Timestamp(parameters['since']).value
+        if 'until' in parameters:
+            selected &= server.stored <= pd.Timestamp(parameters['until']).value
+        positions = np.flatnonzero(selected)
+        if parameters.get('ascending', 'false') != 'true':
+            positions = positions[::-1]
+
+        limit = int(parameters.get('limit', 0)) or server.page_size
+        limit = min(limit, server.page_size)
+        offset = int(parameters.get('offset', 0))
+        more = ''
+        if offset + limit < len(positions):
+            more = ENDPOINT_PATH + 'statements?' + urlencode(dict(parameters, offset=offset + limit))
+
+        self.__reply(200, {'statements': [server.statements[position]
+                                          for position in positions[offset:offset + limit]],
+                           'more': more})
+
+
+def serve_statements(statements: [dict],
+                     page_size: int = 100,
+                     failures: float = 0.0,
+                     seed: int = 0,
+                     retry_after: int = None,
+                     host: str = '127.0.0.1',
+                     port: int = 0) -> ThreadingHTTPServer:
+    """
+    Serve the statements in a background thread until the shutdown method of the server is called.
+
+    Args:
+        statements: The xAPI statements, with their stored timestamp.
+        page_size: The maximum number of statements of a page.
+        failures: The fraction of the requests that fail with the status 503.
+        seed: The seed of the failures.
+        retry_after: The seconds of the Retry-After header of the failed requests, no header if None.
+        host: The address of the server.
+        port: The port of the server, any free port if 0.
+
+    Returns:
+        The server, with the url of the xAPI endpoint and the numbers of requests received and failed.
+    """
+
+    server = ThreadingHTTPServer((host, port), _StatementHandler)
+    server.daemon_threads = True
+    # the statements sorted by stored timestamp
+    stored = pd.to_datetime([statement['stored'] for statement in statements], utc=True).asi8
+    order = np.argsort(stored, kind='stable')
+    server.statements = [statements[position] for position in order]
+    server.stored = stored[order]
+    server.page_size = page_size
+    server.failures = failures
+    server.random = random.Random(seed)
+    server.retry_after = retry_after
+    server.lock = threading.Lock()
+    server.requests = 0
+    server.failed = 0
+    server.url = 'http://{}:{}{}'.format(host, server.server_address[1], ENDPOINT_PATH)
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
@@ -1,3 +1,6 @@
-__all__ = ['Records']
+__all__ = ['Records', 'Pipeline', 'Query', 'SQLRecords']
 
 from .records import *
+from .pipeline import *
+from .query import *
+from .sqlrecords import *
@@ -0,0 +1,243 @@
+import json
+import time
+import datetime
+import tracemalloc
+from pandas import DataFrame
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows, the peak RSS is not reported
+    resource = None
+
+
+def get_peak_rss() -> float:
+    """
+    Return the peak resident set size of the process in megabytes, nan if it cannot be measured.
+    """
+
+    if resource is None:
+        return float('nan')
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    if peak > 2 ** 40:
+        return peak / 2 ** 20
+
+    return peak / 2 ** 10
+
+
+class Pipeline(object):
+    """
+    A sequence of named stages applied one after the other to a dataframe. Each stage is a function that takes the
+    dataframe returned by the previous stage (None for the first stage) and returns a new one. The stages can be
+    added, removed, reordered and disabled by name.
+
+    When the pipeline is run with instrument=True, the wall time, the CPU time, the peak RSS of the process and the
+    rows in and out of each stage are measured, and with trace_memory=True the memory allocated during the stage as
+    well (tracemalloc slows the stages down). The measures of each stage are passed to the hooks and kept in the
+    report of the run, which can be written to a JSON file.
+    """
+
+    def __init__(self, stages: [tuple] = None):
+        """
+        Args:
+            stages: list of (name, function) tuples.
+        """
+        self.__stages = []
+        self.__disabled = set()
+        self.__hooks = []
+        self.__report = None
+        for name, function in stages or []:
+            self.add_stage(name, function)
+
+    def get_stages(self) -> [str]:
+        """
+        Return the names of the stages in order of execution, including the disabled ones
+        """
+        return [name for name, function in self.__stages]
+
+    def get_enabled_stages(self) -> [str]:
+        """
+        Return the names of the stages that are run
+        """
+        return [name for name, function in self.__stages if name not in self.__disabled]
+
+    def __get_position(self, name: str) -> int:
+        """
+        Return the position of the stage, raise a ValueError if there is no stage with this name
+        """
+        names = self.get_stages()
+        if name not in names:
+            raise ValueError("Unknown stage '{}'. Available stages: {}".format(name, names))
+
+        return names.index(name)
+
+    def add_stage(self, name: str, function, before: str = None, after: str = None):
+        """
+        Add a stage at the end of the pipeline, or before or after another stage.
+
+        Args:
+            name: The name of the stage, unique in the pipeline.
+            function: The function that takes the dataframe and returns the new one.
+            before: The name of the stage the new stage is run before.
+            after: The name of the stage the new stage is run after.
+        """
+
+        if name in self.get_stages():
+            raise ValueError("The stage '{}' already exists".format(name))
+        if before is not None and after is not None:
+            raise ValueError("A stage cannot be added both before and after another stage")
+
+        position = len(self.__stages)
+        if before is not None:
+            position = self.__get_position(before)
+        elif after is not None:
+            position = self.__get_position(after) + 1
+        self.__stages.insert(position, (name, function))
+
+    def remove_stage(self, name: str):
+        """
+        Remove the stage from the pipeline
+        """
+        del self.__stages[self.__get_position(name)]
+        self.__disabled.discard(name)
+
+    def replace_stage(self, name: str, function):
+        """
+        Replace the function of the stage, keeping its position
+        """
+        self.__stages[self.__get_position(name)] = (name, function)
+
+    def disable_stage(self, name: str):
+        """
+        Skip the stage when the pipeline is run
+        """
+        self.__get_position(name)
+        self.__disabled.add(name)
+
+    def enable_stage(self, name: str):
+        """
+        Run the stage again after disable_stage
+        """
+        self.__get_position(name)
+        self.__disabled.discard(name)
+
+    def reorder_stages(self, names: [str]):
+        """
+        Set the order of the stages. The list must contain the names of all the stages.
+        """
+        if sorted(names) != sorted(self.get_stages()):
+            raise ValueError("The new order must contain all the stages: {}".format(self.get_stages()))
+        functions = dict(self.__stages)
+        self.__stages = [(name, functions[name]) for name in names]
+
+    def add_hook(self, hook):
+        """
+        Add a function called after each stage with the dictionary of the measures of the stage (see run).
+        """
+        self.__hooks.append(hook)
+
+    def run(self, df: DataFrame = None, instrument: bool = True, trace_memory: bool = False) -> DataFrame:
+        """
+        Run the enabled stages in order.
+
+        Args:
+            df: The dataframe given to the first stage.
+            instrument: Measure the stages and keep the report of the run.
+            trace_memory: Also measure the memory allocated by each stage with tracemalloc.
+
+        Returns:
+            The dataframe returned by the last stage.
+
+        The measures of each stage are:
+            'stage': the name of the stage
+            'rows_in', 'rows_out': the number of records before and after the stage
+            'wall_seconds', 'cpu_seconds': the elapsed time and the CPU time of the process
+            'peak_rss_mb': the peak RSS of the process after the stage
+            'rss_growth_mb': the increase of the peak RSS during the stage
+            'traced_peak_mb', 'traced_delta_mb': with trace_memory, the peak of the memory allocated during the stage
+                and the memory still allocated after it
+        """
+
+        functions = dict(self.__stages)
+        if not instrument:
+            for name in self.get_enabled_stages():
+                df = functions[name](df)
+            return df
+
+        tracing = trace_memory and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+
+        stages = []
+        started = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        try:
+            for name in self.get_enabled_stages():
+                measures = {'stage': name, 'rows_in': 0 if df is None else len(df)}
+                rss = get_peak_rss()
+                if trace_memory:
+                    tracemalloc.reset_peak()
+                    allocated = tracemalloc.get_traced_memory()[0]
+                wall, cpu = time.perf_counter(), time.process_time()
+
+                df = functions[name](df)
+
+                measures['wall_seconds'] = time.perf_counter() - wall
+                measures['cpu_seconds'] = time.process_time() - cpu
+                measures['rows_out'] = 0 if df is None else len(df)
+                measures['peak_rss_mb'] = get_peak_rss()
+                measures['rss_growth_mb'] = measures['peak_rss_mb'] - rss
+                if trace_memory:
+                    current, peak = tracemalloc.get_traced_memory()
+                    measures['traced_peak_mb'] = (peak - allocated) / 2 ** 20
+                    measures['traced_delta_mb'] = (current - allocated) / 2 ** 20
+
+                stages.append(measures)
+                for hook in self.__hooks:
+                    hook(measures)
+        finally:
+            if tracing:
+                tracemalloc.stop()
+
+        self.__report = {'started': started,
+                         'stages': stages,
+                         'disabled': [name for name in self.get_stages() if name in self.__disabled],
+                         'wall_seconds': sum(measures['wall_seconds'] for measures in stages),
+                         'cpu_seconds': sum(measures['cpu_seconds'] for measures in stages),
+                         'peak_rss_mb': get_peak_rss(),
+                         'rows': 0 if df is None else len(df)}
+
+        return df
+
+    def get_report(self) -> dict:
+        """
+        Return the report of the last instrumented run, None if the pipeline has not been run
+        """
+        return self.__report
+
+    def write_report(self, path: str):
+        """
+        Write the report of the last instrumented run to a JSON file
+        """
+        if self.__report is None:
+            raise ValueError("The pipeline has not been run with instrument=True")
+
+        with open(path, 'w') as file:
+            file.write(_dumps(self.__report))
+
+
+def _dumps(report: dict) -> str:
+    """
+    Serialize the report to JSON, the measures that are not available (nan is not valid JSON) are written as null
+    """
+
+    def clean(value):
+        if isinstance(value, dict):
+            return dict((key, clean(item)) for key, item in value.items())
+        if isinstance(value, list):
+            return [clean(item) for item in value]
+        if isinstance(value, float) and value != value:
+            return None
+        return value
+
+    return json.dumps(clean(report), indent=2)
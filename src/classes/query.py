@@ -0,0 +1,233 @@
+import numpy as np
+import pandas as pd
+
+
+# fields of the records that are indexed, see Records.select
+INDEXED_FIELDS = ['Course_Area', 'Role', 'Username', 'courseid']
+
+
+class Query(object):
+    """
+    Lazy query on a Records or a SQLRecords object, e.g.
+
+        records.where(Role=['Student']).between(start, end).where(('Duration', '!=', 0)).select(['Username']).collect()
+
+    The operations are only recorded, and the plan is optimized when the query is collected: the filters on the same
+    field are intersected, the conditions on the indexed fields are answered by the indexes of the Records object,
+    the periods are intersected and located by binary search in the sorted records (see Records.select), the other
+    conditions are evaluated in a single pass on the records left, and only the selected fields of the selected
+    records are taken from the dataframe. Each operation returns a new query, so a query can be extended in several
+    ways.
+
+    A query built without records, e.g. Query().where(courseid=[5]).select(['Username']), can be run on the records
+    given to its bind method, or on a dataset saved by storing.save_consolidated_data with
+    storing.query_consolidated_data, which only reads the partitions and the fields of its plan.
+    """
+
+    def __init__(self, records=None, filters: dict = None, conditions: [tuple] = None,
+                 period: (float, float) = (None, None), columns: [str] = None):
+        """
+        Args:
+            records: The Records or SQLRecords object queried, None for a query bound later.
+            filters: The values of the fields, by field.
+            conditions: The (field, operator, operand) conditions that the records satisfy, see rules.OPERATORS.
+            period: The first and last Unix_Time of the records, None for no bound.
+            columns: The fields of the result, all the fields if None.
+        """
+        self.__records = records
+        self.__filters = dict(filters or {})
+        self.__conditions = list(conditions or [])
+        self.__period = period
+        self.__columns = columns
+
+    def __copy(self, records=None, **changes):
+        parameters = {'filters': self.__filters, 'conditions': self.__conditions, 'period': self.__period,
+                      'columns': self.__columns}
+        parameters.update(changes)
+
+        return Query(self.__records if records is None else records, **parameters)
+
+    def __get_records(self):
+        if self.__records is None:
+            raise ValueError("The query has no records, see Query.bind")
+
+        return self.__records
+
+    def bind(self, records):
+        """
+        Return the same query on the given Records or SQLRecords object.
+        """
+        return self.__copy(records=records)
+
+    def where(self, *conditions, **filters):
+        """
+        Return the query of the records that also satisfy the conditions and the filters.
+
+        Args:
+            conditions: (field, operator, operand) tuples, see rules.OPERATORS.
+            filters: The values of the fields, e.g. Role=['Student'], the filters whose values are None are ignored.
+        """
+
+        # the algorithms package imports the classes
+        from src.algorithms.rules import OPERATORS
+
+        query_filters = dict(self.__filters)
+        for field, values in filters.items():
+            if values is None:
+                continue
+            values = set(tuple(value) if isinstance(value, list) else value for value in values)
+            # the filters on the same field are intersected
+            query_filters[field] = query_filters[field] & values if field in query_filters else values
+
+        for condition in conditions:
+            if len(condition) != 3 or condition[1] not in OPERATORS:
+                raise ValueError("Invalid condition {}. Operators: {}".format(condition, OPERATORS))
+
+        return self.__copy(filters=query_filters, conditions=self.__conditions + [tuple(c) for c in conditions])
+
+    def between(self, start=None, end=None):
+        """
+        Return the query of the records whose Unix_Time is between start and end, both included. The bounds are Unix
+        times or timestamps (in UTC if they have no offset), None for no bound.
+        """
+
+        start, end = to_unix_time(start), to_unix_time(end)
+        first, last = self.__period
+        if start is not None:
+            first = start if first is None else max(first, start)
+        if end is not None:
+            last = end if last is None else min(last, end)
+
+        return self.__copy(period=(first, last))
+
+    def select(self, columns: [str]):
+        """
+        Return the query of the given fields of the records, in the given order.
+        """
+
+        available = self.__columns
+        if available is None and self.__records is not None:
+            available = self.__records.get_column_names()
+        # the fields of a query without records are checked when it is run
+        missing = [column for column in columns if available is not None and column not in available]
+        if missing:
+            raise ValueError("Unknown fields {}. Available fields: {}".format(missing, available))
+
+        return self.__copy(columns=list(columns))
+
+    def get_plan(self) -> dict:
+        """
+        Return the optimized plan of the query: the filters answered by the indexes, the period, the conditions
+        evaluated on the records left, the fields of the result and the fields read by the query (None for all the
+        fields), which are the only ones to load.
+        """
+
+        indexed_fields = INDEXED_FIELDS if self.__records is None else self.__records.INDEXED_FIELDS
+        # the conditions on the values of the indexed fields are answered by the indexes
+        filters = dict(self.__filters)
+        conditions = []
+        for field, operator, operand in self.__conditions:
+            if field in indexed_fields and operator in ['==', 'in']:
+                values = set(tuple(value) if isinstance(value, list) else value
+                             for value in (operand if operator == 'in' else [operand]))
+                filters[field] = filters[field] & values if field in filters else values
+            else:
+                conditions.append((field, operator, operand))
+
+        index_filters = dict((field, values) for field, values in filters.items() if field in indexed_fields)
+        for field, values in filters.items():
+            if field not in indexed_fields:
+                conditions.insert(0, (field, 'in', values))
+
+        fields = None
+        if self.__columns is not None:
+            # the records are loaded in the order of their ID
+            fields = ['ID'] + list(index_filters)
+            fields += ['Unix_Time'] if self.__period != (None, None) else []
+            fields += [condition[0] for condition in conditions] + self.__columns
+            fields = list(dict.fromkeys(fields))
+
+        return {'index_filters': index_filters,
+                'period': self.__period,
+                'conditions': conditions,
+                'columns': self.__columns,
+                'fields': fields}
+
+    def get_positions(self) -> np.ndarray:
+        """
+        Return the sorted positions of the records of the query, see Records.select.
+        """
+
+        # the algorithms package imports the classes
+        import src.algorithms.rules as ru
+
+        records = self.__get_records()
+        plan = self.get_plan()
+        first, last = plan['period']
+        # the period is located by binary search in the sorted records
+        filters = dict((field, list(values)) for field, values in plan['index_filters'].items())
+        positions = records.select(start=first, end=last, **filters)
+
+        if plan['conditions'] and len(positions):
+            # the conditions are evaluated at once on the distinct combinations of their fields
+            fields = []
+            for field, operator, operand in plan['conditions']:
+                if field not in fields:
+                    fields.append(field)
+            values = pd.DataFrame(dict((field, records.get_values(field, positions)) for field in fields))
+            codes, combinations = ru.factorize_columns(values, fields)
+            mask = ru.evaluate_conditions(combinations, plan['conditions'], codes.max() + 1)
+            positions = positions[mask[codes]]
+
+        return positions
+
+    def count(self) -> int:
+        """
+        Return the number of records of the query
+        """
+        return len(self.get_positions())
+
+    def collect(self, copy: bool = False):
+        """
+        Run the query and return the Records object of the selected fields of the selected records, see
+        Records.take.
+        """
+        return self.__get_records().take(self.get_positions(), copy=copy, columns=self.__columns)
+
+    def get_values(self, field: str):
+        """
+        Return the values of the field of the records of the query, see Records.get_values.
+        """
+        return self.__get_records().get_values(field, self.get_positions())
+
+    def get_distinct(self, field: str) -> []:
+        """
+        Return the sorted list of the distinct values of the field of the records of the query, without the missing
+        values. The lists of roles of the users with more than one role are returned as tuples.
+        """
+
+        values = self.get_values(field)
+        try:
+            values = pd.unique(values)
+        except TypeError:
+            # the lists are not hashable
+            values = pd.unique(np.fromiter((tuple(value) if isinstance(value, list) else value for value in values),
+                                           dtype=object, count=len(values)))
+        values = [value for value in values if isinstance(value, tuple) or not pd.isna(value)]
+
+        # the tuples are sorted after the values
+        return sorted(values, key=lambda value: (isinstance(value, tuple), value))
+
+
+def to_unix_time(bound):
+    """
+    Return the Unix time of the bound, a Unix time or a timestamp (in UTC if it has no offset), None for no bound.
+    """
+
+    if bound is None or isinstance(bound, (int, float, np.number)):
+        return bound
+    bound = pd.Timestamp(bound)
+    if bound.tzinfo is None:
+        bound = bound.tz_localize('UTC')
+
+    return bound.timestamp()
@@ -1,14 +1,45 @@
+import numpy as np
+import pandas as pd
 from pandas import DataFrame, Series
+from .query import Query, INDEXED_FIELDS, to_unix_time
 
 
 class Records(object):
     """
     The dataframe of the Records object has the following fields:
     'ID', 'Time', 'Username', 'Role', 'Course_Area', 'Component', 'Event_name', 'Unix_Time'
+
+    The records can be selected by the values of the indexed fields. The index of a field is built the first time the
+    field is used in a selection and kept for the following ones, so the dataframe should not be modified afterwards.
+
+    The dataframe can be in the compact form of compacting.compact_data: the usernames are then decoded with the
+    intern table of the dictionaries of the dataframe, and the getters and the selections take the usernames as well.
+
+    The records can also be queried lazily with the where and between methods, which return a Query object whose plan
+    is optimized and run when it is collected.
+
+    The records sorted by sort_data are ordered by Unix_Time: the periods are then located by binary search rather than
+    by scanning the records, and the records of a period are a view of the dataframe (see select, get_user_window,
+    get_course_window and iter_windows). Whether the records are sorted is checked once, and is known for the records
+    taken from them.
     """
 
-    def __init__(self, df):
+    # fields that can be used to select the records
+    INDEXED_FIELDS = INDEXED_FIELDS
+
+    def __init__(self, df, is_sorted: bool = None):
+        """
+        Args:
+            df: The consolidated dataframe.
+            is_sorted: Whether the records are sorted by Unix_Time, checked when needed if None.
+        """
         self.__df = df
+        self.__indexes = {}
+        # Unix_Time of the positions of each index, see __get_index_times
+        self.__index_times = {}
+        self.__sorted = is_sorted
+        # intern table of the usernames of a compact dataframe
+        self.__usernames = df.attrs.get('dictionaries', {}).get('Username')
 
     def get_df(self) -> DataFrame:
         """
@@ -28,7 +59,7 @@ class Records(object):
         """
         Return a sorted list of record ids
         """
-        ids = sorted(self.__df.ID)
+        ids = sorted(Query(self).get_values('ID'))
 
         return ids
 
@@ -36,46 +67,365 @@ class Records(object):
         """
         Return a list of record times
         """
-        ids = self.__df.Time.unique()
+        times = pd.unique(Query(self).get_values('Time'))
 
-        return ids
+        return times
 
     def get_usernames(self) -> []:
         """
         Return a sorted list of record usernames
         """
-        usernames = sorted(self.__df.Username.unique())
-
-        return usernames
+        return Query(self).get_distinct('Username')
 
     def get_roles(self) -> []:
         """
         Return a list of record roles
         """
-        roles = sorted(self.__df.Role.unique())
-
-        return roles
+        return Query(self).get_distinct('Role')
 
     def get_courses_areas(self) -> []:
         """
         Return the sorted list of the dataframe courses and areas
         """
-        courses_and_areas = sorted(self.__df.Course_Area.unique())
-
-        return courses_and_areas
+        return Query(self).get_distinct('Course_Area')
 
     def get_components(self) -> []:
         """
         Return a sorted list of (role-filtered) record components
         """
-        components = sorted(self.__df.Component.unique())
-
-        return components
+        return Query(self).get_distinct('Component')
 
     def get_event_names(self) -> Series:
         """
         Return the series by component of the sorted list of all the event names
         """
-        event_names = self.__df.sort_values('Event_name', ascending=True).groupby('Component')['Event_name'].unique()
+        event_names = Query(self).select(['Component', 'Event_name']).collect().get_df()
+        event_names = event_names.sort_values('Event_name', ascending=True)
+        event_names = event_names.groupby('Component', observed=True)['Event_name'].unique().map(np.asarray)
 
         return event_names
+
+    def __get_index(self, field: str) -> (dict, np.ndarray, np.ndarray, np.ndarray):
+        """
+        Return the index of the field: the code of each value, the codes of the records, the positions of the records
+        sorted by code and the offsets of the positions of each code, so that the records of the code c are
+        positions[offsets[c + 1]:offsets[c + 2]] (the records without value have the code -1).
+        """
+
+        if field not in self.__indexes:
+            values = self.__df[field]
+            if field == 'Username' and self.__usernames is not None:
+                # the ids of the intern table
+                codes, uniques = values.to_numpy(dtype=np.int64), self.__usernames
+            elif isinstance(values.dtype, pd.CategoricalDtype):
+                codes, uniques = values.cat.codes.to_numpy(dtype=np.int64), values.cat.categories
+                if field == 'Role':
+                    # multiple roles are joined in compact dataframes (the algorithms package imports this module)
+                    from src.algorithms.transforming import ROLE_SEPARATOR
+                    uniques = [tuple(value.split(ROLE_SEPARATOR)) if ROLE_SEPARATOR in value else value
+                               for value in uniques]
+            else:
+                if values.dtype == object:
+                    # multiple roles are stored as lists
+                    values = Series([tuple(value) if isinstance(value, list) else value for value in values],
+                                    dtype=object)
+                codes, uniques = pd.factorize(values)
+            positions = np.argsort(codes, kind='stable')
+            offsets = np.searchsorted(codes[positions], np.arange(-1, len(uniques) + 1))
+            lookup = dict((value, code) for code, value in enumerate(uniques))
+            self.__indexes[field] = (lookup, codes, positions, offsets)
+
+        return self.__indexes[field]
+
+    def __get_codes(self, field: str, values: []) -> np.ndarray:
+        """
+        Return the sorted codes of the given values of the field.
+        """
+
+        lookup = self.__get_index(field)[0]
+        codes = set()
+        for value in values:
+            if isinstance(value, list):
+                value = tuple(value)
+            if not isinstance(value, tuple) and pd.isna(value):
+                codes.add(-1)
+            elif value in lookup:
+                codes.add(lookup[value])
+
+        return np.asarray(sorted(codes), dtype=np.int64)
+
+    def is_sorted(self) -> bool:
+        """
+        Return whether the records are sorted by Unix_Time
+        """
+        if self.__sorted is None:
+            times = self.__df['Unix_Time'].to_numpy()
+            self.__sorted = bool(np.all(times[1:] >= times[:-1]))
+
+        return self.__sorted
+
+    def __get_index_times(self, field: str) -> np.ndarray:
+        """
+        Return the Unix_Time of the positions of the index of the field, sorted for each code when the records are
+        sorted, so that the periods of a code are located by binary search.
+        """
+
+        if field not in self.__index_times:
+            self.__index_times[field] = self.__df['Unix_Time'].to_numpy()[self.__get_index(field)[2]]
+
+        return self.__index_times[field]
+
+    def __in_period(self, positions: np.ndarray, start, end) -> np.ndarray:
+        """
+        Return the positions of the records whose Unix_Time is between start and end, scanning their times.
+        """
+
+        times = self.__df['Unix_Time'].to_numpy()[positions]
+        selected = np.ones(len(positions), dtype=bool)
+        if start is not None:
+            selected &= times >= start
+        if end is not None:
+            selected &= times <= end
+
+        return positions[selected]
+
+    def get_time_range(self, start=None, end=None) -> (int, int):
+        """
+        Return the first position of the sorted records whose Unix_Time is between start and end (both included) and
+        the position after the last one, located by binary search. The bounds are Unix times or timestamps, None for
+        no bound.
+        """
+
+        if not self.is_sorted():
+            raise ValueError("The records are not sorted by Unix_Time, see sorting.sort_data")
+
+        return _search_times(self.__df['Unix_Time'].to_numpy(), to_unix_time(start), to_unix_time(end))
+
+    def get_positions(self, field: str, values: [], start=None, end=None) -> np.ndarray:
+        """
+        Return the sorted positions of the records whose field is one of the given values and whose Unix_Time is
+        between start and end (both included, None for no bound). In the sorted records, the positions of a value in
+        the period are a slice of its index located by binary search.
+        """
+
+        start, end = to_unix_time(start), to_unix_time(end)
+        bounded = start is not None or end is not None
+        positions, offsets = self.__get_index(field)[2:]
+        selected = []
+        for code in self.__get_codes(field, values):
+            first, last = offsets[code + 1], offsets[code + 2]
+            if bounded and self.is_sorted():
+                low, high = _search_times(self.__get_index_times(field)[first:last], start, end)
+                first, last = first + low, first + high
+            selected.append(positions[first:last])
+
+        if not selected:
+            return np.empty(0, dtype=np.int64)
+        selected = selected[0] if len(selected) == 1 else np.sort(np.concatenate(selected))
+        if bounded and not self.is_sorted():
+            selected = self.__in_period(selected, start, end)
+
+        return selected
+
+    def select(self, start=None, end=None, **filters) -> np.ndarray:
+        """
+        Return the sorted positions of the records that satisfy all the filters, e.g.
+        records.select(Course_Area=['Course A'], Role=['Student']), and whose Unix_Time is between start and end (both
+        included, None for no bound). Filters whose values are None are ignored. The positions of the most selective
+        filter in the period are taken from its index and checked against the codes of the others.
+        """
+
+        start, end = to_unix_time(start), to_unix_time(end)
+        bounded = start is not None or end is not None
+
+        selections = []
+        for field, values in filters.items():
+            if values is None:
+                continue
+            if field not in self.INDEXED_FIELDS:
+                raise ValueError("'{}' is not an indexed field: {}".format(field, self.INDEXED_FIELDS))
+            codes = self.__get_codes(field, values)
+            offsets = self.__get_index(field)[3]
+            size = int(np.sum(offsets[codes + 2] - offsets[codes + 1]))
+            selections.append((size, field, values, codes))
+
+        if not selections:
+            if bounded and self.is_sorted():
+                return np.arange(*self.get_time_range(start, end))
+            if bounded:
+                return self.__in_period(np.arange(len(self.__df)), start, end)
+            return np.arange(len(self.__df))
+
+        selections.sort(key=lambda selection: selection[0])
+        selected = self.get_positions(selections[0][1], selections[0][2], start, end)
+        for size, field, values, codes in selections[1:]:
+            if not len(selected):
+                break
+            selected = selected[np.isin(self.__get_index(field)[1][selected], codes)]
+
+        return selected
+
+    def get_values(self, field: str, positions: np.ndarray) -> np.ndarray:
+        """
+        Return the values of the field of the records at the given positions, with the usernames of a compact
+        dataframe decoded, the Time field of a compact dataframe rebuilt and its multiple roles split into lists. The
+        values of the other categorical fields are returned in a categorical, so that they are not hashed again.
+        """
+
+        # the algorithms package imports this module
+        from src.algorithms.compacting import OFFSET_FIELD
+        from src.algorithms.transforming import ROLE_SEPARATOR
+        from src.algorithms.timing import format_log_times
+
+        if field == 'Time' and field not in self.__df and OFFSET_FIELD in self.__df:
+            # the Time field of a compact dataframe is rebuilt from Unix_Time and its UTC offset
+            return format_log_times(self.__df['Unix_Time'].to_numpy()[positions],
+                                    self.__df[OFFSET_FIELD].to_numpy()[positions])
+
+        column = self.__df[field]
+        # the sorted positions of all the records are not taken
+        every = len(positions) == len(column)
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            values = column.array if every else column.array.take(positions)
+            categories = column.cat.categories
+            if field == 'Role' and categories.str.contains(ROLE_SEPARATOR, regex=False).any():
+                # multiple roles are joined in compact dataframes, and split into lists as in the others
+                roles = np.full(len(categories) + 1, np.nan, dtype=object)
+                for code, value in enumerate(categories):
+                    roles[code] = value.split(ROLE_SEPARATOR) if ROLE_SEPARATOR in value else value
+                values = roles[values.codes]
+            return values
+        values = column.to_numpy() if every else column.to_numpy()[positions]
+        if field == 'Username' and self.__usernames is not None:
+            usernames = np.asarray(self.__usernames, dtype=object)[values]
+            usernames[values < 0] = np.nan
+            values = usernames
+
+        return values
+
+    def where(self, *conditions, **filters) -> Query:
+        """
+        Return the lazy query of the records that satisfy the (field, operator, operand) conditions and the filters,
+        e.g. records.where(('Component', '!=', 'System'), Role=['Student']), see Query.
+        """
+        return Query(self).where(*conditions, **filters)
+
+    def between(self, start=None, end=None) -> Query:
+        """
+        Return the lazy query of the records whose Unix_Time is between start and end, see Query.
+        """
+        return Query(self).between(start, end)
+
+    def get_user_window(self, username, start=None, end=None):
+        """
+        Return the Records object of the records of the user whose Unix_Time is between start and end, see
+        get_positions.
+        """
+        return self.take(self.get_positions('Username', [username], start, end))
+
+    def get_course_window(self, courseid, start=None, end=None):
+        """
+        Return the Records object of the records of the course whose Unix_Time is between start and end, see
+        get_positions.
+        """
+        return self.take(self.get_positions('courseid', [courseid], start, end))
+
+    def iter_windows(self, width: float, step: float = None, start=None, end=None):
+        """
+        Iterate over the sliding windows of the sorted records, for rolling analyses: the windows of width seconds
+        starting every step seconds from start, whose records have a Unix_Time in [window start, window start + width)
+        and before or at end. The bounds of each window are located by binary search and its records are a view of the
+        dataframe, so a window costs O(log n) plus the cost of reading its records.
+
+        Args:
+            width: The seconds of a window.
+            step: The seconds between the starts of the windows, width (tumbling windows) if None.
+            start: The start of the first window, the first Unix_Time if None.
+            end: The last Unix_Time of the windows, the last Unix_Time of the records if None.
+
+        Returns:
+            An iterator of (window start, Records object) tuples.
+        """
+
+        step = width if step is None else step
+        if width <= 0 or step <= 0:
+            raise ValueError("The width and the step of the windows must be positive: {}, {}".format(width, step))
+        if not self.is_sorted():
+            raise ValueError("The records are not sorted by Unix_Time, see sorting.sort_data")
+
+        # the arguments are checked when the method is called rather than at the first window
+        return self.__iter_windows(width, step, start, end)
+
+    def __iter_windows(self, width: float, step: float, start, end):
+        times = self.__df['Unix_Time'].to_numpy()
+        if len(times) == 0:
+            return
+
+        start = times[0] if start is None else to_unix_time(start)
+        end = times[-1] if end is None else to_unix_time(end)
+        last = np.searchsorted(times, end, side='right')
+        window = start
+        while window <= end:
+            first = np.searchsorted(times, window, side='left')
+            after = min(np.searchsorted(times, window + width, side='left'), last)
+            yield window, Records(self.__df.iloc[first:max(first, after)], is_sorted=True)
+            window += step
+
+    def select_periods(self, field: str, periods: dict) -> np.ndarray:
+        """
+        Return the sorted positions of the records whose value of the field has no period or whose Unix_Time is within
+        the period of the value, e.g. the records of the courses between their start and end dates. In the sorted
+        records, the records out of the period of a value are located by binary search in its index.
+
+        Args:
+            field: An indexed field.
+            periods: The (start, end) Unix times (both included) of the values of the field.
+
+        Returns:
+            The sorted positions of the records kept.
+        """
+
+        positions, offsets = self.__get_index(field)[2:]
+        removed = np.zeros(len(self.__df), dtype=bool)
+        for value, (start, end) in periods.items():
+            for code in self.__get_codes(field, [value]):
+                first, last = offsets[code + 1], offsets[code + 2]
+                if self.is_sorted():
+                    low, high = _search_times(self.__get_index_times(field)[first:last], start, end)
+                    removed[positions[first:first + low]] = True
+                    removed[positions[first + high:last]] = True
+                else:
+                    removed[positions[first:last]] = True
+                    removed[self.__in_period(positions[first:last], start, end)] = False
+
+        return np.flatnonzero(~removed)
+
+    def take(self, positions: np.ndarray, copy: bool = False, columns: [str] = None):
+        """
+        Return the Records object of the given fields (all the fields if None) of the records at the given sorted
+        positions. The dataframe is a view of this one when the positions are contiguous, and it is not copied unless
+        copy is True.
+        """
+
+        df = self.__df if columns is None else self.__df[columns]
+        if len(positions) and positions[-1] - positions[0] + 1 == len(positions):
+            df = df.iloc[positions[0]:positions[-1] + 1]
+        else:
+            df = df.take(positions)
+        if copy:
+            df = df.copy()
+
+        # the records at sorted positions of sorted records are sorted
+        return Records(df, is_sorted=True if self.__sorted else None)
+
+
+def _search_times(times: np.ndarray, start, end) -> (int, int):
+    """
+    Return the first position of the sorted times between start and end (both included) and the position after the
+    last one.
+    """
+
+    low = 0 if start is None else int(np.searchsorted(times, start, side='left'))
+    high = len(times) if end is None else int(np.searchsorted(times, end, side='right'))
+
+    return low, max(low, high)
@@ -0,0 +1,266 @@
+import json
+import sqlite3
+import numpy as np
+import pandas as pd
+from pandas import DataFrame, Series
+from .records import Records
+from .query import Query, to_unix_time
+
+
+class SQLRecords(object):
+    """
+    The records of a SQLite database written by storing.save_database, with the methods of the Records object. The
+    selections and the distinct values are computed by SQLite with the indexes of the table, so only the pages of the
+    selected records are read rather than the whole dataset. The selected records are returned in a Records object.
+
+    The records can also be queried lazily with the where and between methods (see Query): the filters on the indexed
+    fields and the period of the plan are run by SQLite, only the fields of the other conditions are read for the
+    records selected, and only the selected fields of the records left are read.
+    """
+
+    # fields that can be used to select the records
+    INDEXED_FIELDS = Records.INDEXED_FIELDS
+
+    def __init__(self, path: str, table: str = 'records'):
+        """
+        Args:
+            path: The path of the database.
+            table: The table of the records.
+        """
+        self.__table = table
+        # the database is only read
+        self.__connection = sqlite3.connect('file:{}?mode=ro'.format(path), uri=True, check_same_thread=False)
+        self.__columns = [row[1] for row in self.__connection.execute('PRAGMA table_info("{}")'.format(table))]
+        if not self.__columns:
+            raise ValueError("The database {} has no table '{}'".format(path, table))
+        self.__sorted = None
+
+    def close(self):
+        """
+        Close the connection to the database
+        """
+        self.__connection.close()
+
+    def __read(self, sql: str, parameters: [] = ()) -> DataFrame:
+        """
+        Return the result of the query with the types of the consolidated dataframe: the nullable courseid and the
+        lists of roles of the users with more than one role.
+        """
+        df = pd.read_sql_query(sql, self.__connection, params=parameters)
+        if 'courseid' in df:
+            df['courseid'] = df['courseid'].astype('Int64')
+        # the algorithms package imports the classes
+        from src.algorithms.transforming import split_roles
+        df = split_roles(df)
+
+        return df
+
+    def __distinct(self, field: str) -> []:
+        """
+        Return the sorted distinct values of the field without the missing values, the lists of roles as tuples sorted
+        after the values, as Query.get_distinct.
+        """
+        sql = 'SELECT DISTINCT "{0}" FROM "{1}" WHERE "{0}" IS NOT NULL'.format(field, self.__table)
+        values = [tuple(value) if isinstance(value, list) else value for value in self.__read(sql)[field]]
+
+        return sorted(values, key=lambda value: (isinstance(value, tuple), value))
+
+    def get_df(self) -> DataFrame:
+        """
+        Return the dataframe of all the records, read from the database
+        """
+        return self.__read('SELECT * FROM "{}" ORDER BY rowid'.format(self.__table))
+
+    def get_column_names(self) -> []:
+        """
+        Return the dataframe column names
+        """
+        return list(self.__columns)
+
+    def get_ids(self) -> []:
+        """
+        Return a sorted list of record ids
+        """
+        return list(self.__read('SELECT ID FROM "{}" ORDER BY ID'.format(self.__table))['ID'])
+
+    def get_times(self) -> []:
+        """
+        Return a list of record times
+        """
+        return self.__read('SELECT DISTINCT Time FROM "{}"'.format(self.__table))['Time'].to_numpy()
+
+    def get_usernames(self) -> []:
+        """
+        Return a sorted list of record usernames
+        """
+        return self.__distinct('Username')
+
+    def get_roles(self) -> []:
+        """
+        Return a list of record roles
+        """
+        return self.__distinct('Role')
+
+    def get_courses_areas(self) -> []:
+        """
+        Return the sorted list of the dataframe courses and areas
+        """
+        return self.__distinct('Course_Area')
+
+    def get_components(self) -> []:
+        """
+        Return a sorted list of (role-filtered) record components
+        """
+        return self.__distinct('Component')
+
+    def get_event_names(self) -> Series:
+        """
+        Return the series by component of the sorted list of all the event names
+        """
+        event_names = self.__read('SELECT DISTINCT Component, Event_name FROM "{}" ORDER BY Event_name'
+                                  .format(self.__table))
+        event_names = event_names.groupby('Component')['Event_name'].unique().map(np.asarray)
+
+        return event_names
+
+    def __where(self, filters: dict, start=None, end=None) -> (str, []):
+        """
+        Return the WHERE clause of the filters and of the period and its parameters. The lists of roles are compared
+        with the roles joined in the database, and the missing values with NULL.
+        """
+
+        # the algorithms package imports the classes
+        from src.algorithms.transforming import ROLE_SEPARATOR
+
+        clauses, parameters = [], []
+        for field, values in filters.items():
+            if values is None:
+                continue
+            if field not in self.INDEXED_FIELDS:
+                raise ValueError("'{}' is not an indexed field: {}".format(field, self.INDEXED_FIELDS))
+            conditions = []
+            present = []
+            for value in values:
+                if isinstance(value, (list, tuple)):
+                    present.append(ROLE_SEPARATOR.join(value))
+                elif pd.isna(value):
+                    conditions.append('"{}" IS NULL'.format(field))
+                else:
+                    present.append(value.item() if isinstance(value, np.generic) else value)
+            if present:
+                conditions.append('"{}" IN ({})'.format(field, ', '.join('?' * len(present))))
+                parameters += present
+            clauses.append('(' + ' OR '.join(conditions) + ')' if conditions else '0')
+
+        # the period is read from the indexes ending with Unix_Time
+        start, end = to_unix_time(start), to_unix_time(end)
+        if start is not None and end is not None:
+            clauses.append('"Unix_Time" BETWEEN ? AND ?')
+            parameters += [start, end]
+        elif start is not None:
+            clauses.append('"Unix_Time" >= ?')
+            parameters.append(start)
+        elif end is not None:
+            clauses.append('"Unix_Time" <= ?')
+            parameters.append(end)
+
+        if not clauses:
+            return '', parameters
+
+        return ' WHERE ' + ' AND '.join(clauses), parameters
+
+    def query(self, columns: [str] = None, start=None, end=None, **filters) -> DataFrame:
+        """
+        Return the dataframe of the records that satisfy all the filters, e.g.
+        records.query(courseid=[5], Role=['Student']), computed by SQLite with the indexes of the table.
+
+        Args:
+            columns: The fields of the records, all the fields if None.
+            start: The first Unix_Time of the records, a Unix time or a timestamp (in UTC if it has no offset), None
+                for no bound.
+            end: The last Unix_Time of the records (included).
+            filters: The values of the indexed fields, the filters whose values are None are ignored.
+
+        Returns:
+            The dataframe of the records in the order of the database.
+        """
+
+        where, parameters = self.__where(filters, start, end)
+        fields = '*' if columns is None else ', '.join('"{}"'.format(column) for column in columns)
+
+        return self.__read('SELECT {} FROM "{}"{} ORDER BY rowid'.format(fields, self.__table, where), parameters)
+
+    def count(self, start=None, end=None, **filters) -> int:
+        """
+        Return the number of records that satisfy all the filters and whose Unix_Time is between start and end
+        """
+        where, parameters = self.__where(filters, start, end)
+        sql = 'SELECT COUNT(*) FROM "{}"{}'.format(self.__table, where)
+
+        return self.__connection.execute(sql, parameters).fetchone()[0]
+
+    def select(self, start=None, end=None, **filters) -> np.ndarray:
+        """
+        Return the sorted positions of the records that satisfy all the filters and whose Unix_Time is between start
+        and end (both included, None for no bound), as Records.select.
+        """
+        where, parameters = self.__where(filters, start, end)
+        sql = 'SELECT rowid - 1 FROM "{}"{} ORDER BY rowid'.format(self.__table, where)
+        positions = np.asarray([row[0] for row in self.__connection.execute(sql, parameters)], dtype=np.int64)
+
+        return positions
+
+    def is_sorted(self) -> bool:
+        """
+        Return whether the records are sorted by Unix_Time, checked once by SQLite
+        """
+        if self.__sorted is None:
+            sql = ('SELECT NOT EXISTS (SELECT 1 FROM "{0}" AS a JOIN "{0}" AS b ON b.rowid = a.rowid + 1 '
+                   'WHERE b."Unix_Time" < a."Unix_Time")'.format(self.__table))
+            self.__sorted = bool(self.__connection.execute(sql).fetchone()[0])
+
+        return self.__sorted
+
+    def where(self, *conditions, **filters) -> Query:
+        """
+        Return the lazy query of the records that satisfy the (field, operator, operand) conditions and the filters,
+        as Records.where.
+        """
+        return Query(self).where(*conditions, **filters)
+
+    def between(self, start=None, end=None) -> Query:
+        """
+        Return the lazy query of the records whose Unix_Time is between start and end, as Records.between.
+        """
+        return Query(self).between(start, end)
+
+    def __read_positions(self, positions: np.ndarray, columns: [str] = None) -> DataFrame:
+        """
+        Return the dataframe of the given fields (all the fields if None) of the records at the given sorted positions.
+        The contiguous positions are read as a range of rowids.
+        """
+
+        if len(positions) and positions[-1] - positions[0] + 1 == len(positions):
+            where = ' WHERE rowid BETWEEN ? AND ?'
+            parameters = [int(positions[0]) + 1, int(positions[-1]) + 1]
+        else:
+            where = ' WHERE rowid IN (SELECT value FROM json_each(?))'
+            parameters = [json.dumps((np.asarray(positions, dtype=np.int64) + 1).tolist())]
+        fields = '*' if columns is None else ', '.join('"{}"'.format(column) for column in columns)
+
+        return self.__read('SELECT {} FROM "{}"{} ORDER BY rowid'.format(fields, self.__table, where), parameters)
+
+    def get_values(self, field: str, positions: np.ndarray) -> np.ndarray:
+        """
+        Return the values of the field of the records at the given sorted positions, as Records.get_values.
+        """
+        return self.__read_positions(positions, [field])[field].to_numpy()
+
+    def take(self, positions: np.ndarray, copy: bool = False, columns: [str] = None) -> Records:
+        """
+        Return the Records object of the given fields (all the fields if None) of the records at the given sorted
+        positions, read from the database (so they are always a copy).
+        """
+
+        # the records at sorted positions of sorted records are sorted
+        return Records(self.__read_positions(positions, columns), is_sorted=True if self.__sorted else None)
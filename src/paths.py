@@ -3,3 +3,4 @@ example_names_path = 'src/datasets/example_names.csv'
 example_dates_path = 'src/datasets/example_dates.csv'
 
 example_consolidated_data_path = 'src/datasets/consolidated/data.csv'
+example_consolidated_store_path = 'src/datasets/consolidated/store/'
@@ -0,0 +1,114 @@
+import os
+import json
+import time
+import pytest
+import src.algorithms.fetching as ft
+import src.benchmarks.generating as gn
+import src.benchmarks.serving as sv
+
+
+ROWS = 5000
+PERIOD = {'since': '2021-12-31', 'until': '2022-07-01'}
+
+
+@pytest.fixture(scope='module')
+def statements():
+    return gn.get_statements(gn.generate_logs(ROWS, courses=4, users=120, seed=7))
+
+
+@pytest.fixture
+def serve(statements):
+    """
+    Start stand-in LRSs serving the statements, shut down at the end of the test.
+    """
+
+    servers = []
+
+    def start(**parameters):
+        servers.append(sv.serve_statements(statements, **parameters))
+        return servers[-1]
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def get_fetched_ids(directory) -> [str]:
+    """
+    Return the ids of the statements of the pages saved in the directory.
+    """
+
+    ids = []
+    for name in sorted(os.listdir(directory)):
+        if name.startswith('statements_'):
+            with open(os.path.join(directory, name)) as file:
+                ids += [statement['id'] for statement in json.load(file)['statements']]
+
+    return ids
+
+
+def test_fetch_with_failures(statements, serve, tmp_path):
+    server = serve(page_size=100, failures=0.1)
+
+    fetched = ft.fetch_statements(server.url, str(tmp_path), **PERIOD, limit=100, retries=10, backoff=0.01)
+
+    ids = get_fetched_ids(tmp_path)
+    assert server.failed > 0
+    assert fetched == ROWS
+    assert len(ids) == len(set(ids))
+    assert set(ids) == set(statement['id'] for statement in statements)
+    # the queries are done, the same call fetches nothing
+    assert ft.fetch_statements(server.url, str(tmp_path), **PERIOD, limit=100, retries=10, backoff=0.01) == 0
+    assert len(get_fetched_ids(tmp_path)) == ROWS
+
+
+def test_interrupted_fetch_resumes(statements, serve, tmp_path):
+    server = serve(page_size=100, failures=0.3)
+
+    # the first 503 without retries interrupts the fetch
+    with pytest.raises(ValueError, match='503'):
+        ft.fetch_statements(server.url, str(tmp_path), **PERIOD, slices=1, concurrency=1, limit=100, retries=0)
+    with open(tmp_path / ft.CURSOR_FILE) as file:
+        query = json.load(file)['queries'][0]
+    assert 0 < query['pages'] and not query['done']
+    assert len(get_fetched_ids(tmp_path)) == query['statements']
+
+    server.failures = 0
+    fetched = ft.fetch_statements(server.url, str(tmp_path), **PERIOD, slices=1, concurrency=1, limit=100, retries=0)
+
+    ids = get_fetched_ids(tmp_path)
+    assert fetched == ROWS - query['statements']
+    assert len(ids) == len(set(ids)) == ROWS
+
+
+def test_other_fetch_in_directory(serve, tmp_path):
+    server = serve(page_size=1000)
+    ft.fetch_statements(server.url, str(tmp_path), **PERIOD)
+
+    with pytest.raises(ValueError, match='another fetch'):
+        ft.fetch_statements(server.url, str(tmp_path), **dict(PERIOD, since='2022-01-01'))
+
+
+def test_status_not_retried(serve, tmp_path):
+    server = serve(page_size=100)
+
+    # unknown resource, failed at the first request
+    with pytest.raises(ValueError, match='404'):
+        ft.fetch_statements(server.url + 'other/', str(tmp_path), **PERIOD, slices=1, concurrency=1, retries=10,
+                            backoff=10)
+    assert server.requests == 1
+
+
+def test_retry_after(serve, tmp_path):
+    server = serve(page_size=100, failures=0.3, retry_after=1)
+
+    # without the Retry-After header each failed request would wait the backoff
+    start = time.perf_counter()
+    fetched = ft.fetch_statements(server.url, str(tmp_path), since=PERIOD['since'], until='2022-01-19', slices=1,
+                                  concurrency=1, limit=100, backoff=30)
+    elapsed = time.perf_counter() - start
+
+    assert fetched == len(get_fetched_ids(tmp_path)) > 0
+    assert server.failed > 0
+    assert server.failed <= elapsed < server.failed + 5
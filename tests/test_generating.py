@@ -0,0 +1,76 @@
+import json
+import pandas as pd
+import pytest
+import main
+import src.benchmarks.generating as gn
+
+
+ROWS = 4000
+PARAMETERS = {'courses': 4, 'users': 120, 'seed': 7}
+
+
+@pytest.fixture(scope='module')
+def site(tmp_path_factory):
+    """
+    Course names, csv logs and xAPI statements of the same synthetic logs.
+    """
+
+    directory = tmp_path_factory.mktemp('site')
+    paths = {'names': str(directory / 'names.csv'),
+             'logs': str(directory / 'logs.csv'),
+             'statements': str(directory / 'statements.jsonl')}
+    gn.write_course_files(PARAMETERS['courses'], paths['names'])
+    gn.write_logs(paths['logs'], ROWS, chunksize=ROWS // 2, **PARAMETERS)
+    gn.write_statements(paths['statements'], ROWS, chunksize=ROWS // 2, **PARAMETERS)
+
+    return paths
+
+
+@pytest.fixture(scope='module')
+def consolidated(site):
+    return main.get_consolidated_data(site['names'], logs=site['logs'])
+
+
+def test_generate_logs_is_deterministic():
+    logs = gn.generate_logs(ROWS, **PARAMETERS)
+
+    pd.testing.assert_frame_equal(logs, gn.generate_logs(ROWS, **PARAMETERS))
+    assert list(logs.columns) == gn.LOG_FIELDS
+    assert len(logs) == ROWS
+    assert logs['timestamp'].is_monotonic_increasing
+    assert not logs.equals(gn.generate_logs(ROWS, **dict(PARAMETERS, seed=8)))
+
+
+def test_write_logs_is_deterministic(site, tmp_path):
+    gn.write_logs(str(tmp_path / 'logs.csv'), ROWS, chunksize=ROWS // 2, **PARAMETERS)
+
+    with open(site['logs']) as expected, open(tmp_path / 'logs.csv') as written:
+        assert expected.read() == written.read()
+
+
+def test_statements_of_the_logs(site):
+    logs = gn.generate_logs(ROWS // 2, period=(0, 0.5), chunk=0, **PARAMETERS)
+    statements = gn.get_statements(logs)
+
+    with open(site['statements']) as file:
+        written = [json.loads(line) for line in file]
+    assert len(written) == ROWS
+    assert written[:len(statements)] == statements
+
+
+def test_consolidation_of_the_logs(consolidated):
+    assert len(consolidated) == ROWS
+    assert consolidated['ID'].tolist() == list(range(ROWS))
+    assert consolidated['Unix_Time'].is_monotonic_increasing
+    assert consolidated['Role'].notnull().all()
+    assert set(consolidated.loc[consolidated['courseid'] > 1, 'Course_Area']) <= \
+        set('Course {}'.format(courseid) for courseid in range(2, 2 + PARAMETERS['courses']))
+
+
+def test_xapi_consolidation_matches_csv(site, consolidated):
+    pd.testing.assert_frame_equal(main.get_consolidated_data(site['names'], logs=site['statements']), consolidated)
+
+
+def test_sharded_consolidation_matches_serial(site, consolidated):
+    pd.testing.assert_frame_equal(main.get_consolidated_data(site['names'], logs=site['logs'], processes=2),
+                                  consolidated)
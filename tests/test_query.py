@@ -0,0 +1,96 @@
+import pandas as pd
+import pytest
+import main
+import src.algorithms.compacting as cp
+import src.algorithms.storing as st
+import src.benchmarks.generating as gn
+from src.classes.query import Query
+from src.classes.records import Records
+
+
+ROWS = 3000
+PARAMETERS = {'courses': 3, 'users': 80, 'seed': 5}
+
+
+@pytest.fixture(scope='module')
+def consolidated(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('site')
+    names, logs = str(directory / 'names.csv'), str(directory / 'logs.csv')
+    gn.write_course_files(PARAMETERS['courses'], names)
+    gn.write_logs(logs, ROWS, **PARAMETERS)
+
+    return main.get_consolidated_data(names, logs=logs)
+
+
+def get_queries(consolidated) -> [Query]:
+    start, end = consolidated['Unix_Time'].quantile([0.2, 0.6])
+
+    return [Query(),
+            Query().where(Role=['Student']).select(['ID', 'Username', 'Event_name']),
+            Query().where(('Component', '!=', 'System'), courseid=[2, 4]).between(start, end),
+            Query().between(start=end).where(('Event_name', 'contains', 'viewed')).select(['Username', 'Unix_Time']),
+            Query().where(('Duration', '==', 0), Role=['Teacher'], courseid=[3]).select(['Duration'])]
+
+
+def test_getters(consolidated):
+    records = Records(consolidated)
+    usernames = sorted(consolidated['Username'].dropna().unique())
+
+    assert records.get_ids() == sorted(consolidated['ID'])
+    assert list(records.get_times()) == list(consolidated['Time'].unique())
+    assert records.get_usernames() == usernames
+    assert Records(cp.compact_data(consolidated)).get_usernames() == usernames
+    assert records.get_roles() == sorted(consolidated['Role'].unique())
+    assert records.get_courses_areas() == sorted(consolidated['Course_Area'].unique())
+    assert records.get_components() == sorted(consolidated['Component'].unique())
+    for component, event_names in records.get_event_names().items():
+        assert list(event_names) == sorted(consolidated.loc[consolidated['Component'] == component,
+                                                            'Event_name'].unique())
+    students = consolidated.loc[consolidated['Role'] == 'Student', 'Username'].unique()
+    assert records.where(Role=['Student']).get_distinct('Username') == sorted(students)
+
+
+def test_getters_of_compact_data(consolidated):
+    df = consolidated.astype({'Role': object})
+    # users with more than one role
+    roles = df['Role'].to_numpy(copy=True)
+    for position in df.index[df['Role'] == 'Teacher'][:20]:
+        roles[position] = ['Student', 'Teacher']
+    df['Role'] = roles
+    records, compact = Records(df), Records(cp.compact_data(df))
+
+    assert any(isinstance(role, tuple) for role in records.get_roles())
+    for getter in ['get_ids', 'get_times', 'get_usernames', 'get_roles', 'get_courses_areas', 'get_components']:
+        assert list(getattr(compact, getter)()) == list(getattr(records, getter)()), getter
+    pd.testing.assert_series_equal(compact.get_event_names().map(list), records.get_event_names().map(list))
+    assert compact.where(Role=['Student']).get_distinct('Username') == \
+        records.where(Role=['Student']).get_distinct('Username')
+
+
+def test_fields_of_the_plan():
+    query = Query().where(('Component', '!=', 'System'), Role=['Student']).between(0, 1).select(['Username'])
+
+    assert query.get_plan()['fields'] == ['ID', 'Role', 'Unix_Time', 'Component', 'Username']
+    assert Query().where(Role=['Student']).get_plan()['fields'] is None
+    with pytest.raises(ValueError, match='no records'):
+        query.collect()
+
+
+@pytest.mark.parametrize('by_month', [False, True])
+def test_query_consolidated_data(consolidated, tmp_path, by_month):
+    st.save_consolidated_data(consolidated, str(tmp_path), by_month=by_month)
+    records = Records(st.load_consolidated_data(str(tmp_path)))
+
+    for query in get_queries(consolidated):
+        expected = query.bind(records).collect().get_df().reset_index(drop=True)
+        queried = st.query_consolidated_data(str(tmp_path), query).get_df().reset_index(drop=True)
+        pd.testing.assert_frame_equal(queried, expected)
+
+
+def test_save_compact_data(consolidated, tmp_path):
+    st.save_consolidated_data(consolidated, str(tmp_path / 'data'))
+    st.save_consolidated_data(cp.compact_data(consolidated), str(tmp_path / 'compact'))
+
+    loaded = st.load_consolidated_data(str(tmp_path / 'compact')).astype(object)
+    assert loaded['Username'].tolist() == consolidated['Username'].tolist()
+    pd.testing.assert_frame_equal(loaded, st.load_consolidated_data(str(tmp_path / 'data')).astype(object))
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.classes.records import Records
+
+
+@pytest.fixture
+def records():
+    times = np.array([0, 10, 10, 25, 40, 41, 70], dtype=float)
+
+    return Records(pd.DataFrame({'ID': np.arange(len(times)), 'Unix_Time': times}))
+
+
+def test_iter_windows(records):
+    windows = [(start, list(window.get_df()['ID'])) for start, window in records.iter_windows(20, step=15)]
+
+    assert windows == [(0, [0, 1, 2]), (15, [3]), (30, [4, 5]), (45, []), (60, [6])]
+    assert [start for start, window in records.iter_windows(30, start=10, end=40)] == [10, 40]
+    assert sum(len(window.get_df()) for start, window in records.iter_windows(30)) == 7
+
+
+@pytest.mark.parametrize('width, step', [(0, None), (-5, None), (10, 0), (10, -1)])
+def test_iter_windows_not_positive(records, width, step):
+    with pytest.raises(ValueError, match='positive'):
+        records.iter_windows(width, step)
+
+
+def test_iter_windows_not_sorted():
+    records = Records(pd.DataFrame({'ID': [0, 1], 'Unix_Time': [5.0, 1.0]}))
+
+    with pytest.raises(ValueError, match='not sorted'):
+        records.iter_windows(10)
@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+import pytest
+import main
+import src.algorithms.extracting as ex
+import src.algorithms.storing as st
+import src.benchmarks.generating as gn
+from src.classes.records import Records
+
+
+ROWS = 3000
+PARAMETERS = {'courses': 3, 'users': 80, 'seed': 11}
+
+
+@pytest.fixture(scope='module')
+def consolidated(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('site')
+    names, logs = str(directory / 'names.csv'), str(directory / 'logs.csv')
+    gn.write_course_files(PARAMETERS['courses'], names)
+    gn.write_logs(logs, ROWS, **PARAMETERS)
+
+    return main.get_consolidated_data(names, logs=logs)
+
+
+@pytest.fixture(scope='module')
+def records(consolidated, tmp_path_factory):
+    """
+    The consolidated data in memory and in a database.
+    """
+
+    path = str(tmp_path_factory.mktemp('database') / 'records.db')
+    st.save_database(consolidated, path)
+    database = st.load_database(path)
+    yield Records(consolidated), database
+    database.close()
+
+
+def get_periods(consolidated) -> [tuple]:
+    times = consolidated['Unix_Time']
+    middle = times.quantile(0.25), times.quantile(0.75)
+
+    return [(None, None), (middle[0], None), (None, middle[1]), middle,
+            (pd.Timestamp(middle[0], unit='s').isoformat(), pd.Timestamp(middle[1], unit='s', tz='UTC')),
+            (middle[1], middle[0])]
+
+
+def get_frame(records: Records) -> pd.DataFrame:
+    """
+    Return the dataframe of the records with the categorical fields as objects, as they are read from a database.
+    """
+
+    df = records.get_df().reset_index(drop=True)
+
+    return df.astype(dict((column, object) for column in df if isinstance(df[column].dtype, pd.CategoricalDtype)))
+
+
+def test_select_period(consolidated, records):
+    memory, database = records
+    usernames = consolidated['Username'].value_counts().index[:5].tolist()
+
+    for start, end in get_periods(consolidated):
+        for filters in [{}, {'Username': usernames}, {'Role': ['Student'], 'courseid': [2, 3]}]:
+            expected = memory.select(start=start, end=end, **filters)
+            assert np.array_equal(database.select(start=start, end=end, **filters), expected)
+            assert database.count(start=start, end=end, **filters) == len(expected)
+            assert database.query(start=start, end=end, **filters)['ID'].tolist() == \
+                consolidated['ID'].iloc[expected].tolist()
+
+
+def test_query(consolidated, records):
+    memory, database = records
+    start, end = get_periods(consolidated)[3]
+
+    for query in [lambda r: r.where(Role=['Student']),
+                  lambda r: r.where(('Component', '!=', 'System'), ('courseid', 'in', [2, 4])).between(start, end),
+                  lambda r: r.between(end=end).where(('Event_name', 'contains', 'viewed')).select(['ID', 'Username']),
+                  lambda r: r.where(('Duration', '==', 0), Role=['Teacher'], courseid=[3])]:
+        expected = query(memory)
+        assert np.array_equal(query(database).get_positions(), expected.get_positions())
+        pd.testing.assert_frame_equal(get_frame(query(database).collect()), get_frame(expected.collect()),
+                                      check_dtype=False)
+
+
+def test_extract_records(consolidated, records):
+    memory, database = records
+    usernames = consolidated['Username'].unique()[:10].tolist()
+
+    assert database.is_sorted() == memory.is_sorted()
+    for filters in [{'role': ['Student']}, {'username': usernames, 'courseid': [2]}, {}]:
+        extracted = ex.extract_records(database, **filters)
+        pd.testing.assert_frame_equal(get_frame(extracted), get_frame(ex.extract_records(memory, **filters)),
+                                      check_dtype=False)
+
+
+def test_distinct_values(consolidated, tmp_path):
+    df = consolidated.astype({'Role': object})
+    # users with more than one role
+    roles = df['Role'].to_numpy(copy=True)
+    for position in df.index[df['Role'] == 'Teacher'][:20]:
+        roles[position] = ['Student', 'Teacher']
+    df['Role'] = roles
+    # records without course or area
+    df.loc[df.index[::50], 'Course_Area'] = np.nan
+    st.save_database(df, str(tmp_path / 'records.db'))
+    memory, database = Records(df), st.load_database(str(tmp_path / 'records.db'))
+
+    for getter in ['get_usernames', 'get_roles', 'get_courses_areas', 'get_components']:
+        assert getattr(database, getter)() == getattr(memory, getter)(), getter
+    database.close()
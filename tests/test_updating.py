@@ -0,0 +1,60 @@
+import warnings
+import pandas as pd
+import pytest
+import main
+import src.algorithms.storing as sr
+import src.algorithms.transforming as tr
+import src.algorithms.updating as up
+import src.benchmarks.generating as gn
+
+
+ROWS = 6000
+CUTS = [2000, 4000, ROWS]
+
+
+@pytest.fixture(scope='module')
+def site(tmp_path_factory):
+    """
+    Course names and logs whose cuts share their second with the records around them.
+    """
+
+    directory = tmp_path_factory.mktemp('site')
+    names = str(directory / 'names.csv')
+    gn.write_course_files(4, names)
+    logs = gn.generate_logs(ROWS, courses=4, users=100, seed=3)
+    for cut in CUTS[:-1]:
+        logs.loc[cut - 10:cut + 10, 'timestamp'] = logs.loc[cut, 'timestamp']
+        logs.loc[cut - 10:cut + 10, 'OBJECT_DESCRIPTION'] = ['record {}'.format(i) for i in range(cut - 10, cut + 11)]
+
+    return names, logs
+
+
+def get_strings(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.sort_values('ID').reset_index(drop=True)[tr.CONSOLIDATED_FIELDS].astype({'Duration': 'float64'})
+
+    return df.astype(object).where(df.notnull(), None).astype(str)
+
+
+@pytest.mark.parametrize('cumulative', [False, True])
+def test_update_consolidated_data(site, tmp_path, cumulative):
+    names, logs = site
+    logs.to_csv(tmp_path / 'logs.csv', index=False)
+    store = str(tmp_path / 'store')
+
+    times = pd.to_datetime(logs['timestamp'], utc=True)
+    added = []
+    start = 0
+    for cut in CUTS:
+        logs.iloc[0 if cumulative else start:cut].to_csv(tmp_path / 'part.csv', index=False)
+        # the records of the previous runs are skipped without a warning
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            added.append(up.update_consolidated_data(names, store, logs=str(tmp_path / 'part.csv')))
+        # the records of the previous runs older than their last second
+        skipped = int((times.iloc[:start] < times.iloc[start - 1]).sum()) if cumulative and start else 0
+        assert sr.load_state(store)[0]['skipped'] == skipped
+        start = cut
+
+    full = main.get_consolidated_data(names, logs=str(tmp_path / 'logs.csv'))
+    assert sum(added) == len(full)
+    pd.testing.assert_frame_equal(get_strings(sr.load_consolidated_data(store)), get_strings(full))